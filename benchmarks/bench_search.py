@@ -0,0 +1,107 @@
+"""Admin and API search time: FTS5 index vs the old LIKE scans.
+
+Usage: python benchmarks/bench_search.py [--transactions 200000] [--campaigns 20000] [--repeat 5]
+
+Builds a throwaway SQLite database (``SQLITE_PATH``, default a temporary
+file), fills it with synthetic campaigns and transactions, and times each
+search both ways. No network access is needed.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'community_funding.settings')
+os.environ.setdefault('SQLITE_PATH', os.path.join(tempfile.mkdtemp(prefix='bench-search-'), 'db.sqlite3'))
+
+import django
+
+django.setup()
+
+from django.core.management import call_command
+from django.db.models import Q
+
+from payments import search
+from payments.models import Campaign, Transaction
+from payments.money import Money
+
+WORDS = ('water', 'school', 'clinic', 'harvest', 'library', 'bridge', 'solar', 'orphan', 'market', 'road')
+
+
+def seed(campaign_count, transaction_count):
+    call_command('migrate', verbosity=0)
+    if Campaign.objects.exists():
+        return
+    campaigns = Campaign.objects.bulk_create([
+        Campaign(title=f'{WORDS[i % 10]} {WORDS[i * 7 % 10]} project {i}', description=f'Help build a {WORDS[i * 3 % 10]} in town {i}')
+        for i in range(campaign_count)
+    ], batch_size=2000)
+    Transaction.objects.bulk_create([
+        Transaction(
+            campaign=campaigns[i % campaign_count], amount=Money(1000, 'ETB'), payment_method='chapa',
+            transaction_id=f'CHAPA-{i}-{i * 2654435761 % 16 ** 8:08x}', donor_email=f'donor{i}@example.com',
+        )
+        for i in range(transaction_count)
+    ], batch_size=2000)
+
+
+def best_of(repeat, func):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def like_transactions(term):
+    return Transaction.objects.filter(
+        Q(transaction_id__icontains=term) | Q(donor_email__icontains=term) | Q(campaign__title__icontains=term)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--transactions', type=int, default=200000)
+    parser.add_argument('--campaigns', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    seed(args.campaigns, args.transactions)
+
+    transactions = Transaction.objects.all()
+    campaigns = Campaign.objects.all()
+    # Each admin changelist page counts the matches and reads the first 100.
+    cases = {
+        'transaction email (exact)': (
+            lambda: list(like_transactions('donor4242@example.com')[:100]),
+            lambda: list(search.filter_transactions(transactions, 'donor4242@example.com')[:100]),
+        ),
+        'transaction id fragment': (
+            lambda: like_transactions('CHAPA-4242-').count(),
+            lambda: search.filter_transactions(transactions, 'CHAPA-4242-').count(),
+        ),
+        'transaction campaign title': (
+            lambda: list(like_transactions('library')[:100]),
+            lambda: list(search.filter_transactions(transactions, 'library')[:100]),
+        ),
+        'campaign title/description': (
+            lambda: campaigns.filter(Q(title__icontains='solar') | Q(description__icontains='solar')).count(),
+            lambda: search.filter_campaigns(campaigns, 'solar').count(),
+        ),
+        'ranked campaign search (API)': (
+            lambda: list(campaigns.filter(Q(title__icontains='sol') | Q(description__icontains='sol')).values_list('pk', flat=True)[:20]),
+            lambda: search.ranked_campaign_ids('sol bri', 20),
+        ),
+    }
+    print(f'{args.transactions} transactions, {args.campaigns} campaigns')
+    for name, (like, fts) in cases.items():
+        like_ms = best_of(args.repeat, like) * 1000
+        fts_ms = best_of(args.repeat, fts) * 1000
+        print(f'{name:32s} LIKE {like_ms:9.2f} ms   FTS {fts_ms:9.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
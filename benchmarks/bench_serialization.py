@@ -0,0 +1,89 @@
+"""Serialize+render time per 10k campaigns for the campaign list payload.
+
+Usage: python benchmarks/bench_serialization.py [--count 10000] [--repeat 5]
+
+Compares the DRF ``CampaignSerializer`` + ``JSONRenderer`` path with the
+lean ``serialize_campaigns`` path rendered by ``JSONRenderer`` and by
+``ORJSONRenderer``. No database or network access is needed.
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'community_funding.settings')
+
+import django
+
+django.setup()
+
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from payments.models import Campaign
+from payments.renderers import ORJSONRenderer, orjson
+from payments.serializers import CAMPAIGN_VALUES, CampaignSerializer, serialize_campaigns
+
+RATE = 132.1
+
+
+def make_rows(count):
+    now = timezone.now()
+    return [
+        {
+            'id': i,
+            'title': f'Campaign {i}',
+            'description': 'Community water project',
+            'creator_id': None,
+            # Amounts in minor units, as values() returns them.
+            'total_usd': 12550,
+            'total_birr': 1025000,
+            'goal': 5000000,
+            'created_at': now,
+        }
+        for i in range(1, count + 1)
+    ]
+
+
+def best_of(repeat, func):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--count', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    rows = make_rows(args.count)
+    assert set(rows[0]) == set(CAMPAIGN_VALUES)
+    campaigns = [Campaign(**row) for row in rows]
+    json_renderer = JSONRenderer()
+    orjson_renderer = ORJSONRenderer()
+
+    cases = {
+        'CampaignSerializer + JSONRenderer': lambda: json_renderer.render(
+            CampaignSerializer(campaigns, many=True, context={'usd_to_etb_rate': RATE}).data),
+        'serialize_campaigns + JSONRenderer': lambda: json_renderer.render(
+            serialize_campaigns(rows, RATE)),
+        'serialize_campaigns + ORJSONRenderer': lambda: orjson_renderer.render(
+            serialize_campaigns(rows, RATE)),
+    }
+    if orjson is None:
+        print('orjson is not installed; ORJSONRenderer falls back to JSONRenderer')
+
+    per_10k = 10000 / args.count
+    for name, func in cases.items():
+        seconds = best_of(args.repeat, func)
+        print(f'{name:40s} {seconds * 1000 * per_10k:9.1f} ms per 10k campaigns')
+
+
+if __name__ == '__main__':
+    main()
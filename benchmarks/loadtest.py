@@ -0,0 +1,369 @@
+"""End-to-end load test of the payments app against local upstream stand-ins.
+
+Usage:
+    python benchmarks/loadtest.py [--scenarios campaign_list,donate_chapa,...]
+        [--concurrency 8] [--iterations 200]
+        [--chapa-latency MS] [--paypal-latency MS] [--fx-latency MS]
+        [--chapa-error-rate P] ... [--webhook-replay N]
+        [--baseline benchmarks/baselines/loadtest.json] [--update-baseline]
+
+Starts the Chapa, PayPal and exchangerate-api stand-ins from
+``benchmarks/stubs.py``, starts the app with ``benchmarks/serve.py`` on a
+throwaway SQLite database (or targets ``--url``), then runs each scenario
+with ``--concurrency`` client threads:
+
+    campaign_list    GET /api/campaigns/
+    campaign_detail  GET /api/campaigns/<id>/
+    donate_chapa     POST /api/donate/ then the Chapa return callback
+    donate_paypal    POST /api/donate/ then the PayPal return callback
+    withdraw         POST /api/withdraw/ as a logged-in user
+
+Each scenario reports throughput (flows/s), latency percentiles per flow
+and the DB query count and time per flow, read from the ``Server-Timing``
+header. Results are written to ``--output`` and compared with
+``--baseline`` when it exists; ``--update-baseline`` replaces it.
+"""
+import argparse
+import base64
+import json
+import os
+import platform
+import random
+import re
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+import requests
+
+from stubs import add_upstream_arguments, start_upstreams, upstream_env
+
+ROOT = Path(__file__).resolve().parent.parent
+BENCH_DIR = Path(__file__).resolve().parent
+SCENARIOS = ('campaign_list', 'campaign_detail', 'donate_chapa', 'donate_paypal', 'withdraw')
+SERVER_TIMING_RE = re.compile(r'(\w+);dur=([\d.]+)(?:;desc="(\d+)x")?')
+BENCH_USER = ('bench', 'bench')
+
+
+class FlowError(Exception):
+    pass
+
+
+def parse_server_timing(header):
+    """Return ``{span: (count, ms)}`` from a ``Server-Timing`` header."""
+    spans = {}
+    for name, duration, count in SERVER_TIMING_RE.findall(header or ''):
+        spans[name] = (int(count or 1), float(duration))
+    return spans
+
+
+def flash_errors(response):
+    """Error-level flash messages set by ``response``.
+
+    The app redirects to the test page on both success and failure, so the
+    outcome is read from the (signed) messages cookie. The signature is not
+    checked; this only needs to tell the two apart.
+    """
+    value = response.cookies.get('messages')
+    if not value:
+        return []
+    payload = value.strip('"').split(':', 1)[0]
+    compressed = payload.startswith('.')
+    if compressed:
+        payload = payload[1:]
+    try:
+        data = base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4))
+        if compressed:
+            data = zlib.decompress(data)
+        messages = json.loads(data)
+    except (ValueError, zlib.error):
+        return []
+    return [message[3] for message in messages if isinstance(message, list) and len(message) > 3 and message[2] >= 40]
+
+
+class Client:
+    """One simulated user: a cookie session plus per-flow timing totals."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.session = requests.Session()
+        self.logged_in = False
+
+    def request(self, flow, method, path, expect=(200,), **kwargs):
+        self.session.cookies.pop('messages', None)
+        url = path if path.startswith('http') else f'{self.base_url}{path}'
+        response = self.session.request(method, url, allow_redirects=False, timeout=60, **kwargs)
+        for name, (count, ms) in parse_server_timing(response.headers.get('Server-Timing')).items():
+            span = flow['spans'].setdefault(name, [0, 0.0])
+            span[0] += count
+            span[1] += ms
+        if response.status_code not in expect:
+            raise FlowError(f'{method} {path}: HTTP {response.status_code}')
+        errors = flash_errors(response)
+        if errors:
+            raise FlowError(f'{method} {path}: {errors[0]}')
+        return response
+
+    def login(self):
+        if self.logged_in:
+            return
+        self.session.get(f'{self.base_url}/admin/login/', timeout=60)
+        response = self.session.post(f'{self.base_url}/admin/login/', data={
+            'username': BENCH_USER[0],
+            'password': BENCH_USER[1],
+            'csrfmiddlewaretoken': self.session.cookies.get('csrftoken', ''),
+            'next': '/admin/',
+        }, allow_redirects=False, timeout=60)
+        if response.status_code != 302:
+            raise FlowError(f'login failed: HTTP {response.status_code}')
+        self.logged_in = True
+
+
+def campaign_list(client, flow, ctx):
+    client.request(flow, 'GET', '/api/campaigns/')
+
+
+def campaign_detail(client, flow, ctx):
+    client.request(flow, 'GET', f"/api/campaigns/{random.choice(ctx['campaign_ids'])}/")
+
+
+def donate_chapa(client, flow, ctx):
+    campaign_id = random.choice(ctx['campaign_ids'])
+    response = client.request(flow, 'POST', '/api/donate/', expect=(302,), data={
+        'campaign_id': campaign_id, 'amount': '100', 'payment_method': 'chapa',
+    })
+    if '/checkout/' not in response.headers.get('Location', ''):
+        raise FlowError('donate_chapa: no Chapa checkout redirect')
+    client.request(flow, 'GET', f'/api/callback/chapa/?campaign_id={campaign_id}', expect=(302,))
+
+
+def donate_paypal(client, flow, ctx):
+    response = client.request(flow, 'POST', '/api/donate/', expect=(302,), data={
+        'campaign_id': random.choice(ctx['campaign_ids']), 'amount': '10', 'payment_method': 'paypal',
+        'donor_email': 'donor@example.com',
+    })
+    match = re.search(r'token=([^&]+)', response.headers.get('Location', ''))
+    if not match:
+        raise FlowError('donate_paypal: no PayPal approve redirect')
+    client.request(flow, 'GET', f'/api/callback/paypal/?token={match.group(1)}', expect=(302,))
+
+
+def withdraw(client, flow, ctx):
+    client.request(flow, 'POST', '/api/withdraw/', expect=(302,), data={
+        'campaign_id': random.choice(ctx['campaign_ids']), 'amount': '1', 'payment_method': 'paypal',
+        'recipient_email': 'creator@example.com', 'convert_to': 'usd',
+    })
+
+
+withdraw.needs_login = True
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+def run_scenario(name, base_url, ctx, concurrency, iterations):
+    scenario = globals()[name]
+    local = threading.local()
+    flows = []
+    lock = threading.Lock()
+
+    def one(_):
+        client = getattr(local, 'client', None)
+        if client is None:
+            client = local.client = Client(base_url)
+        if getattr(scenario, 'needs_login', False):
+            client.login()  # once per client, outside the timed flow
+        flow = {'spans': {}, 'error': None}
+        start = time.perf_counter()
+        try:
+            scenario(client, flow, ctx)
+        except (FlowError, requests.RequestException) as e:
+            flow['error'] = str(e)
+        flow['ms'] = (time.perf_counter() - start) * 1000
+        with lock:
+            flows.append(flow)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(iterations)))
+    elapsed = time.perf_counter() - start
+
+    ok = [flow for flow in flows if flow['error'] is None]
+    latencies = sorted(flow['ms'] for flow in ok)
+    errors = [flow['error'] for flow in flows if flow['error']]
+
+    def per_flow(span, index):
+        return round(sum(flow['spans'].get(span, (0, 0.0))[index] for flow in ok) / len(ok), 2) if ok else 0.0
+
+    span_names = sorted({name for flow in ok for name in flow['spans']} - {'total'})
+    return {
+        'iterations': iterations,
+        'concurrency': concurrency,
+        'errors': len(errors),
+        'sample_errors': sorted(set(errors))[:5],
+        'throughput_rps': round(len(ok) / elapsed, 2) if elapsed else 0.0,
+        'latency_ms': {
+            'mean': round(statistics.fmean(latencies), 2) if latencies else 0.0,
+            'p50': round(percentile(latencies, 50), 2),
+            'p90': round(percentile(latencies, 90), 2),
+            'p95': round(percentile(latencies, 95), 2),
+            'p99': round(percentile(latencies, 99), 2),
+            'max': round(latencies[-1], 2) if latencies else 0.0,
+        },
+        'db_queries_per_flow': per_flow('db', 0),
+        'db_ms_per_flow': per_flow('db', 1),
+        'spans_per_flow': {span: {'count': per_flow(span, 0), 'ms': per_flow(span, 1)} for span in span_names},
+    }
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_app(port, env, campaigns):
+    process = subprocess.Popen(
+        [sys.executable, str(BENCH_DIR / 'serve.py'), '--port', str(port), '--campaigns', str(campaigns)],
+        cwd=ROOT, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+    )
+    line = process.stdout.readline()
+    if not line.startswith('Serving on'):
+        process.kill()
+        raise SystemExit(f'App failed to start:\n{line}{process.stdout.read()}')
+    threading.Thread(target=process.stdout.read, daemon=True).start()
+    return process
+
+
+def app_env(upstreams, workdir):
+    env = dict(os.environ)
+    for key, default in (
+        ('SECRET_KEY', 'loadtest-secret-key'),
+        ('PAYPAL_CLIENT_ID', 'loadtest'),
+        ('PAYPAL_CLIENT_SECRET', 'loadtest'),
+        ('CHAPA_TEST_PUBLIC_KEY', 'loadtest'),
+        ('CHAPA_TEST_SECRET_KEY', 'loadtest'),
+        ('CHAPA_TEST_CALLBACK_URL', 'https://loadtest.invalid/api/callback/chapa/'),
+    ):
+        env.setdefault(key, default)
+    env.update(upstream_env(upstreams))
+    env.update({
+        'EXCHANGE_RATE_API_KEY': 'loadtest',
+        'SITE_URL': 'https://loadtest.invalid',
+        'SQLITE_PATH': str(workdir / 'loadtest.sqlite3'),
+        'METRICS_DIR': str(workdir / 'metrics'),
+        'LOG_LEVEL': env.get('LOG_LEVEL', 'WARNING'),
+        'SERVER_TIMING_HEADER': 'True',
+        'SERVER_TIMING_LOG_THRESHOLD_MS': '1000000',
+        # Every simulated donor shares one IP; measure throughput, not the rate limits.
+        'THROTTLE_ENABLED': 'False',
+    })
+    return env
+
+
+def compare(results, baseline):
+    print('\nChange vs baseline (negative latency / positive throughput is better):')
+    print(f"{'scenario':<16}{'p50 ms':>24}{'p95 ms':>24}{'rps':>24}{'db/flow':>20}")
+    for name, current in results['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if not previous:
+            continue
+
+        def cell(cur, prev):
+            delta = (cur - prev) / prev * 100 if prev else 0.0
+            return f'{prev:.1f}->{cur:.1f} ({delta:+.0f}%)'
+
+        print(f"{name:<16}"
+              f"{cell(current['latency_ms']['p50'], previous['latency_ms']['p50']):>24}"
+              f"{cell(current['latency_ms']['p95'], previous['latency_ms']['p95']):>24}"
+              f"{cell(current['throughput_rps'], previous['throughput_rps']):>24}"
+              f"{cell(current['db_queries_per_flow'], previous['db_queries_per_flow']):>20}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--iterations', type=int, default=200, help='Flows per scenario.')
+    parser.add_argument('--campaigns', type=int, default=50)
+    parser.add_argument('--url', help='Target an already running, seeded app instead of starting one.')
+    parser.add_argument('--output', default=str(BENCH_DIR / 'results' / 'loadtest-latest.json'))
+    parser.add_argument('--baseline', default=str(BENCH_DIR / 'baselines' / 'loadtest.json'))
+    parser.add_argument('--update-baseline', action='store_true')
+    add_upstream_arguments(parser)
+    args = parser.parse_args()
+
+    names = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = set(names) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    workdir = Path(tempfile.mkdtemp(prefix='payments-loadtest-'))
+    process = None
+    port = free_port()
+    base_url = args.url.rstrip('/') if args.url else f'http://127.0.0.1:{port}'
+    upstreams = start_upstreams(args, app_url=base_url)
+    try:
+        if not args.url:
+            process = start_app(port, app_env(upstreams, workdir), args.campaigns)
+        campaigns = requests.get(f'{base_url}/api/campaigns/', timeout=60).json()
+        ctx = {'campaign_ids': [campaign['id'] for campaign in campaigns]}
+        if not ctx['campaign_ids']:
+            raise SystemExit('No campaigns to drive; seed the app with benchmarks/serve.py --seed-only')
+
+        results = {
+            'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'machine': {'python': platform.python_version(), 'platform': platform.platform(), 'cpus': os.cpu_count()},
+            'config': {
+                key: value for key, value in vars(args).items()
+                if key not in ('output', 'baseline', 'update_baseline', 'url')
+            },
+            'scenarios': {},
+        }
+        for name in names:
+            result = run_scenario(name, base_url, ctx, args.concurrency, args.iterations)
+            results['scenarios'][name] = result
+            latency = result['latency_ms']
+            print(f"{name:<16} {result['throughput_rps']:>8.1f} flows/s  p50 {latency['p50']:>8.1f} ms  "
+                  f"p95 {latency['p95']:>8.1f} ms  p99 {latency['p99']:>8.1f} ms  "
+                  f"db {result['db_queries_per_flow']:>5.1f} q/flow  errors {result['errors']}")
+            for error in result['sample_errors']:
+                print(f'    {error}')
+        results['upstreams'] = {name: upstream.stats() for name, upstream in upstreams.items()}
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=10)
+        for upstream in upstreams.values():
+            upstream.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    output = Path(args.output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2) + '\n')
+    print(f'\nResults written to {output}')
+
+    baseline = Path(args.baseline)
+    if baseline.exists() and not args.update_baseline:
+        compare(results, json.loads(baseline.read_text()))
+    if args.update_baseline:
+        baseline.parent.mkdir(parents=True, exist_ok=True)
+        baseline.write_text(json.dumps(results, indent=2) + '\n')
+        print(f'Baseline updated: {baseline}')
+
+
+if __name__ == '__main__':
+    main()
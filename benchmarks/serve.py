@@ -0,0 +1,84 @@
+"""Serve the Django app for the load test on a fresh SQLite database.
+
+Usage: python benchmarks/serve.py --port 8765 [--campaigns 50] [--seed-only]
+
+Migrates the database named by SQLITE_PATH, seeds campaigns and a staff
+user (``bench``/``bench``) and serves ``community_funding.wsgi`` with a
+threaded WSGI server. ``benchmarks/loadtest.py`` starts this with the
+upstream base URLs pointing at the stand-ins in ``benchmarks/stubs.py``;
+to measure under gunicorn instead, seed with ``--seed-only`` and pass
+``--url`` to the load test.
+"""
+import argparse
+import os
+import sys
+from decimal import Decimal
+from pathlib import Path
+from socketserver import ThreadingMixIn
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'community_funding.settings')
+
+import django
+
+django.setup()
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+
+from community_funding.wsgi import application
+from payments.models import Campaign
+
+BENCH_USER = 'bench'
+BENCH_PASSWORD = 'bench'
+
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def seed(campaigns):
+    call_command('migrate', verbosity=0)
+    if not User.objects.filter(username=BENCH_USER).exists():
+        User.objects.create_superuser(BENCH_USER, 'bench@example.com', BENCH_PASSWORD)
+    existing = Campaign.objects.count()
+    Campaign.objects.bulk_create([
+        Campaign(
+            title=f'Bench campaign {i}',
+            description='Load test campaign',
+            goal=Decimal('100000.00'),
+            total_usd=Decimal('1000000.00'),
+            total_birr=Decimal('1000000.00'),
+        )
+        for i in range(existing, campaigns)
+    ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--campaigns', type=int, default=50)
+    parser.add_argument('--seed-only', action='store_true')
+    args = parser.parse_args()
+
+    seed(args.campaigns)
+    if args.seed_only:
+        return
+    server = make_server(args.host, args.port, application, server_class=ThreadingWSGIServer, handler_class=QuietHandler)
+    print(f'Serving on http://{args.host}:{args.port}', flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
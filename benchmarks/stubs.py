@@ -0,0 +1,321 @@
+"""Local stand-ins for the Chapa, PayPal and exchangerate-api upstreams.
+
+Each upstream runs as its own threaded HTTP server so latency and error
+rates can be set per upstream. The stand-ins implement only the endpoints
+the app calls, with response shapes matching what ``payments.views``,
+``payments.payouts`` and ``payments.utils.exchange_rate`` read.
+
+Usage on its own (the load test starts them for you):
+
+    python benchmarks/stubs.py --chapa-latency 150 --paypal-latency 250 --fx-latency 80
+
+then run the app with CHAPA_API_BASE, PAYPAL_API_BASE and
+EXCHANGE_RATE_API_BASE pointing at the printed URLs.
+"""
+import argparse
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+from urllib.request import Request, urlopen
+
+
+@dataclass
+class UpstreamConfig:
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    error_rate: float = 0.0
+
+    def delay(self):
+        seconds = (self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def should_fail(self):
+        return self.error_rate > 0 and random.random() < self.error_rate
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    stub = None  # set per server class
+
+    def log_message(self, format, *args):
+        pass
+
+    def _body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        raw = self.rfile.read(length) if length else b''
+        if not raw:
+            return {}
+        if 'json' in (self.headers.get('Content-Type') or ''):
+            return json.loads(raw)
+        return {key: values[0] for key, values in parse_qs(raw.decode()).items()}
+
+    def _send(self, status, data):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _dispatch(self, method):
+        stub = self.stub
+        stub.config.delay()
+        with stub.lock:
+            stub.requests += 1
+        if stub.config.should_fail():
+            with stub.lock:
+                stub.errors += 1
+            return self._send(503, {'status': 'failed', 'message': 'Injected upstream error'})
+        url = urlparse(self.path)
+        body = self._body() if method == 'POST' else {}
+        for route_method, pattern, handler in stub.routes:
+            match = pattern.fullmatch(url.path)
+            if route_method == method and match:
+                status, data = handler(body, parse_qs(url.query), *match.groups())
+                return self._send(status, data)
+        self._send(404, {'status': 'failed', 'message': f'No stub route for {method} {url.path}'})
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+
+class Upstream:
+    """One stand-in server; subclasses fill ``routes``."""
+
+    name = None
+
+    def __init__(self, config=None, host='127.0.0.1', port=0):
+        self.config = config or UpstreamConfig()
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.routes = [(method, re.compile(pattern), handler) for method, pattern, handler in self.get_routes()]
+        handler = type(f'{type(self).__name__}Handler', (_Handler,), {'stub': self})
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def get_routes(self):
+        return []
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name=f'stub-{self.name}', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def stats(self):
+        return {'requests': self.requests, 'injected_errors': self.errors}
+
+
+class ChapaStub(Upstream):
+    """Chapa transaction initialize/verify and bulk transfers.
+
+    With ``webhook_replay`` > 0 and an ``app_url``, every initialized payment
+    is followed by that many POSTs of its ``tx_ref`` to the app's Chapa
+    callback (after ``webhook_delay_ms``), the way Chapa retries webhooks.
+    """
+
+    name = 'chapa'
+
+    def __init__(self, config=None, app_url=None, webhook_replay=0, webhook_delay_ms=200, **kwargs):
+        self.app_url = app_url
+        self.webhook_replay = webhook_replay
+        self.webhook_delay_ms = webhook_delay_ms
+        self.transactions = {}
+        self.transfers = {}
+        self.webhooks_sent = 0
+        self._batch_ids = itertools.count(1)
+        super().__init__(config, **kwargs)
+
+    def get_routes(self):
+        return [
+            ('POST', r'/v1/transaction/initialize', self.initialize),
+            ('GET', r'/v1/transaction/verify/([^/]+)', self.verify),
+            ('POST', r'/v1/bulk-transfers', self.bulk_transfer),
+            ('GET', r'/v1/transfers', self.transfer_status),
+        ]
+
+    def initialize(self, body, query):
+        tx_ref = body['tx_ref']
+        self.transactions[tx_ref] = body.get('amount', '0.00')
+        if self.webhook_replay and self.app_url:
+            threading.Thread(target=self._replay_webhook, args=(tx_ref,), daemon=True).start()
+        return 200, {
+            'status': 'success',
+            'message': 'Hosted Link',
+            'data': {'checkout_url': f'{self.url}/checkout/{tx_ref}', 'tx_ref': tx_ref},
+        }
+
+    def verify(self, body, query, tx_ref):
+        amount = self.transactions.get(tx_ref)
+        if amount is None:
+            return 404, {'status': 'failed', 'message': 'Invalid transaction or transaction not found'}
+        return 200, {'status': 'success', 'data': {'status': 'success', 'amount': amount, 'currency': 'ETB', 'tx_ref': tx_ref}}
+
+    def bulk_transfer(self, body, query):
+        batch_id = next(self._batch_ids)
+        self.transfers[str(batch_id)] = [item['reference'] for item in body.get('bulk_data', [])]
+        return 200, {'status': 'success', 'message': 'Bulk transfer queued successfully', 'data': {'id': batch_id}}
+
+    def transfer_status(self, body, query):
+        references = self.transfers.get(query.get('batch_id', [''])[0], [])
+        return 200, {'status': 'success', 'data': [{'reference': ref, 'status': 'success'} for ref in references]}
+
+    def _replay_webhook(self, tx_ref):
+        time.sleep(self.webhook_delay_ms / 1000)
+        data = urlencode({'tx_ref': tx_ref, 'status': 'success'}).encode()
+        for _ in range(self.webhook_replay):
+            request = Request(f'{self.app_url}/api/callback/chapa/', data=data, method='POST')
+            request.add_header('Content-Type', 'application/x-www-form-urlencoded')
+            try:
+                urlopen(request, timeout=30).read()
+            except Exception:
+                pass
+            with self.lock:
+                self.webhooks_sent += 1
+
+    def stats(self):
+        return {**super().stats(), 'webhooks_sent': self.webhooks_sent}
+
+
+class PayPalStub(Upstream):
+    """PayPal OAuth, Orders v2 (create/get/capture) and Payouts."""
+
+    name = 'paypal'
+
+    def __init__(self, config=None, **kwargs):
+        self.orders = {}
+        self.payouts = {}
+        self._ids = itertools.count(1)
+        super().__init__(config, **kwargs)
+
+    def get_routes(self):
+        return [
+            ('POST', r'/v1/oauth2/token', self.token),
+            ('POST', r'/v2/checkout/orders', self.create_order),
+            ('GET', r'/v2/checkout/orders/([^/]+)', self.get_order),
+            ('POST', r'/v2/checkout/orders/([^/]+)/capture', self.capture),
+            ('POST', r'/v1/payments/payouts', self.create_payout),
+            ('GET', r'/v1/payments/payouts/([^/]+)', self.get_payout),
+        ]
+
+    def token(self, body, query):
+        return 200, {'access_token': 'stub-token', 'token_type': 'Bearer', 'expires_in': 32400}
+
+    def create_order(self, body, query):
+        order_id = f'STUB{next(self._ids):012d}'
+        self.orders[order_id] = 'APPROVED'
+        return 201, {
+            'id': order_id,
+            'status': 'CREATED',
+            'links': [{'rel': 'approve', 'href': f'{self.url}/checkoutnow?token={order_id}', 'method': 'GET'}],
+        }
+
+    def get_order(self, body, query, order_id):
+        if order_id not in self.orders:
+            return 404, {'name': 'RESOURCE_NOT_FOUND'}
+        return 200, {'id': order_id, 'status': self.orders[order_id]}
+
+    def capture(self, body, query, order_id):
+        if self.orders.get(order_id) != 'APPROVED':
+            return 422, {'name': 'UNPROCESSABLE_ENTITY', 'details': [{'issue': 'ORDER_ALREADY_CAPTURED'}]}
+        self.orders[order_id] = 'COMPLETED'
+        return 201, {'id': order_id, 'status': 'COMPLETED'}
+
+    def create_payout(self, body, query):
+        batch_id = f'PAYOUT{next(self._ids):08d}'
+        self.payouts[batch_id] = [item['sender_item_id'] for item in body.get('items', [])]
+        return 201, {'batch_header': {'payout_batch_id': batch_id, 'batch_status': 'PENDING'}}
+
+    def get_payout(self, body, query, batch_id):
+        items = [
+            {'payout_item': {'sender_item_id': ref}, 'transaction_status': 'SUCCESS'}
+            for ref in self.payouts.get(batch_id, [])
+        ]
+        return 200, {'batch_header': {'payout_batch_id': batch_id, 'batch_status': 'SUCCESS'}, 'items': items}
+
+
+class ExchangeRateStub(Upstream):
+    """exchangerate-api v6 pair endpoint."""
+
+    name = 'fx'
+
+    def __init__(self, config=None, rate=132.1, **kwargs):
+        self.rate = rate
+        super().__init__(config, **kwargs)
+
+    def get_routes(self):
+        return [('GET', r'/v6/([^/]+)/pair/([A-Z]{3})/([A-Z]{3})', self.pair)]
+
+    def pair(self, body, query, api_key, base, target):
+        rate = self.rate if (base, target) == ('USD', 'ETB') else 1 / self.rate
+        return 200, {'result': 'success', 'base_code': base, 'target_code': target, 'conversion_rate': rate}
+
+
+def add_upstream_arguments(parser):
+    for name in ('chapa', 'paypal', 'fx'):
+        parser.add_argument(f'--{name}-latency', type=float, default=0, metavar='MS', help=f'Added latency for {name} calls.')
+        parser.add_argument(f'--{name}-jitter', type=float, default=0, metavar='MS', help=f'+/- random jitter for {name} calls.')
+        parser.add_argument(f'--{name}-error-rate', type=float, default=0, metavar='P', help=f'Fraction of {name} calls answered 503.')
+    parser.add_argument('--webhook-replay', type=int, default=0, help='Chapa webhook POSTs sent per initialized payment.')
+    parser.add_argument('--webhook-delay', type=float, default=200, metavar='MS', help='Delay before the first webhook.')
+
+
+def start_upstreams(args, app_url=None):
+    """Start all three stand-ins from parsed ``add_upstream_arguments`` options."""
+    def config(name):
+        return UpstreamConfig(
+            getattr(args, f'{name}_latency'), getattr(args, f'{name}_jitter'), getattr(args, f'{name}_error_rate')
+        )
+    return {
+        'chapa': ChapaStub(config('chapa'), app_url=app_url, webhook_replay=args.webhook_replay,
+                           webhook_delay_ms=args.webhook_delay).start(),
+        'paypal': PayPalStub(config('paypal')).start(),
+        'fx': ExchangeRateStub(config('fx')).start(),
+    }
+
+
+def upstream_env(upstreams):
+    return {
+        'CHAPA_API_BASE': upstreams['chapa'].url,
+        'PAYPAL_API_BASE': upstreams['paypal'].url,
+        'EXCHANGE_RATE_API_BASE': upstreams['fx'].url,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_upstream_arguments(parser)
+    parser.add_argument('--app-url', help='App base URL for webhook replay, e.g. http://127.0.0.1:8000')
+    args = parser.parse_args()
+    upstreams = start_upstreams(args, app_url=args.app_url)
+    for key, value in upstream_env(upstreams).items():
+        print(f'export {key}={value}')
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,5 @@
 from pathlib import Path
-from decouple import config
+from decouple import Csv, config
 import os
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -27,11 +27,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'payments.middleware.StaticFilesMiddleware',
+    'payments.middleware.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'payments.middleware.RequestProfilerMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -60,7 +63,7 @@ WSGI_APPLICATION = 'community_funding.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': config('SQLITE_PATH', default=str(BASE_DIR / 'db.sqlite3')),
     }
 }
 
@@ -92,6 +95,15 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 STATICFILES_DIRS = [
     BASE_DIR / 'static',
 ]
+# collectstatic writes content-hashed copies with .gz (and, when the optional brotli
+# package is installed, .br) variants; payments.middleware.StaticFilesMiddleware serves
+# them. Hashed names are cached as immutable for a year, other names for STATIC_MAX_AGE
+# seconds. See payments.staticfiles.
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'payments.staticfiles.CompressedManifestStaticFilesStorage'},
+}
+STATIC_MAX_AGE = config('STATIC_MAX_AGE', default=60, cast=int)
 # Media files
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
@@ -101,7 +113,122 @@ MEDIA_ROOT = BASE_DIR / 'media'
 LOGIN_REDIRECT_URL = '/test/'  # Redirect after successful login
 LOGOUT_REDIRECT_URL = '/test/'  # Redirect after logout (updated from None)
 
-# Logging configuration with rotation to prevent debug.log from growing too large
+# Per-request DB/gateway/exchange-rate breakdown (payments.middleware.ServerTimingMiddleware)
+SERVER_TIMING_HEADER = config('SERVER_TIMING_HEADER', default=True, cast=bool)
+SERVER_TIMING_LOG_THRESHOLD_MS = config('SERVER_TIMING_LOG_THRESHOLD_MS', default=0, cast=float)
+
+# On-demand request profiling for staff (payments.middleware.RequestProfilerMiddleware):
+# send "X-Profile: 1" or add ?profile=1 to save a sampled profile viewable in the admin.
+REQUEST_PROFILER_ENABLED = config('REQUEST_PROFILER_ENABLED', default=True, cast=bool)
+REQUEST_PROFILER_INTERVAL_MS = config('REQUEST_PROFILER_INTERVAL_MS', default=2, cast=float)
+
+# Worker warm-up (payments.warmup), run from gunicorn.conf.py before a worker takes traffic.
+# Steps: urls, templates, db, http, fx, paypal_token.
+WARMUP_STEPS = config('WARMUP_STEPS', default='urls,templates,db,http,fx,paypal_token', cast=Csv())
+WARMUP_HTTP_TIMEOUT = config('WARMUP_HTTP_TIMEOUT', default=3, cast=float)
+# PayPal OAuth tokens are cached until this many seconds before they expire.
+PAYPAL_TOKEN_EXPIRY_MARGIN = config('PAYPAL_TOKEN_EXPIRY_MARGIN', default=300, cast=int)
+
+# Exchange-rate caching (payments.utils.exchange_rate)
+EXCHANGE_RATE_CACHE_SECONDS = config('EXCHANGE_RATE_CACHE_SECONDS', default=600, cast=int)
+EXCHANGE_RATE_ERROR_CACHE_SECONDS = config('EXCHANGE_RATE_ERROR_CACHE_SECONDS', default=60, cast=int)
+
+# Admin changelists (payments.admin): tables estimated above the threshold skip
+# the exact COUNT(*); month filter buckets are cached for the given seconds.
+ADMIN_ESTIMATED_COUNT_THRESHOLD = config('ADMIN_ESTIMATED_COUNT_THRESHOLD', default=10000, cast=int)
+ADMIN_DATE_BUCKET_CACHE_SECONDS = config('ADMIN_DATE_BUCKET_CACHE_SECONDS', default=900, cast=int)
+
+# Operators' console (payments.views.test_page): campaigns per page, and how long a
+# rendered page of the campaign table is cached (a campaign change invalidates it).
+TEST_PAGE_CAMPAIGNS_PER_PAGE = config('TEST_PAGE_CAMPAIGNS_PER_PAGE', default=50, cast=int)
+TEST_PAGE_CACHE_SECONDS = config('TEST_PAGE_CACHE_SECONDS', default=300, cast=int)
+
+# Withdrawal payouts (payments.payouts), run by `manage.py process_payouts --loop`.
+# CHAPA_PAYOUT_BANK_CODE is Chapa's bank code for the mobile-money wallet paid out to.
+PAYOUT_BATCH_SIZE_PAYPAL = config('PAYOUT_BATCH_SIZE_PAYPAL', default=500, cast=int)
+PAYOUT_BATCH_SIZE_CHAPA = config('PAYOUT_BATCH_SIZE_CHAPA', default=100, cast=int)
+PAYOUT_POLL_INTERVAL = config('PAYOUT_POLL_INTERVAL', default=60, cast=int)
+PAYOUT_WORKER_INTERVAL = config('PAYOUT_WORKER_INTERVAL', default=30, cast=float)
+PAYOUT_REQUEST_TIMEOUT = config('PAYOUT_REQUEST_TIMEOUT', default=30, cast=float)
+CHAPA_PAYOUT_BANK_CODE = config('CHAPA_PAYOUT_BANK_CODE', default='')
+
+# Outbox (payments.outbox), drained by `manage.py dispatch_outbox --loop`. Failed
+# deliveries are retried with backoff up to OUTBOX_MAX_ATTEMPTS times; delivered
+# events are kept for OUTBOX_RETENTION_DAYS.
+OUTBOX_BATCH_SIZE = config('OUTBOX_BATCH_SIZE', default=200, cast=int)
+OUTBOX_MAX_ATTEMPTS = config('OUTBOX_MAX_ATTEMPTS', default=10, cast=int)
+OUTBOX_WORKER_INTERVAL = config('OUTBOX_WORKER_INTERVAL', default=1, cast=float)
+OUTBOX_RETENTION_DAYS = config('OUTBOX_RETENTION_DAYS', default=7, cast=int)
+
+# Transaction sweeper (payments.sweeper), run by `manage.py sweep_transactions --loop`
+# or from cron. Pending checkouts expire after TRANSACTION_PENDING_TTL_HOURS; completed
+# and expired transactions move to the archive table after TRANSACTION_ARCHIVE_AFTER_DAYS.
+TRANSACTION_PENDING_TTL_HOURS = config('TRANSACTION_PENDING_TTL_HOURS', default=24, cast=float)
+TRANSACTION_ARCHIVE_AFTER_DAYS = config('TRANSACTION_ARCHIVE_AFTER_DAYS', default=90, cast=int)
+SWEEPER_BATCH_SIZE = config('SWEEPER_BATCH_SIZE', default=500, cast=int)
+SWEEPER_INTERVAL = config('SWEEPER_INTERVAL', default=3600, cast=float)
+
+# Live progress stream (payments.progress), served at /api/campaigns/stream/. Each
+# process re-reads subscribed campaigns every PROGRESS_POLL_INTERVAL seconds to pick
+# up changes made by other processes. Needs the ASGI app (community_funding.asgi),
+# which the Procfile's web process serves on uvicorn workers.
+PROGRESS_POLL_INTERVAL = config('PROGRESS_POLL_INTERVAL', default=2, cast=float)
+PROGRESS_KEEPALIVE_SECONDS = config('PROGRESS_KEEPALIVE_SECONDS', default=15, cast=float)
+PROGRESS_STREAM_MAX_CAMPAIGNS = config('PROGRESS_STREAM_MAX_CAMPAIGNS', default=50, cast=int)
+
+# Rate limits and admission control for the donation and withdrawal endpoints
+# (the provider callbacks are exempt). Bucket rates are in
+# REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'] below; requests that would start a
+# gateway call get a 503 while GATEWAY_MAX_INFLIGHT calls (across all workers) are
+# running, a limit that shrinks when calls slow past GATEWAY_LATENCY_TARGET_MS.
+THROTTLE_ENABLED = config('THROTTLE_ENABLED', default=True, cast=bool)
+GATEWAY_MAX_INFLIGHT = config('GATEWAY_MAX_INFLIGHT', default=32, cast=int)
+GATEWAY_LATENCY_TARGET_MS = config('GATEWAY_LATENCY_TARGET_MS', default=1500, cast=float)
+ADMISSION_RETRY_AFTER = config('ADMISSION_RETRY_AFTER', default=5, cast=int)
+
+# Long-polling bulk status lookups (/api/transactions/status/) re-check pending ids this often.
+# Like the progress stream, long-polling relies on the ASGI web process (see the Procfile),
+# where a waiting request holds no worker.
+TRANSACTION_STATUS_POLL_INTERVAL = config('TRANSACTION_STATUS_POLL_INTERVAL', default=1, cast=float)
+
+# Metrics exported at /metrics (payments.metrics). Each worker flushes its
+# totals to METRICS_DIR; gunicorn.conf.py clears it on start. Scrapers send METRICS_TOKEN
+# as "Authorization: Bearer <token>"; while it is empty only signed-in staff can read /metrics.
+METRICS_DIR = config('METRICS_DIR', default=str(BASE_DIR / 'metrics'))
+METRICS_FLUSH_INTERVAL = config('METRICS_FLUSH_INTERVAL', default=5, cast=float)
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
+# The cache is shared by every worker and process: cached sessions, rate-limit
+# buckets, exchange rates and the PayPal token must look the same to all of them
+# (a per-worker LocMemCache would keep serving a session another worker flushed).
+# Set REDIS_URL to use Redis (needs the redis package); otherwise a file cache under
+# CACHE_DIR is shared by the processes of one host.
+REDIS_URL = config('REDIS_URL', default='')
+if REDIS_URL:
+    CACHES = {
+        'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': REDIS_URL},
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': config('CACHE_DIR', default=str(BASE_DIR / 'cache')),
+            'OPTIONS': {'MAX_ENTRIES': config('CACHE_MAX_ENTRIES', default=10000, cast=int)},
+        },
+    }
+
+# Flash messages live in a signed cookie and sessions are read through the cache,
+# so redirect-and-message flows never write the session table.
+MESSAGE_STORAGE = 'django.contrib.messages.storage.cookie.CookieStorage'
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
+# Logging configuration with rotation to prevent debug.log from growing too large.
+# Request threads only enqueue records; the 'queue' handler's listener thread
+# formats them and does the file/console I/O.
+LOG_LEVEL = config('LOG_LEVEL', default='INFO')
+LOG_PAYLOAD_MAX_CHARS = config('LOG_PAYLOAD_MAX_CHARS', default=1000, cast=int)
+LOG_PAYLOAD_SAMPLE_RATE = config('LOG_PAYLOAD_SAMPLE_RATE', default=1.0, cast=float)
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -111,6 +238,12 @@ LOGGING = {
             'style': '{',
         },
     },
+    'filters': {
+        'payload_sampler': {
+            '()': 'payments.utils.log.PayloadSampler',
+            'rate': LOG_PAYLOAD_SAMPLE_RATE,
+        },
+    },
     'handlers': {
         'file': {
             'level': 'DEBUG',
@@ -125,11 +258,16 @@ LOGGING = {
             'class': 'logging.StreamHandler',
             'formatter': 'verbose',
         },
+        'queue': {
+            '()': 'payments.utils.log.QueueListenerHandler',
+            'handlers': ['cfg://handlers.console', 'cfg://handlers.file'],
+            'filters': ['payload_sampler'],
+        },
     },
     'loggers': {
         '': {
-            'handlers': ['file', 'console'],
-            'level': 'DEBUG',
+            'handlers': ['queue'],
+            'level': LOG_LEVEL,
             'propagate': True,
         },
     },
@@ -143,11 +281,40 @@ CHAPA_TEST_PUBLIC_KEY = config('CHAPA_TEST_PUBLIC_KEY')
 CHAPA_TEST_SECRET_KEY = config('CHAPA_TEST_SECRET_KEY')
 CHAPA_TEST_CALLBACK_URL = config('CHAPA_TEST_CALLBACK_URL')
 SITE_URL = config('SITE_URL')
+# Secret set on Chapa's webhook settings page; signed webhooks are credited without a verify call.
+CHAPA_WEBHOOK_SECRET = config('CHAPA_WEBHOOK_SECRET', default='')
+
+# Upstream API base URLs; benchmarks/loadtest.py points these at local stand-ins.
+CHAPA_API_BASE = config('CHAPA_API_BASE', default='https://api.chapa.co')
+PAYPAL_API_BASE = config('PAYPAL_API_BASE', default='https://api-m.sandbox.paypal.com')
+EXCHANGE_RATE_API_BASE = config('EXCHANGE_RATE_API_BASE', default='https://v6.exchangerate-api.com')
 
 # REST Framework settings
+# ORJSONRenderer/ORJSONParser use orjson when installed and fall back to DRF's json otherwise
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [],
     'DEFAULT_AUTHENTICATION_CLASSES': [],
+    'DEFAULT_RENDERER_CLASSES': [
+        'payments.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'payments.renderers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+    # Token buckets (payments.throttling): '<scope>_<ip|user|campaign>' -> 'N/period'.
+    'DEFAULT_THROTTLE_RATES': {
+        'donate_ip': config('THROTTLE_DONATE_IP', default='20/min'),
+        'donate_user': config('THROTTLE_DONATE_USER', default='30/min'),
+        'donate_campaign': config('THROTTLE_DONATE_CAMPAIGN', default='600/min'),
+        'withdraw_ip': config('THROTTLE_WITHDRAW_IP', default='10/min'),
+        'withdraw_user': config('THROTTLE_WITHDRAW_USER', default='20/hour'),
+        'withdraw_campaign': config('THROTTLE_WITHDRAW_CAMPAIGN', default='20/hour'),
+    },
+    # Proxies in front of the app whose X-Forwarded-For entries are trusted (1 behind the
+    # Heroku router). With 0 the client IP is REMOTE_ADDR, which a client cannot forge.
+    'NUM_PROXIES': config('NUM_PROXIES', default=0, cast=int),
 }
 
 # Default primary key field type
@@ -0,0 +1,57 @@
+"""Gunicorn settings (see Procfile).
+
+The web process serves the ASGI application on uvicorn workers, so the
+progress stream and long-polling hold no worker while they wait. The
+hooks below run the same for those workers.
+
+With ``preload_app`` (GUNICORN_PRELOAD, on by default) the master imports
+the app and runs the import-only warm-up steps once, so workers fork
+already warm and share that memory copy-on-write. Each worker then opens
+its own connections and fills its caches in ``post_worker_init``, before
+it accepts requests. Worker boot and warm-up times are logged.
+
+Each worker also gets its own slot in the shared in-flight gateway call
+counters of ``payments.admission``; the slot is zeroed when it exits.
+"""
+import os
+import time
+
+from decouple import config
+
+preload_app = config('GUNICORN_PRELOAD', default=True, cast=bool)
+
+
+def on_starting(server):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'community_funding.settings')
+    import django
+    django.setup()  # no-op when the app is preloaded
+    from payments import metrics
+    metrics.clear()  # counters of the previous deploy's workers
+
+
+def when_ready(server):
+    if preload_app:
+        from payments import warmup
+        warmup.run(warmup.IMPORT_STEPS)
+
+
+def pre_fork(server, worker):
+    from payments import admission
+    worker.admission_slot = admission.claim_slot()
+
+
+def post_fork(server, worker):
+    worker.forked_at = time.perf_counter()
+    from payments import admission
+    admission.use_slot(worker.admission_slot)
+
+
+def child_exit(server, worker):
+    from payments import admission
+    admission.release_slot(worker.admission_slot)
+
+
+def post_worker_init(worker):
+    from payments import warmup
+    warmup.run(warmup.CONNECTION_STEPS if preload_app else None)
+    worker.log.info("Worker %s ready %.1f ms after fork", worker.pid, (time.perf_counter() - worker.forked_at) * 1000)
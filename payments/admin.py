@@ -1,12 +1,76 @@
 from django.contrib import admin, messages
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils.html import format_html
+from django.core.cache import cache
+from django.db import transaction as db_transaction
+from django.db.models import Case, ExpressionWrapper, F, FloatField, Max, Min, Value, When
 from django.utils import timezone
 from django.conf import settings
-from decimal import Decimal
-from .models import Campaign, Transaction, WithdrawalRequest
+from datetime import datetime
+from .models import (
+    Campaign, OutboxEvent, PayoutBatch, RequestProfile, Transaction, TransactionArchive, WebhookEvent, WithdrawalRequest,
+)
+from .money import format_minor
+from . import outbox, payouts, progress, search
+from .services import approve_withdrawals, delete_withdrawals, hold_funds, reject_withdrawals
+from .utils.exchange_rate import get_usd_to_etb_rate
+from .utils.pagination import EstimatedCountPaginator
 import logging
 
 logger = logging.getLogger(__name__)
 
+class MonthBucketFilter(admin.SimpleListFilter):
+    """Month filter for large tables, used instead of ``date_hierarchy``.
+
+    ``date_hierarchy`` aggregates the whole table on every changelist load.
+    The month buckets here are derived from the indexed MIN/MAX of
+    ``field_name`` and cached for ``ADMIN_DATE_BUCKET_CACHE_SECONDS``, and
+    the selected month is applied as a range filter that can use the index.
+    """
+    field_name = None
+
+    def lookups(self, request, model_admin):
+        return [(f"{year}-{month:02d}", f"{year}-{month:02d}") for year, month in self.get_buckets(model_admin.model)]
+
+    def get_buckets(self, model):
+        cache_key = f"admin_month_buckets:{model._meta.label_lower}:{self.field_name}"
+        buckets = cache.get(cache_key)
+        if buckets is None:
+            bounds = model._default_manager.aggregate(first=Min(self.field_name), last=Max(self.field_name))
+            buckets = []
+            if bounds['first'] is not None:
+                first = timezone.localtime(bounds['first'])
+                last = timezone.localtime(bounds['last'])
+                year, month = last.year, last.month
+                while (year, month) >= (first.year, first.month):
+                    buckets.append((year, month))
+                    year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+            cache.set(cache_key, buckets, getattr(settings, 'ADMIN_DATE_BUCKET_CACHE_SECONDS', 900))
+        return buckets
+
+    def queryset(self, request, queryset):
+        if not self.value():
+            return queryset
+        try:
+            year, month = (int(part) for part in self.value().split('-'))
+            start = timezone.make_aware(datetime(year, month, 1))
+            end = timezone.make_aware(datetime(year + month // 12, month % 12 + 1, 1))
+        except ValueError:
+            return queryset
+        return queryset.filter(**{f"{self.field_name}__gte": start, f"{self.field_name}__lt": end})
+
+class CreatedMonthFilter(MonthBucketFilter):
+    title = 'month created'
+    parameter_name = 'created_month'
+    field_name = 'created_at'
+
+class RequestedMonthFilter(MonthBucketFilter):
+    title = 'month requested'
+    parameter_name = 'requested_month'
+    field_name = 'requested_at'
+
 @admin.register(Campaign)
 class CampaignAdmin(admin.ModelAdmin):
     list_display = ('id', 'title', 'creator', 'total_birr', 'total_usd', 'balance_in_birr_display', 'goal_display', 'percentage_funded', 'created_at')
@@ -16,141 +80,218 @@ class CampaignAdmin(admin.ModelAdmin):
     date_hierarchy = 'created_at'
 
     def get_queryset(self, request):
-        return super().get_queryset(request).select_related('creator')
+        # One (cached) rate lookup per request; balance (in santim) and
+        # percentage are computed by the database instead of per row in Python.
+        rate = float(get_usd_to_etb_rate())
+        amount = FloatField()
+        return super().get_queryset(request).select_related('creator').annotate(
+            _balance_in_birr=ExpressionWrapper(F('total_birr') + F('total_usd') * Value(rate), output_field=amount),
+        ).annotate(
+            _percentage_funded=Case(
+                When(goal__gt=0, then=ExpressionWrapper(F('_balance_in_birr') * 100 / F('goal'), output_field=amount)),
+                default=Value(0.0),
+                output_field=amount,
+            ),
+        )
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return super().get_search_results(request, queryset, search_term)
+        return search.filter_campaigns(queryset, search_term), False
+
+    def save_model(self, request, obj, form, change):
+        if change:
+            obj.version += 1  # goal and title are part of the progress snapshot
+            db_transaction.on_commit(progress.notify)
+        super().save_model(request, obj, form, change)
 
     def goal_display(self, obj):
-        return f"{obj.goal:.2f} Birr"
+        return f"{obj.goal} Birr"
     goal_display.short_description = 'Goal'
 
     def percentage_funded(self, obj):
-        return f"{obj.get_percentage_funded():.2f}%"
+        return f"{obj._percentage_funded:.2f}%"
     percentage_funded.short_description = 'Percentage Funded'
+    percentage_funded.admin_order_field = '_percentage_funded'
 
     def balance_in_birr_display(self, obj):
-        return f"{obj.get_balance_in_birr():.2f} Birr"
+        return f"{format_minor(round(obj._balance_in_birr))} Birr"
     balance_in_birr_display.short_description = 'Balance in Birr'
+    balance_in_birr_display.admin_order_field = '_balance_in_birr'
 
 @admin.register(Transaction)
 class TransactionAdmin(admin.ModelAdmin):
-    list_display = ('id', 'transaction_id', 'campaign', 'amount', 'payment_method', 'donor_email', 'completed', 'created_at')
+    list_display = ('id', 'transaction_id', 'campaign', 'amount', 'payment_method', 'donor_email', 'completed', 'created_at', 'expired_at')
     search_fields = ('transaction_id', 'donor_email', 'campaign__title')
-    list_filter = ('payment_method', 'completed', 'created_at')
-    readonly_fields = ('created_at',)
-    date_hierarchy = 'created_at'
+    list_filter = ('payment_method', 'completed', CreatedMonthFilter)
+    readonly_fields = ('created_at', 'expired_at')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
     def get_queryset(self, request):
         return super().get_queryset(request).select_related('campaign')
 
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return super().get_search_results(request, queryset, search_term)
+        return search.filter_transactions(queryset, search_term), False
+
+@admin.register(TransactionArchive)
+class TransactionArchiveAdmin(admin.ModelAdmin):
+    list_display = ('id', 'transaction_id', 'campaign', 'amount', 'payment_method', 'donor_email', 'completed', 'created_at', 'archived_at')
+    search_fields = ('=transaction_id', '=donor_email')
+    list_filter = ('payment_method', 'completed', CreatedMonthFilter)
+    readonly_fields = [field.name for field in TransactionArchive._meta.fields]
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('campaign')
+
+    def has_add_permission(self, request):
+        return False
+
 @admin.register(WithdrawalRequest)
 class WithdrawalRequestAdmin(admin.ModelAdmin):
-    list_display = ('id', 'campaign', 'requested_amount', 'payment_method', 'recipient_email', 'status', 'convert_to', 'requested_at', 'processed_at')
-    list_filter = ('payment_method', 'status', 'requested_at')
-    search_fields = ('campaign__title', 'recipient_email')
-    readonly_fields = ('requested_at', 'processed_at')
-    actions = ['approve_withdrawal', 'reject_withdrawal']
-    date_hierarchy = 'requested_at'
+    list_display = ('id', 'campaign', 'requested_amount', 'payment_method', 'recipient_email', 'status', 'convert_to', 'payout_status', 'requested_at', 'processed_at')
+    list_filter = ('payment_method', 'status', 'payout_status', RequestedMonthFilter)
+    search_fields = ('campaign__title', 'recipient_email', 'recipient_phone')
+    readonly_fields = ('status', 'requested_at', 'processed_at', 'payout_status', 'payout_amount', 'payout_currency', 'payout_batch', 'payout_reference', 'payout_error')
+    actions = ['approve_withdrawal', 'reject_withdrawal', 'requeue_payout']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
     def get_queryset(self, request):
         return super().get_queryset(request).select_related('campaign')
 
-    def get_exchange_rate(self, from_currency, to_currency):
-        from .utils.exchange_rate import get_exchange_rate
-        api_key = getattr(settings, 'EXCHANGE_RATE_API_KEY', None)
-        return get_exchange_rate(from_currency, to_currency, api_key=api_key)
+    def get_readonly_fields(self, request, obj=None):
+        if obj is None:
+            return self.readonly_fields
+        # The campaign reserves the requested amount until approval or rejection (the actions).
+        return ('campaign', 'requested_amount', 'convert_to') + self.readonly_fields
+
+    def save_model(self, request, obj, form, change):
+        with db_transaction.atomic():
+            super().save_model(request, obj, form, change)
+            if not change:
+                hold_funds(obj)
+
+    def delete_model(self, request, obj):
+        delete_withdrawals(WithdrawalRequest.objects.filter(pk=obj.pk))
+
+    def delete_queryset(self, request, queryset):
+        delete_withdrawals(queryset)
 
     def approve_withdrawal(self, request, queryset):
-        for withdrawal in queryset:
-            if withdrawal.status != 'pending':
-                self.message_user(request, f"Withdrawal {withdrawal.id} is already {withdrawal.status}.", level=messages.WARNING)
+        outcomes = approve_withdrawals(queryset.values_list('pk', flat=True))
+        approved = 0
+        for outcome in outcomes:
+            if outcome['status'] == 'skipped':
+                self.message_user(request, outcome['message'], level=messages.WARNING)
                 continue
-            campaign = withdrawal.campaign
-            requested_amount = withdrawal.requested_amount
-            convert_to = withdrawal.convert_to
-            payment_method = withdrawal.payment_method
-
-            # Get exchange rate
-            rate = self.get_exchange_rate('USD', 'ETB' if convert_to == 'birr' else 'ETB')
-            if rate == 0:
-                rate = 132.1 if convert_to == 'birr' else 0.007571
-                logger.info(f"Using fallback exchange rate {('USD', 'ETB') if convert_to == 'birr' else ('ETB', 'USD')}: {rate}")
-
-            # Calculate total available balance in the requested currency
-            if convert_to == 'birr':
-                total_available = campaign.total_birr + (campaign.total_usd * Decimal(str(rate)))
-            else:  # convert_to == 'usd'
-                total_available = campaign.total_usd + (campaign.total_birr / Decimal(str(rate)))
-            total_available = total_available.quantize(Decimal('0.01'))
-
-            # Check if sufficient funds are available
-            if requested_amount > total_available:
-                self.message_user(request, f"Insufficient funds for withdrawal {withdrawal.id}! Requested {requested_amount} {convert_to.upper()}, available {total_available} {convert_to.upper()}.", level=messages.ERROR)
+            if outcome['status'] == 'failed':
+                self.message_user(request, outcome['message'], level=messages.ERROR)
                 continue
-
-            # Deduct the requested amount
-            deduct_usd = Decimal('0.00')
-            deduct_birr = Decimal('0.00')
-            if convert_to == 'usd':
-                deduct_usd = min(requested_amount, campaign.total_usd)
-                remaining_usd = requested_amount - deduct_usd
-                if remaining_usd > 0:
-                    deduct_birr = (remaining_usd * Decimal(str(rate))).quantize(Decimal('0.01'))
-                    if deduct_birr > campaign.total_birr:
-                        self.message_user(request, f"Insufficient Birr funds for withdrawal {withdrawal.id}!", level=messages.ERROR)
-                        continue
-            else:  # convert_to == 'birr'
-                deduct_birr = min(requested_amount, campaign.total_birr)
-                remaining_birr = requested_amount - deduct_birr
-                if remaining_birr > 0:
-                    deduct_usd = (remaining_birr / Decimal(str(rate))).quantize(Decimal('0.01'))
-                    if deduct_usd > campaign.total_usd:
-                        self.message_user(request, f"Insufficient USD funds for withdrawal {withdrawal.id}!", level=messages.ERROR)
-                        continue
-
-            # Update campaign balances
-            campaign.total_usd -= deduct_usd
-            campaign.total_birr -= deduct_birr
-            campaign.save()
-
-            # Update withdrawal status
-            withdrawal.status = 'approved'
-            withdrawal.processed_at = timezone.now()
-            withdrawal.save()
-
-            # Calculate total withdrawn amount and process payment
-            if convert_to == 'usd':
-                total_withdrawn = deduct_usd + (deduct_birr / Decimal(str(rate))).quantize(Decimal('0.01'))
-            else:  # convert_to == 'birr'
-                total_withdrawn = deduct_birr + (deduct_usd * Decimal(str(rate))).quantize(Decimal('0.01'))
-
-            if payment_method == 'paypal':
-                result = {'success': True, 'message': f"Simulated PayPal withdrawal of {total_withdrawn} USD to {withdrawal.recipient_email}"}
-                if result.get('success', False):
-                    self.message_user(request, f"Withdrawal {withdrawal.id} approved: {result['message']}", messages.SUCCESS)
-                    logger.info(f"Withdrawal {withdrawal.id} approved: {result['message']}")
-                else:
-                    message = result.get('message', 'PayPal transfer error')
-                    self.message_user(request, f"Withdrawal {withdrawal.id} failed: {message}", messages.ERROR)
-                    logger.error(f"Withdrawal {withdrawal.id} failed: {message}")
-            elif payment_method == 'chapa':
-                result = {'success': True, 'message': f"Simulated Chapa withdrawal of {total_withdrawn} ETB"}
-                if result.get('success', False):
-                    self.message_user(request, f"Withdrawal {withdrawal.id} approved: {result['message']}", messages.SUCCESS)
-                    logger.info(f"Withdrawal {withdrawal.id} approved: {result['message']}")
-                else:
-                    message = result.get('message', 'Chapa withdrawal error')
-                    self.message_user(request, f"Withdrawal {withdrawal.id} failed: {message}", messages.ERROR)
-                    logger.error(f"Withdrawal {withdrawal.id} failed: {message}")
+            approved += 1
+            withdrawal = outcome['withdrawal']
+            logger.info("Withdrawal %s approved: queued %s payout of %s %s", withdrawal.id,
+                        withdrawal.payment_method, withdrawal.payout_amount, withdrawal.payout_currency)
+        if approved:
+            self.message_user(request, f"{approved} withdrawal(s) approved and queued for payout.", messages.SUCCESS)
 
     approve_withdrawal.short_description = "Approve selected withdrawals"
 
     def reject_withdrawal(self, request, queryset):
-        for withdrawal in queryset:
-            if withdrawal.status != 'pending':
-                self.message_user(request, f"Withdrawal {withdrawal.id} is already {withdrawal.status}.", level=messages.WARNING)
-                continue
-            withdrawal.status = 'rejected'
-            withdrawal.processed_at = timezone.now()
-            withdrawal.save()
+        rejected, skipped = reject_withdrawals(queryset.values_list('pk', flat=True))
+        for withdrawal_id, status in skipped:
+            self.message_user(request, f"Withdrawal {withdrawal_id} is already {status}.", level=messages.WARNING)
         self.message_user(request, "Selected withdrawals rejected.", messages.SUCCESS)
 
-    reject_withdrawal.short_description = "Reject selected withdrawals"
\ No newline at end of file
+    reject_withdrawal.short_description = "Reject selected withdrawals"
+
+    def requeue_payout(self, request, queryset):
+        paypal = queryset.filter(status='approved', payout_status='failed', payment_method='paypal').count()
+        requeued = payouts.requeue_failed(queryset)
+        self.message_user(request, f"{requeued} failed payout(s) queued again.", messages.SUCCESS)
+        if paypal:
+            self.message_user(
+                request,
+                f"{paypal} of them will be sent through PayPal again, which does not refuse a payout it already made.",
+                messages.WARNING,
+            )
+
+    requeue_payout.short_description = "Requeue failed payouts (check PayPal ones in PayPal first)"
+
+@admin.register(PayoutBatch)
+class PayoutBatchAdmin(admin.ModelAdmin):
+    list_display = ('id', 'provider', 'status', 'item_count', 'total_amount', 'currency', 'provider_batch_id', 'created_at', 'submitted_at', 'completed_at')
+    list_filter = ('provider', 'status')
+    search_fields = ('provider_batch_id',)
+    readonly_fields = [field.name for field in PayoutBatch._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
+
+@admin.register(WebhookEvent)
+class WebhookEventAdmin(admin.ModelAdmin):
+    list_display = ('id', 'provider', 'event_type', 'reference', 'outcome', 'received_at', 'processed_at')
+    list_filter = ('provider', 'outcome')
+    search_fields = ('reference', 'event_key')
+    readonly_fields = ('provider', 'event_key', 'event_type', 'reference', 'payload', 'received_at', 'processed_at', 'outcome')
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+@admin.register(OutboxEvent)
+class OutboxEventAdmin(admin.ModelAdmin):
+    list_display = ('id', 'topic', 'campaign', 'status', 'attempts', 'created_at', 'available_at', 'delivered_at')
+    list_filter = ('topic', 'status')
+    readonly_fields = [field.name for field in OutboxEvent._meta.fields]
+    actions = ['requeue_events']
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('campaign')
+
+    def has_add_permission(self, request):
+        return False
+
+    def requeue_events(self, request, queryset):
+        requeued = outbox.requeue(queryset)
+        self.message_user(request, f"{requeued} failed event(s) queued again.", messages.SUCCESS)
+
+    requeue_events.short_description = "Requeue failed events"
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = ('id', 'method', 'path', 'status_code', 'duration_ms', 'sample_count', 'user', 'created_at', 'download_link')
+    list_filter = ('method', 'status_code')
+    search_fields = ('path',)
+    exclude = ('collapsed_stacks',)
+    readonly_fields = ('user', 'method', 'path', 'status_code', 'duration_ms', 'interval_ms', 'sample_count', 'created_at', 'download_link')
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('user').defer('collapsed_stacks')
+
+    def has_add_permission(self, request):
+        return False
+
+    def get_urls(self):
+        return [
+            path('<int:pk>/download/', self.admin_site.admin_view(self.download_view), name='payments_requestprofile_download'),
+        ] + super().get_urls()
+
+    def download_view(self, request, pk):
+        if not self.has_view_permission(request):
+            return HttpResponse(status=403)
+        profile = get_object_or_404(RequestProfile, pk=pk)
+        response = HttpResponse(profile.collapsed_stacks, content_type='text/plain; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="profile-{profile.pk}.collapsed"'
+        return response
+
+    def download_link(self, obj):
+        url = reverse('admin:payments_requestprofile_download', args=[obj.pk])
+        return format_html('<a href="{}">Collapsed stacks</a>', url)
+    download_link.short_description = 'Download'
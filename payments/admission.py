@@ -0,0 +1,95 @@
+"""Admission control for endpoints that call a payment gateway.
+
+Every call made through the gateway session (``payments.utils.http``)
+counts as in flight while it runs. A request to an endpoint that would
+start another call is refused up front, with 503 and ``Retry-After:
+ADMISSION_RETRY_AFTER``, while the in-flight total across all workers is
+at the limit. It is not left to queue behind gateway calls that are
+already slow, and it never holds a worker for the whole gateway timeout.
+
+The limit adapts to the gateways. It is ``GATEWAY_MAX_INFLIGHT`` while
+calls take ``GATEWAY_LATENCY_TARGET_MS`` or less. When the moving average
+of gateway latency goes above the target, the limit shrinks in
+proportion, down to one call.
+
+The counters are a shared-memory array created before gunicorn forks.
+``gunicorn.conf.py`` gives each worker its own slot (``pre_fork`` /
+``post_fork``) and zeroes a slot when its worker exits, so calls cut
+short by a killed worker are not counted forever. Outside gunicorn the
+process uses slot 0.
+"""
+import multiprocessing
+import threading
+from contextlib import contextmanager
+
+from .utils import timing
+
+MAX_SLOTS = 128
+GATEWAY_SPANS = ('chapa', 'paypal', 'paypal_oauth')
+# Weight of the newest call in the latency moving average.
+LATENCY_ALPHA = 0.2
+
+_counters = multiprocessing.Array('i', MAX_SLOTS, lock=False)
+_free_slots = list(range(MAX_SLOTS - 1, 0, -1))
+_slot = 0
+_lock = threading.Lock()
+_latency = None  # moving average of gateway call seconds in this process
+
+
+def claim_slot():
+    """Reserve a counter slot for a worker about to fork (gunicorn master)."""
+    return _free_slots.pop() if _free_slots else 0
+
+
+def release_slot(slot):
+    """Zero and free the slot of a worker that exited (gunicorn master)."""
+    _counters[slot] = 0
+    if slot and slot not in _free_slots:
+        _free_slots.append(slot)
+
+
+def use_slot(slot):
+    """Count this process's gateway calls in ``slot`` (gunicorn worker, after fork)."""
+    global _slot
+    _slot = slot
+
+
+@contextmanager
+def gateway_call():
+    """Count the enclosed gateway call as in flight."""
+    with _lock:
+        _counters[_slot] += 1
+    try:
+        yield
+    finally:
+        with _lock:
+            _counters[_slot] -= 1
+
+
+def inflight():
+    return sum(_counters)
+
+
+def observe(name, seconds):
+    """``payments.utils.timing`` observer feeding the latency average."""
+    global _latency
+    if name in GATEWAY_SPANS:
+        _latency = seconds if _latency is None else _latency + LATENCY_ALPHA * (seconds - _latency)
+
+
+def limit():
+    """Current in-flight limit: the configured maximum, scaled down while gateways are slow."""
+    from django.conf import settings
+    maximum = getattr(settings, 'GATEWAY_MAX_INFLIGHT', 32)
+    target = getattr(settings, 'GATEWAY_LATENCY_TARGET_MS', 1500) / 1000
+    if _latency is None or _latency <= target:
+        return maximum
+    return max(1, int(maximum * target / _latency))
+
+
+def admit():
+    """True when another gateway call may start."""
+    return inflight() < limit()
+
+
+timing.add_observer(observe)
@@ -0,0 +1,212 @@
+"""Pre-aggregated donation analytics.
+
+``credit_transaction`` calls ``record_donation`` in the same database
+transaction that marks a donation completed. That call adds the amount
+to three places:
+
+* the campaign's hourly ``DonationRollup`` bucket for the provider,
+* the matching daily bucket,
+* the donor's ``DonorRollup`` row, when the donation has an email.
+
+Each write is one ``INSERT ... ON CONFLICT DO UPDATE``, so concurrent
+callbacks add to the same row instead of racing to create it. Buckets
+start on hour and local-midnight boundaries in ``TIME_ZONE``, based on
+``Transaction.completed_at``.
+
+``donation_series`` and ``top_donors`` read only the rollup tables, so
+dashboard queries cost the same however many transactions a campaign
+has. ``rebuild`` recomputes the rollups from completed transactions,
+archived ones included (``manage.py rebuild_rollups``), for backfills and
+repairs.
+"""
+from datetime import timedelta
+
+from django.db import connection, transaction as db_transaction
+from django.db.models import Count, Max, Sum
+from django.db.models.functions import Coalesce, Lower, TruncDay, TruncHour
+from django.utils import timezone
+
+from .models import PAYMENT_METHOD_CURRENCIES, DonationRollup, DonorRollup, Transaction, TransactionArchive
+from .money import Money
+
+GRANULARITIES = ('hour', 'day')
+# Default and longest window a series request covers.
+SERIES_WINDOWS = {
+    'hour': (timedelta(hours=48), timedelta(days=31)),
+    'day': (timedelta(days=30), timedelta(days=366)),
+}
+LEADERBOARD_MAX = 100
+# Rows per multi-row upsert (keeps SQLite under its parameter limit).
+UPSERT_BATCH_SIZE = 500
+
+
+def bucket_starts(when):
+    """Start of the hour and of the (local) day containing ``when``."""
+    local = timezone.localtime(when)
+    hour = local.replace(minute=0, second=0, microsecond=0)
+    return {'hour': hour, 'day': hour.replace(hour=0)}
+
+
+def _upsert(table, columns, rows, conflict, updates):
+    """Insert ``rows`` into ``table`` in one statement, applying ``updates`` to rows that exist."""
+    placeholders = ', '.join(['(' + ', '.join(['%s'] * len(columns)) + ')'] * len(rows))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES {placeholders} "
+            f"ON CONFLICT ({', '.join(conflict)}) DO UPDATE SET {updates}",
+            [value for row in rows for value in row],
+        )
+
+
+def record_donation(transaction, amount, completed_at):
+    """Add a completed donation of ``amount`` (Money) to its rollups.
+
+    Call inside the transaction that completes the donation so the rollups
+    never count a donation that was rolled back.
+    """
+    record_donations([(transaction, amount, completed_at)])
+
+
+def record_donations(donations):
+    """Add many ``(transaction, amount, completed_at)`` donations to their rollups.
+
+    Donations that share a bucket or a donor are summed first, so a batch
+    costs one upsert per ``UPSERT_BATCH_SIZE`` rollup rows, not per donation.
+    """
+    buckets = {}
+    donors = {}
+    for transaction, amount, completed_at in donations:
+        for granularity, start in bucket_starts(completed_at).items():
+            key = (transaction.campaign_id, granularity, start, transaction.payment_method, amount.currency)
+            total, count = buckets.get(key, (0, 0))
+            buckets[key] = (total + amount.minor, count + 1)
+        if transaction.donor_email:
+            key = (transaction.campaign_id, transaction.donor_email.lower(), amount.currency)
+            total, count, last = donors.get(key, (0, 0, completed_at))
+            donors[key] = (total + amount.minor, count + 1, max(last, completed_at))
+
+    adapt = connection.ops.adapt_datetimefield_value
+    table = DonationRollup._meta.db_table
+    rows = [
+        (campaign_id, granularity, adapt(start), provider, currency, total, count)
+        for (campaign_id, granularity, start, provider, currency), (total, count) in buckets.items()
+    ]
+    for i in range(0, len(rows), UPSERT_BATCH_SIZE):
+        _upsert(
+            table,
+            ('campaign_id', 'granularity', 'period_start', 'provider', 'currency', 'amount', 'count'),
+            rows[i:i + UPSERT_BATCH_SIZE],
+            conflict=('campaign_id', 'granularity', 'period_start', 'provider', 'currency'),
+            updates=f"amount = {table}.amount + excluded.amount, count = {table}.count + excluded.count",
+        )
+    table = DonorRollup._meta.db_table
+    greatest = 'MAX' if connection.vendor == 'sqlite' else 'GREATEST'
+    rows = [
+        (campaign_id, email, currency, total, count, adapt(last))
+        for (campaign_id, email, currency), (total, count, last) in donors.items()
+    ]
+    for i in range(0, len(rows), UPSERT_BATCH_SIZE):
+        _upsert(
+            table,
+            ('campaign_id', 'donor_email', 'currency', 'amount', 'count', 'last_donated_at'),
+            rows[i:i + UPSERT_BATCH_SIZE],
+            conflict=('campaign_id', 'donor_email', 'currency'),
+            updates=(
+                f"amount = {table}.amount + excluded.amount, count = {table}.count + excluded.count, "
+                f"last_donated_at = {greatest}({table}.last_donated_at, excluded.last_donated_at)"
+            ),
+        )
+
+
+def donation_series(campaign_id, granularity='day', since=None, until=None, provider=None):
+    """Donation buckets for one campaign, oldest first, read from the rollups.
+
+    The window defaults to the last 48 hours (hourly) or 30 days (daily)
+    and is clamped to 31 and 366 days. Returns dicts with ``period_start``,
+    ``provider``, ``currency``, ``amount`` (minor units) and ``count``.
+    Buckets with no donations are omitted.
+    """
+    default_window, max_window = SERIES_WINDOWS[granularity]
+    until = until or timezone.now()
+    since = max(since or until - default_window, until - max_window)
+    rollups = DonationRollup.objects.filter(
+        campaign_id=campaign_id, granularity=granularity, period_start__gte=bucket_starts(since)[granularity],
+        period_start__lt=until,
+    )
+    if provider:
+        rollups = rollups.filter(provider=provider)
+    return list(
+        rollups.order_by('period_start', 'provider')
+        .values('period_start', 'provider', 'currency', 'amount', 'count')
+    )
+
+
+def top_donors(campaign_id, currency, limit=10):
+    """The campaign's largest donors in ``currency``, read from ``DonorRollup``."""
+    return list(
+        DonorRollup.objects.filter(campaign_id=campaign_id, currency=currency)
+        .order_by('-amount', 'donor_email')[:min(limit, LEADERBOARD_MAX)]
+        .values('donor_email', 'amount', 'count', 'last_donated_at')
+    )
+
+
+def rebuild(campaign_ids=None):
+    """Recompute every rollup (or those of ``campaign_ids``) from completed transactions.
+
+    Archived transactions (``payments.sweeper``) are included. Donations
+    completed before ``completed_at`` existed are bucketed by
+    ``created_at``. A donation completing while this runs can be missed, so
+    run it when callbacks are quiet. Returns ``(donation_rollups,
+    donor_rollups)`` counts.
+    """
+    buckets = {}
+    donors = {}
+    tz = timezone.get_current_timezone()
+    for model in (Transaction, TransactionArchive):
+        completed = model.objects.filter(completed=True)
+        if campaign_ids is not None:
+            completed = completed.filter(campaign_id__in=campaign_ids)
+        completed = completed.annotate(done_at=Coalesce('completed_at', 'created_at'))
+        for granularity, trunc in (('hour', TruncHour), ('day', TruncDay)):
+            for bucket in (
+                completed.annotate(period=trunc('done_at', tzinfo=tz))
+                .values('campaign_id', 'period', 'payment_method')
+                .annotate(total=Sum('amount'), n=Count('pk'))
+            ):
+                currency = PAYMENT_METHOD_CURRENCIES.get(bucket['payment_method'], 'USD')
+                key = (bucket['campaign_id'], granularity, bucket['period'], bucket['payment_method'], currency)
+                total, count = buckets.get(key, (0, 0))
+                buckets[key] = (total + bucket['total'], count + bucket['n'])
+        for donor in (
+            completed.exclude(donor_email__isnull=True).exclude(donor_email='')
+            .annotate(email=Lower('donor_email'))
+            .values('campaign_id', 'email', 'payment_method')
+            .annotate(total=Sum('amount'), n=Count('pk'), last=Max('done_at'))
+        ):
+            # Several payment methods share a currency (Chapa and offline donations are in birr).
+            key = (donor['campaign_id'], donor['email'], PAYMENT_METHOD_CURRENCIES.get(donor['payment_method'], 'USD'))
+            total, count, last = donors.get(key, (0, 0, donor['last']))
+            donors[key] = (total + donor['total'], count + donor['n'], max(last, donor['last']))
+    donation_rows = [
+        DonationRollup(
+            campaign_id=campaign_id, granularity=granularity, period_start=period, provider=provider,
+            currency=currency, amount=Money(total, currency), count=count,
+        )
+        for (campaign_id, granularity, period, provider, currency), (total, count) in buckets.items()
+    ]
+    donor_rows = [
+        DonorRollup(
+            campaign_id=campaign_id, donor_email=email, currency=currency, amount=Money(total, currency), count=count,
+            last_donated_at=last,
+        )
+        for (campaign_id, email, currency), (total, count, last) in donors.items()
+    ]
+    with db_transaction.atomic():
+        for model in (DonationRollup, DonorRollup):
+            existing = model.objects.all()
+            if campaign_ids is not None:
+                existing = existing.filter(campaign_id__in=campaign_ids)
+            existing.delete()
+        DonationRollup.objects.bulk_create(donation_rows, batch_size=500)
+        DonorRollup.objects.bulk_create(donor_rows, batch_size=500)
+    return len(donation_rows), len(donor_rows)
@@ -1,6 +1,16 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate
 
 
 class PaymentsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'payments'
+
+    def ready(self):
+        from . import search
+        # Table rebuilds in SQLite migrations drop the search index triggers.
+        post_migrate.connect(search.ensure_index, sender=self)
+        from .utils import timing
+        # Time queries for ServerTimingMiddleware in whichever thread runs them.
+        connection_created.connect(timing.time_queries, dispatch_uid='payments.timing')
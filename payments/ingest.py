@@ -0,0 +1,239 @@
+"""Bulk import of offline donations (cash and bank transfers).
+
+Field teams hand in donations as CSV (with a header row) or NDJSON (one
+JSON object per line), streamed through ``POST /api/donations/import/`` or
+``manage.py import_donations``. Each record has:
+
+* ``campaign_id`` and ``amount`` (major units, e.g. ``"150.50"``), required;
+* ``payment_method``: ``cash`` (default) or ``bank_transfer``;
+* ``currency``: optional, must be the method's currency (ETB);
+* ``transaction_id``: the receipt or bank reference. Records without one
+  get an ``OFFLINE-`` id hashed from their campaign, method, amount, donor
+  and ``received_at``, and from how many identical records came before
+  them in the file, so the same file always yields the same ids;
+* ``donor_email`` and ``received_at`` (ISO date or datetime), optional.
+
+Records are validated as they are read and imported ``chunk_size`` at a
+time. A chunk costs one query for its campaigns, one for transaction ids
+already imported (archived ones included), one ``bulk_create``, one
+UPDATE adding the chunk's totals to every campaign it touches, the rollup
+upserts and the ``donation.completed`` outbox events (``payments.outbox``).
+Only that short database transaction holds the campaign rows, so a large
+file never locks them for longer than one chunk takes to write.
+
+Re-importing a file skips the records whose ``transaction_id`` is already
+stored, so a failed import can simply be run again.
+"""
+import csv
+import hashlib
+import json
+import logging
+
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction as db_transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+
+from . import analytics, metrics, outbox, progress
+from .models import OFFLINE_PAYMENT_METHODS, PAYMENT_METHOD_CURRENCIES, Campaign, Transaction, TransactionArchive
+from .money import Money
+from .utils.dates import parse_when
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ('csv', 'ndjson')
+IMPORT_CHUNK_SIZE = 1000
+# Errors listed in a summary; further failures are only counted.
+MAX_REPORTED_ERRORS = 1000
+BALANCE_FIELDS = {'ETB': 'total_birr', 'USD': 'total_usd'}
+MAX_CAMPAIGN_ID = 2 ** 63 - 1  # BIGINT primary key
+
+
+class RowError(ValueError):
+    pass
+
+
+def read_records(lines, fmt):
+    """Yield ``(line number, record)`` from ``lines``; ``record`` is None for a malformed NDJSON line."""
+    if fmt == 'csv':
+        reader = csv.DictReader(lines)
+        for record in reader:
+            yield reader.line_num, record
+        return
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = None
+        yield number, record if isinstance(record, dict) else None
+
+
+def _text(record, key):
+    value = record.get(key)
+    return '' if value is None else str(value).strip()
+
+
+def parse_record(record, now):
+    """Validate one record; returns a dict of ``Transaction`` fields or raises ``RowError``."""
+    if record is None:
+        raise RowError("Line is not a JSON object.")
+    campaign_id = _text(record, 'campaign_id')
+    if not (campaign_id.isascii() and campaign_id.isdecimal()):
+        raise RowError("campaign_id must be a campaign number.")
+    if len(campaign_id) > len(str(MAX_CAMPAIGN_ID)) or int(campaign_id) > MAX_CAMPAIGN_ID:
+        raise RowError(f"Campaign {campaign_id} does not exist.")
+    payment_method = _text(record, 'payment_method') or 'cash'
+    if payment_method not in OFFLINE_PAYMENT_METHODS:
+        raise RowError(f"payment_method must be one of: {', '.join(OFFLINE_PAYMENT_METHODS)}.")
+    currency = PAYMENT_METHOD_CURRENCIES[payment_method]
+    if _text(record, 'currency').upper() not in ('', currency):
+        raise RowError(f"{payment_method} donations are recorded in {currency}.")
+    try:
+        amount = Money.parse(_text(record, 'amount'), currency)
+    except ValueError:
+        amount = None
+    if amount is None or amount.minor <= 0:
+        raise RowError("Amount must be a positive number greater than 0.")
+    transaction_id = _text(record, 'transaction_id')
+    if len(transaction_id) > 100:
+        raise RowError("transaction_id is longer than 100 characters.")
+    donor_email = _text(record, 'donor_email') or None
+    if donor_email:
+        try:
+            validate_email(donor_email)
+        except ValidationError:
+            raise RowError(f"Invalid donor_email: {donor_email}")
+    received_at = now
+    if _text(record, 'received_at'):
+        try:
+            received_at = parse_when(_text(record, 'received_at'))
+        except ValueError as e:
+            raise RowError(str(e))
+        if received_at > now:
+            raise RowError("received_at is in the future.")
+    return {
+        'campaign_id': int(campaign_id),
+        'amount': amount,
+        'payment_method': payment_method,
+        'transaction_id': transaction_id,
+        'donor_email': donor_email,
+        'received_at': received_at,
+        # Identifies a record without a transaction_id (see offline_transaction_id).
+        'fingerprint': '|'.join([
+            campaign_id, payment_method, str(amount.minor), (donor_email or '').lower(), _text(record, 'received_at'),
+        ]),
+    }
+
+
+def offline_transaction_id(fingerprint, occurrence):
+    """The id of the ``occurrence``-th record in a file with ``fingerprint`` and no ``transaction_id``."""
+    return f"OFFLINE-{hashlib.sha256(f'{fingerprint}|{occurrence}'.encode()).hexdigest()[:32]}"
+
+
+def _fail(summary, line, transaction_id, error):
+    summary['failed'] += 1
+    if len(summary['errors']) < MAX_REPORTED_ERRORS:
+        summary['errors'].append({'line': line, 'transaction_id': transaction_id, 'error': error})
+
+
+def _import_chunk(chunk, summary, dry_run):
+    """Insert one chunk of parsed donations and credit their campaigns."""
+    campaigns = set(
+        Campaign.objects.filter(pk__in={d['campaign_id'] for _, d in chunk}).values_list('pk', flat=True)
+    )
+    transaction_ids = [d['transaction_id'] for _, d in chunk]
+    seen = set(
+        Transaction.objects.filter(transaction_id__in=transaction_ids).values_list('transaction_id', flat=True)
+        .union(TransactionArchive.objects.filter(transaction_id__in=transaction_ids).values_list('transaction_id', flat=True))
+    )
+    rows = []
+    transactions = []
+    for line, donation in chunk:
+        if donation['campaign_id'] not in campaigns:
+            _fail(summary, line, donation['transaction_id'], f"Campaign {donation['campaign_id']} does not exist.")
+            continue
+        if donation['transaction_id'] in seen:
+            summary['duplicates'] += 1
+            continue
+        seen.add(donation['transaction_id'])
+        rows.append(line)
+        transactions.append(Transaction(
+            campaign_id=donation['campaign_id'], amount=donation['amount'],
+            payment_method=donation['payment_method'], transaction_id=donation['transaction_id'],
+            donor_email=donation['donor_email'], completed=True,
+            created_at=donation['received_at'], completed_at=donation['received_at'],
+        ))
+    if not transactions or dry_run:
+        summary['imported'] += len(transactions)
+        return
+
+    totals = {}  # balance field -> {campaign id: minor units}
+    for transaction in transactions:
+        per_campaign = totals.setdefault(BALANCE_FIELDS[transaction.currency], {})
+        per_campaign[transaction.campaign_id] = per_campaign.get(transaction.campaign_id, 0) + transaction.amount.minor
+    increments = {
+        field: F(field) + Case(
+            *[When(pk=campaign_id, then=Value(minor)) for campaign_id, minor in per_campaign.items()],
+            default=Value(0), output_field=IntegerField(),
+        )
+        for field, per_campaign in totals.items()
+    }
+    try:
+        with db_transaction.atomic():
+            Transaction.objects.bulk_create(transactions)
+            Campaign.objects.filter(pk__in={t.campaign_id for t in transactions}).update(
+                **increments, version=F('version') + 1
+            )
+            analytics.record_donations((t, t.amount, t.completed_at) for t in transactions)
+            outbox.publish([outbox.donation_completed(t, t.amount, t.completed_at) for t in transactions])
+            db_transaction.on_commit(progress.notify)
+    except IntegrityError:
+        # Another import stored one of these transaction ids after the lookup above.
+        logger.warning("Donation import chunk conflicted with a concurrent import", exc_info=True)
+        for line, transaction in zip(rows, transactions):
+            _fail(summary, line, transaction.transaction_id, "Conflicted with a concurrent import; run it again.")
+        return
+    summary['imported'] += len(transactions)
+    for method in {t.payment_method for t in transactions}:
+        metrics.DONATIONS_COMPLETED.labels(method).inc(sum(t.payment_method == method for t in transactions))
+
+
+def import_donations(lines, fmt='csv', chunk_size=IMPORT_CHUNK_SIZE, dry_run=False):
+    """Import the donations in ``lines`` (an iterable of text lines in ``fmt``).
+
+    Returns a summary dict: ``rows`` read, ``imported``, ``duplicates``
+    (transaction ids already stored, skipped), ``failed`` and ``errors``, a
+    list of ``{'line', 'transaction_id', 'error'}`` capped at
+    ``MAX_REPORTED_ERRORS``. With ``dry_run`` nothing is written.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format: {fmt}")
+    summary = {'rows': 0, 'imported': 0, 'duplicates': 0, 'failed': 0, 'errors': []}
+    now = timezone.now()
+    occurrences = {}  # fingerprint -> records without a transaction_id read so far
+    chunk = []
+    for line, record in read_records(lines, fmt):
+        summary['rows'] += 1
+        try:
+            donation = parse_record(record, now)
+        except RowError as e:
+            _fail(summary, line, _text(record or {}, 'transaction_id'), str(e))
+        else:
+            if not donation['transaction_id']:
+                occurrence = occurrences[donation['fingerprint']] = occurrences.get(donation['fingerprint'], 0) + 1
+                donation['transaction_id'] = offline_transaction_id(donation['fingerprint'], occurrence)
+            chunk.append((line, donation))
+        if len(chunk) >= chunk_size:
+            _import_chunk(chunk, summary, dry_run)
+            chunk = []
+    if chunk:
+        _import_chunk(chunk, summary, dry_run)
+    summary['errors'].sort(key=lambda error: error['line'])
+    logger.info(
+        "Imported %d offline donations (%d duplicates, %d failed)",
+        summary['imported'], summary['duplicates'], summary['failed'],
+    )
+    return summary
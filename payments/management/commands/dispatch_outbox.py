@@ -0,0 +1,34 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from payments import outbox
+
+
+class Command(BaseCommand):
+    help = "Deliver queued donation and withdrawal events to their outbox handlers."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help="Keep running, one pass every --interval seconds.")
+        parser.add_argument(
+            '--interval', type=float, default=getattr(settings, 'OUTBOX_WORKER_INTERVAL', 1),
+            help="Seconds between passes with --loop when the outbox is drained.",
+        )
+        parser.add_argument('--batch-size', type=int, help="Events per pass (default OUTBOX_BATCH_SIZE).")
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            summary = outbox.dispatch(options['batch_size'])
+            handled = sum(summary.values())
+            if handled or not options['loop']:
+                self.stdout.write(
+                    f"Outbox events delivered: {summary['delivered']}, retrying: {summary['retrying']}, "
+                    f"failed: {summary['failed']}"
+                )
+            if not options['loop']:
+                break
+            if not handled:
+                time.sleep(options['interval'])
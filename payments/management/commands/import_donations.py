@@ -0,0 +1,34 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from payments import ingest
+
+
+class Command(BaseCommand):
+    help = "Import offline (cash and bank-transfer) donations from a CSV or NDJSON file."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import, or - for standard input.")
+        parser.add_argument(
+            '--format', choices=ingest.FORMATS,
+            help="File format (default: from the file extension, else csv).",
+        )
+        parser.add_argument('--chunk-size', type=int, default=ingest.IMPORT_CHUNK_SIZE, help="Donations per database transaction.")
+        parser.add_argument('--dry-run', action='store_true', help="Validate the file without writing anything.")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('ndjson' if path.endswith(('.ndjson', '.jsonl')) else 'csv')
+        try:
+            stream = sys.stdin if path == '-' else open(path, encoding='utf-8-sig', newline='')
+        except OSError as e:
+            raise CommandError(f"Cannot open {path}: {e}")
+        with stream:
+            summary = ingest.import_donations(stream, fmt, chunk_size=options['chunk_size'], dry_run=options['dry_run'])
+        for error in summary['errors']:
+            self.stderr.write(f"Line {error['line']}: {error['error']}" + (f" ({error['transaction_id']})" if error['transaction_id'] else ''))
+        self.stdout.write(
+            f"Rows: {summary['rows']}, imported: {summary['imported']}, duplicates: {summary['duplicates']}, "
+            f"failed: {summary['failed']}" + (" (dry run)" if options['dry_run'] else '')
+        )
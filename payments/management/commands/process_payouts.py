@@ -0,0 +1,30 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from payments import payouts
+
+
+class Command(BaseCommand):
+    help = "Batch queued withdrawal payouts, submit them to PayPal/Chapa and poll submitted batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help="Keep running, one pass every --interval seconds.")
+        parser.add_argument(
+            '--interval', type=float, default=getattr(settings, 'PAYOUT_WORKER_INTERVAL', 30),
+            help="Seconds between passes with --loop.",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            summary = payouts.process_payouts()
+            self.stdout.write(
+                f"Payout batches created: {summary['created']}, submitted: {summary['submitted']}, "
+                f"completed: {summary['completed']}"
+            )
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from payments import analytics
+
+
+class Command(BaseCommand):
+    help = "Recompute the donation analytics rollups from completed transactions."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--campaign', type=int, action='append', dest='campaigns',
+            help="Only rebuild this campaign's rollups (repeatable).",
+        )
+
+    def handle(self, *args, **options):
+        donations, donors = analytics.rebuild(options['campaigns'])
+        self.stdout.write(f"Donation rollups: {donations}, donor rollups: {donors}")
@@ -0,0 +1,28 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from payments import sweeper
+
+
+class Command(BaseCommand):
+    help = "Expire abandoned pending transactions and archive old completed and expired ones."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help="Keep running, one pass every --interval seconds.")
+        parser.add_argument(
+            '--interval', type=float, default=getattr(settings, 'SWEEPER_INTERVAL', 3600),
+            help="Seconds between passes with --loop.",
+        )
+        parser.add_argument('--batch-size', type=int, help="Rows per batch (default SWEEPER_BATCH_SIZE).")
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            summary = sweeper.sweep(batch_size=options['batch_size'])
+            self.stdout.write(f"Transactions expired: {summary['expired']}, archived: {summary['archived']}")
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
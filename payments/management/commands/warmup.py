@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from payments import warmup
+
+
+class Command(BaseCommand):
+    help = "Run the worker warm-up steps once and print how long each took."
+    # System checks import the URLconf, which would hide the cost of the urls step.
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('steps', nargs='*', help=f"Steps to run (default: all enabled): {', '.join(warmup.STEPS)}.")
+
+    def handle(self, *args, **options):
+        unknown = set(options['steps']) - set(warmup.STEPS)
+        if unknown:
+            raise CommandError(f"Unknown warm-up steps: {', '.join(sorted(unknown))}")
+        for step, ms in warmup.run(options['steps'] or None).items():
+            self.stdout.write(f"{step:<14}{ms:>10.1f} ms")
@@ -0,0 +1,277 @@
+"""In-process metrics shared across gunicorn workers.
+
+Recording a metric is a dict lookup and a locked add in the worker's own
+memory. A daemon thread in each process writes that process's totals to
+``METRICS_DIR/metrics-<pid>.json`` every ``METRICS_FLUSH_INTERVAL`` seconds,
+and the ``/metrics`` view sums every file into the Prometheus text format.
+Files of workers that have exited are kept so counters never go backwards;
+``gunicorn.conf.py`` clears ``METRICS_DIR`` when the server starts.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+from math import inf
+from pathlib import Path
+
+from django.conf import settings
+
+from .utils import timing
+
+_SEP = '\x1f'
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, inf)
+
+_registry = {}
+_lock = threading.Lock()
+_flusher = {'pid': None}
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        _registry[name] = self
+
+    def labels(self, *values):
+        values = tuple(str(value) for value in values)
+        child = self._children.get(values)
+        if child is None:
+            with _lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def snapshot(self):
+        return {_SEP.join(key): child.snapshot() for key, child in self._children.items()}
+
+    def reset(self):
+        # Zeroed in place: modules keep references to children (``_SPAN_HISTOGRAMS``).
+        for child in self._children.values():
+            child.reset()
+
+
+class _CounterChild:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount=1):
+        _ensure_flusher()
+        with _lock:
+            self.value += amount
+
+    def snapshot(self):
+        return self.value
+
+    def reset(self):
+        self.value = 0.0
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+
+class _HistogramChild:
+    __slots__ = ('buckets', 'counts', 'sum')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+
+    def observe(self, value):
+        _ensure_flusher()
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                break
+        with _lock:
+            self.counts[i] += 1
+            self.sum += value
+
+    def snapshot(self):
+        return {'counts': list(self.counts), 'sum': self.sum}
+
+    def reset(self):
+        self.counts = [0] * len(self.buckets)
+        self.sum = 0.0
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+
+DONATIONS_INITIATED = Counter(
+    'payments_donations_initiated_total', 'Donations sent to a payment provider.', ['provider'])
+DONATIONS_COMPLETED = Counter(
+    'payments_donations_completed_total', 'Donations verified and credited to a campaign.', ['provider'])
+GATEWAY_LATENCY = Histogram(
+    'payments_gateway_request_duration_seconds', 'Latency of calls to payment gateways.', ['gateway'])
+EXCHANGE_RATE_LOOKUPS = Counter(
+    'payments_exchange_rate_lookups_total', 'Exchange-rate lookups by cache result.', ['result'])
+EXCHANGE_RATE_LATENCY = Histogram(
+    'payments_exchange_rate_request_duration_seconds', 'Latency of exchange-rate API calls.')
+WEBHOOK_LAG = Histogram(
+    'payments_webhook_lag_seconds', 'Time from donation initiation to callback crediting.', ['provider'],
+    buckets=(1, 5, 15, 30, 60, 120, 300, 900, 1800, 3600, 21600, inf))
+WEBHOOK_EVENTS = Counter(
+    'payments_webhook_events_total', 'Signed provider webhooks by outcome.', ['provider', 'outcome'])
+REQUESTS_SHED = Counter(
+    'payments_requests_shed_total', 'Requests refused by rate limits (429) or admission control (503).', ['scope', 'reason'])
+WITHDRAWALS_PROCESSED = Counter(
+    'payments_withdrawals_processed_total', 'Withdrawal requests approved or rejected by staff.', ['status'])
+PAYOUTS = Counter(
+    'payments_payouts_total', 'Withdrawal payouts resolved by a provider batch.', ['provider', 'status'])
+PAYOUT_BATCHES_SUBMITTED = Counter(
+    'payments_payout_batches_submitted_total', 'Payout batches accepted by a provider.', ['provider'])
+OUTBOX_EVENTS = Counter(
+    'payments_outbox_events_total', 'Outbox events by delivery outcome.', ['topic', 'outcome'])
+OUTBOX_LAG = Histogram(
+    'payments_outbox_lag_seconds', 'Time from an outbox event being queued to its delivery.', ['topic'],
+    buckets=(0.5, 1, 2, 5, 15, 30, 60, 300, 900, 3600, inf))
+DB_QUERY_TIME = Histogram(
+    'payments_db_query_duration_seconds', 'Time spent in individual database queries.',
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0, inf))
+
+_SPAN_HISTOGRAMS = {
+    'chapa': GATEWAY_LATENCY.labels('chapa'),
+    'paypal': GATEWAY_LATENCY.labels('paypal'),
+    'paypal_oauth': GATEWAY_LATENCY.labels('paypal_oauth'),
+    'fx': EXCHANGE_RATE_LATENCY.labels(),
+    'db': DB_QUERY_TIME.labels(),
+}
+
+
+def _observe_span(name, seconds):
+    histogram = _SPAN_HISTOGRAMS.get(name)
+    if histogram is not None:
+        histogram.observe(seconds)
+
+
+timing.add_observer(_observe_span)
+
+
+def _metrics_dir():
+    path = getattr(settings, 'METRICS_DIR', None) or Path(tempfile.gettempdir()) / 'payments-metrics'
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def flush():
+    """Write this process's totals to its file in METRICS_DIR."""
+    with _lock:
+        data = {name: metric.snapshot() for name, metric in _registry.items()}
+    directory = _metrics_dir()
+    target = directory / f'metrics-{os.getpid()}.json'
+    tmp = directory / f'.metrics-{os.getpid()}.tmp'
+    tmp.write_text(json.dumps(data))
+    os.replace(tmp, target)
+
+
+def clear():
+    """Delete every process's metrics file, e.g. when a new deploy starts."""
+    for path in _metrics_dir().glob('metrics-*.json'):
+        path.unlink(missing_ok=True)
+
+
+def _flush_loop():
+    interval = getattr(settings, 'METRICS_FLUSH_INTERVAL', 5)
+    while True:
+        time.sleep(interval)
+        flush()
+
+
+def _ensure_flusher():
+    pid = os.getpid()
+    if _flusher['pid'] == pid:
+        return
+    with _lock:
+        if _flusher['pid'] == pid:
+            return
+        if _flusher['pid'] is not None:
+            # Forked from a process that already recorded: start this worker from zero.
+            for metric in _registry.values():
+                metric.reset()
+        _flusher['pid'] = pid
+        threading.Thread(target=_flush_loop, name='payments-metrics-flush', daemon=True).start()
+
+
+def collect():
+    """Sum the per-process files into ``{name: {label_key: value}}``."""
+    if _flusher['pid'] == os.getpid():
+        flush()
+    totals = {}
+    for path in _metrics_dir().glob('metrics-*.json'):
+        try:
+            data = json.loads(path.read_text())
+        except (OSError, ValueError):
+            continue
+        for name, series in data.items():
+            merged = totals.setdefault(name, {})
+            for key, value in series.items():
+                if isinstance(value, dict):
+                    current = merged.setdefault(key, {'counts': [0] * len(value['counts']), 'sum': 0.0})
+                    current['counts'] = [a + b for a, b in zip(current['counts'], value['counts'])]
+                    current['sum'] += value['sum']
+                else:
+                    merged[key] = merged.get(key, 0.0) + value
+    return totals
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, key, extra=()):
+    values = key.split(_SEP) if names else []
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_bound(bound):
+    return '+Inf' if bound == inf else repr(float(bound))
+
+
+def render():
+    """Render all metrics in the Prometheus text exposition format (0.0.4)."""
+    totals = collect()
+    lines = []
+    for name, metric in _registry.items():
+        lines.append(f'# HELP {name} {metric.documentation}')
+        lines.append(f'# TYPE {name} {metric.kind}')
+        for key, value in sorted(totals.get(name, {}).items()):
+            if metric.kind == 'counter':
+                lines.append(f'{name}{_format_labels(metric.labelnames, key)} {value}')
+                continue
+            cumulative = 0
+            for bound, count in zip(metric.buckets, value['counts']):
+                cumulative += count
+                labels = _format_labels(metric.labelnames, key, [('le', _format_bound(bound))])
+                lines.append(f'{name}_bucket{labels} {cumulative}')
+            labels = _format_labels(metric.labelnames, key)
+            lines.append(f'{name}_sum{labels} {value["sum"]}')
+            lines.append(f'{name}_count{labels} {cumulative}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,215 @@
+import json
+import logging
+import time
+from urllib.parse import urlsplit
+
+from asgiref.sync import async_to_sync, iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import FileResponse, HttpResponse, HttpResponseNotAllowed, HttpResponseNotModified
+
+from . import staticfiles
+from .utils import timing
+from .utils.profiling import StackSampler
+
+logger = logging.getLogger('payments.timing')
+
+
+class StaticFilesMiddleware:
+    """Serve the collected ``STATIC_ROOT`` ahead of the rest of the stack.
+
+    Files are indexed once when the middleware is created; a request picks
+    the brotli, gzip or plain copy from ``Accept-Encoding`` and streams it
+    as a ``FileResponse``. See ``payments.staticfiles``. Unused when nothing
+    has been collected, as in development, where ``runserver`` serves
+    static files. Must come first.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        self.prefix = urlsplit(settings.STATIC_URL).path
+        self.files = staticfiles.scan(settings.STATIC_ROOT, getattr(settings, 'STATIC_MAX_AGE', 60))
+        if not self.files:
+            raise MiddlewareNotUsed
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        static_file = self.lookup(request)
+        if static_file is not None:
+            return self.serve(request, static_file)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        static_file = self.lookup(request)
+        if static_file is not None:
+            return self.serve(request, static_file)
+        return await self.get_response(request)
+
+    def lookup(self, request):
+        path = request.path_info
+        if path.startswith(self.prefix):
+            return self.files.get(path[len(self.prefix):])
+        return None
+
+    def serve(self, request, static_file):
+        if request.method not in ('GET', 'HEAD'):
+            return HttpResponseNotAllowed(['GET', 'HEAD'])
+        encoding, path, size = static_file.select(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        etag = static_file.etag_for(encoding)
+        if etag in request.META.get('HTTP_IF_NONE_MATCH', ''):
+            response = HttpResponseNotModified()
+        else:
+            if request.method == 'HEAD':
+                response = HttpResponse(content_type=static_file.content_type)
+            else:
+                response = FileResponse(open(path, 'rb'), content_type=static_file.content_type)
+                del response['Content-Disposition']
+            response['Content-Length'] = size
+            if encoding:
+                response['Content-Encoding'] = encoding
+        response['ETag'] = etag
+        for header, value in static_file.headers.items():
+            response[header] = value
+        return response
+
+
+class ServerTimingMiddleware:
+    """Time database queries and upstream calls for each request.
+
+    The breakdown collected by ``payments.utils.timing`` is returned in a
+    ``Server-Timing`` header and logged as one JSON line on the
+    ``payments.timing`` logger. Requests faster than
+    ``SERVER_TIMING_LOG_THRESHOLD_MS`` are not logged.
+
+    Queries are timed by a wrapper that ``PaymentsConfig.ready`` installs on
+    every database connection; it adds to the timings of the request in the
+    current context. Under
+    the ASGI handler that includes the views' queries, which run in
+    ``sync_to_async`` threads.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        self.send_header = getattr(settings, 'SERVER_TIMING_HEADER', True)
+        self.log_threshold = getattr(settings, 'SERVER_TIMING_LOG_THRESHOLD_MS', 0) / 1000
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timings = timing.RequestTimings()
+        token = timing.activate(timings)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            timing.deactivate(token)
+        return self.finish(request, response, timings, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        timings = timing.RequestTimings()
+        token = timing.activate(timings)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            timing.deactivate(token)
+        return self.finish(request, response, timings, time.perf_counter() - start)
+
+    def finish(self, request, response, timings, total):
+        if self.send_header:
+            response['Server-Timing'] = timings.server_timing(total)
+        if total >= self.log_threshold and logger.isEnabledFor(logging.INFO):
+            logger.info("request_timing %s", json.dumps({
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'total_ms': round(total * 1000, 2),
+                'spans': timings.as_dict(),
+            }))
+        return response
+
+
+class RequestProfilerMiddleware:
+    """Profile a single request on demand for staff users.
+
+    A request is profiled when it carries the ``X-Profile`` header or a
+    ``profile`` query parameter (``REQUEST_PROFILER_HEADER`` /
+    ``REQUEST_PROFILER_QUERY_PARAM``) and the user is staff. The view runs
+    under a ``StackSampler`` and the collapsed stacks are saved as a
+    ``RequestProfile``, downloadable from the admin; the response carries
+    its id in ``X-Profile-Id``. Other requests only pay a header lookup and
+    a substring check on the query string. Must come after
+    ``AuthenticationMiddleware``.
+
+    The sampler follows one thread. Under the ASGI handler a profiled
+    request is therefore run from the thread that runs the views' sync
+    code, so the view's frames are in the samples.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        self.enabled = getattr(settings, 'REQUEST_PROFILER_ENABLED', True)
+        header = getattr(settings, 'REQUEST_PROFILER_HEADER', 'X-Profile')
+        self.meta_key = 'HTTP_' + header.upper().replace('-', '_')
+        self.query_param = getattr(settings, 'REQUEST_PROFILER_QUERY_PARAM', 'profile')
+        self.interval = getattr(settings, 'REQUEST_PROFILER_INTERVAL_MS', 2) / 1000
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.enabled or not self.is_flagged(request):
+            return self.get_response(request)
+        user = getattr(request, 'user', None)
+        if user is None or not user.is_staff:
+            return self.get_response(request)
+        return self.profile(request, user, self.get_response)
+
+    async def __acall__(self, request):
+        if not self.enabled or not self.is_flagged(request):
+            return await self.get_response(request)
+        user = await request.auser() if hasattr(request, 'auser') else None
+        if user is None or not user.is_staff:
+            return await self.get_response(request)
+        return await sync_to_async(self.profile)(request, user, async_to_sync(self.get_response))
+
+    def profile(self, request, user, get_response):
+        sampler = StackSampler(interval=self.interval).start()
+        start = time.perf_counter()
+        try:
+            response = get_response(request)
+        finally:
+            sampler.stop()
+        duration = time.perf_counter() - start
+
+        from .models import RequestProfile
+        profile = RequestProfile.objects.create(
+            user=user,
+            method=request.method,
+            path=request.get_full_path()[:500],
+            status_code=response.status_code,
+            duration_ms=round(duration * 1000, 2),
+            interval_ms=self.interval * 1000,
+            sample_count=sampler.samples,
+            collapsed_stacks=sampler.collapsed(),
+        )
+        response['X-Profile-Id'] = str(profile.pk)
+        return response
+
+    def is_flagged(self, request):
+        if self.meta_key in request.META:
+            return True
+        query = request.META.get('QUERY_STRING', '')
+        return bool(query) and self.query_param in query and self.query_param in request.GET
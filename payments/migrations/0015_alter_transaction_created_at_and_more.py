@@ -0,0 +1,28 @@
+# Generated by Django 5.2.1 on 2026-10-19 10:39
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("payments", "0014_remove_transaction_donor_phone_and_more"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="transaction",
+            name="created_at",
+            field=models.DateTimeField(
+                db_index=True, default=django.utils.timezone.now
+            ),
+        ),
+        migrations.AlterField(
+            model_name="withdrawalrequest",
+            name="requested_at",
+            field=models.DateTimeField(
+                db_index=True, default=django.utils.timezone.now
+            ),
+        ),
+    ]
@@ -0,0 +1,120 @@
+# Generated by Django 5.2.1 on 2026-10-19 10:41
+
+import django.db.models.deletion
+import django.utils.timezone
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("payments", "0015_alter_transaction_created_at_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PayoutBatch",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "provider",
+                    models.CharField(
+                        choices=[("paypal", "PayPal"), ("chapa", "Chapa")],
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Pending"),
+                            ("submitted", "Submitted"),
+                            ("completed", "Completed"),
+                            ("failed", "Failed"),
+                        ],
+                        db_index=True,
+                        default="pending",
+                        max_length=20,
+                    ),
+                ),
+                ("provider_batch_id", models.CharField(blank=True, max_length=100)),
+                ("currency", models.CharField(max_length=3)),
+                (
+                    "total_amount",
+                    models.DecimalField(
+                        decimal_places=2, default=Decimal("0.00"), max_digits=12
+                    ),
+                ),
+                ("item_count", models.PositiveIntegerField(default=0)),
+                ("error", models.TextField(blank=True)),
+                ("created_at", models.DateTimeField(default=django.utils.timezone.now)),
+                ("submitted_at", models.DateTimeField(blank=True, null=True)),
+                ("last_polled_at", models.DateTimeField(blank=True, null=True)),
+                ("completed_at", models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="withdrawalrequest",
+            name="payout_amount",
+            field=models.DecimalField(
+                blank=True, decimal_places=2, max_digits=10, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="withdrawalrequest",
+            name="payout_currency",
+            field=models.CharField(blank=True, max_length=3),
+        ),
+        migrations.AddField(
+            model_name="withdrawalrequest",
+            name="payout_error",
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name="withdrawalrequest",
+            name="payout_reference",
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name="withdrawalrequest",
+            name="payout_status",
+            field=models.CharField(
+                blank=True,
+                choices=[
+                    ("", "None"),
+                    ("queued", "Queued"),
+                    ("submitted", "Submitted"),
+                    ("paid", "Paid"),
+                    ("failed", "Failed"),
+                ],
+                db_index=True,
+                default="",
+                max_length=20,
+            ),
+        ),
+        migrations.AddField(
+            model_name="withdrawalrequest",
+            name="recipient_phone",
+            field=models.CharField(blank=True, max_length=20, null=True),
+        ),
+        migrations.AddField(
+            model_name="withdrawalrequest",
+            name="payout_batch",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="withdrawals",
+                to="payments.payoutbatch",
+            ),
+        ),
+    ]
@@ -0,0 +1,74 @@
+# Amounts move from DECIMAL(10, 2) columns to BIGINT minor units (see
+# payments.money). Each column is copied into a new one scaled by 100,
+# then the old column is dropped and the new one takes its name.
+
+from django.db import migrations, models
+from django.db.models.functions import Cast, Round
+
+import payments.money
+
+# (model, field, MoneyField kwargs)
+AMOUNT_FIELDS = [
+    ("campaign", "goal", {"currency": "ETB", "default": 0}),
+    ("campaign", "total_usd", {"currency": "USD", "default": 0}),
+    ("campaign", "total_birr", {"currency": "ETB", "default": 0}),
+    ("transaction", "amount", {"currency_field": "currency"}),
+    ("payoutbatch", "total_amount", {"currency_field": "currency", "default": 0}),
+    ("withdrawalrequest", "requested_amount", {"currency_field": "requested_currency", "default": 0}),
+    ("withdrawalrequest", "payout_amount", {"currency_field": "payout_currency", "blank": True, "null": True}),
+]
+
+
+def to_minor_units(apps, schema_editor):
+    for model_name, name, _ in AMOUNT_FIELDS:
+        model = apps.get_model("payments", model_name)
+        model.objects.update(**{f"{name}_minor": Cast(Round(models.F(name) * 100), models.BigIntegerField())})
+
+
+def to_decimal(apps, schema_editor):
+    for model_name, name, _ in AMOUNT_FIELDS:
+        model = apps.get_model("payments", model_name)
+        model.objects.update(**{name: models.F(f"{name}_minor") / 100.0})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("payments", "0017_requestprofile"),
+    ]
+
+    operations = (
+        [
+            # Lets the reverse migration re-add the column before copying amounts back.
+            migrations.AlterField(
+                model_name="transaction",
+                name="amount",
+                field=models.DecimalField(decimal_places=2, max_digits=10, null=True),
+            ),
+        ]
+        + [
+            migrations.AddField(
+                model_name=model_name,
+                name=f"{name}_minor",
+                field=payments.money.MoneyField(**{**kwargs, "null": True}),
+            )
+            for model_name, name, kwargs in AMOUNT_FIELDS
+        ]
+        + [migrations.RunPython(to_minor_units, to_decimal)]
+        + [
+            migrations.RemoveField(model_name=model_name, name=name)
+            for model_name, name, _ in AMOUNT_FIELDS
+        ]
+        + [
+            migrations.RenameField(model_name=model_name, old_name=f"{name}_minor", new_name=name)
+            for model_name, name, _ in AMOUNT_FIELDS
+        ]
+        + [
+            migrations.AlterField(
+                model_name=model_name,
+                name=name,
+                field=payments.money.MoneyField(**kwargs),
+            )
+            for model_name, name, kwargs in AMOUNT_FIELDS
+        ]
+    )
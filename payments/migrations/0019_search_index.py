@@ -0,0 +1,31 @@
+# Generated by Django 5.2.1 on 2026-10-19 11:01
+
+from django.db import migrations, models
+
+import payments.search
+
+
+def create_search_index(apps, schema_editor):
+    payments.search.create_index(schema_editor)
+
+
+def drop_search_index(apps, schema_editor):
+    payments.search.drop_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("payments", "0018_money_minor_units"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="transaction",
+            name="donor_email",
+            field=models.EmailField(
+                blank=True, db_index=True, max_length=254, null=True
+            ),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,120 @@
+# Generated by Django 5.2.1 on 2026-10-19 11:04
+
+import django.db.models.deletion
+import payments.money
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("payments", "0019_search_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="transaction",
+            name="completed_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name="DonationRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "granularity",
+                    models.CharField(
+                        choices=[("hour", "Hour"), ("day", "Day")], max_length=4
+                    ),
+                ),
+                ("period_start", models.DateTimeField()),
+                (
+                    "provider",
+                    models.CharField(
+                        choices=[("paypal", "PayPal"), ("chapa", "Chapa")],
+                        max_length=20,
+                    ),
+                ),
+                ("currency", models.CharField(max_length=3)),
+                (
+                    "amount",
+                    payments.money.MoneyField(currency_field="currency", default=0),
+                ),
+                ("count", models.PositiveIntegerField(default=0)),
+                (
+                    "campaign",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="donation_rollups",
+                        to="payments.campaign",
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=(
+                            "campaign",
+                            "granularity",
+                            "period_start",
+                            "provider",
+                            "currency",
+                        ),
+                        name="donation_rollup_bucket",
+                    )
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="DonorRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("donor_email", models.EmailField(max_length=254)),
+                ("currency", models.CharField(max_length=3)),
+                (
+                    "amount",
+                    payments.money.MoneyField(currency_field="currency", default=0),
+                ),
+                ("count", models.PositiveIntegerField(default=0)),
+                ("last_donated_at", models.DateTimeField()),
+                (
+                    "campaign",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="donor_rollups",
+                        to="payments.campaign",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["campaign", "currency", "-amount"],
+                        name="donor_rollup_leaderboard",
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("campaign", "donor_email", "currency"),
+                        name="donor_rollup_donor",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-19 11:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("payments", "0020_donation_rollups"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="campaign",
+            name="version",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.1 on 2026-10-19 11:10
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("payments", "0021_campaign_version"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="WebhookEvent",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "provider",
+                    models.CharField(
+                        choices=[("paypal", "PayPal"), ("chapa", "Chapa")],
+                        max_length=20,
+                    ),
+                ),
+                ("event_key", models.CharField(max_length=200)),
+                ("event_type", models.CharField(blank=True, max_length=50)),
+                (
+                    "reference",
+                    models.CharField(blank=True, db_index=True, max_length=100),
+                ),
+                ("payload", models.JSONField()),
+                (
+                    "received_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                ("processed_at", models.DateTimeField(blank=True, null=True)),
+                ("outcome", models.CharField(blank=True, max_length=30)),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("provider", "event_key"), name="webhook_event_once"
+                    )
+                ],
+            },
+        ),
+    ]
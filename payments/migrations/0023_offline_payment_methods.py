@@ -0,0 +1,39 @@
+# Generated by Django 5.2.1 on 2026-10-19 11:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("payments", "0022_webhook_event"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="donationrollup",
+            name="provider",
+            field=models.CharField(
+                choices=[
+                    ("paypal", "PayPal"),
+                    ("chapa", "Chapa"),
+                    ("cash", "Cash"),
+                    ("bank_transfer", "Bank transfer"),
+                ],
+                max_length=20,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="transaction",
+            name="payment_method",
+            field=models.CharField(
+                choices=[
+                    ("paypal", "PayPal"),
+                    ("chapa", "Chapa"),
+                    ("cash", "Cash"),
+                    ("bank_transfer", "Bank transfer"),
+                ],
+                max_length=20,
+            ),
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.1 on 2026-10-19 11:26
+
+import django.db.models.deletion
+import django.utils.timezone
+import payments.money
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("payments", "0024_outbox_event"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="transaction",
+            name="expired_at",
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.CreateModel(
+            name="TransactionArchive",
+            fields=[
+                ("id", models.BigIntegerField(primary_key=True, serialize=False)),
+                ("amount", payments.money.MoneyField(currency_field="currency")),
+                (
+                    "payment_method",
+                    models.CharField(
+                        choices=[
+                            ("paypal", "PayPal"),
+                            ("chapa", "Chapa"),
+                            ("cash", "Cash"),
+                            ("bank_transfer", "Bank transfer"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("transaction_id", models.CharField(max_length=100, unique=True)),
+                (
+                    "donor_email",
+                    models.EmailField(
+                        blank=True, db_index=True, max_length=254, null=True
+                    ),
+                ),
+                ("completed", models.BooleanField(default=False)),
+                ("created_at", models.DateTimeField(db_index=True)),
+                ("completed_at", models.DateTimeField(blank=True, null=True)),
+                ("expired_at", models.DateTimeField(blank=True, null=True)),
+                (
+                    "archived_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                (
+                    "campaign",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="archived_transactions",
+                        to="payments.campaign",
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.1 on 2026-10-19 11:29
+# Pending withdrawals now reserve their amount on the campaign (see
+# payments.services.reserve_withdrawal); existing ones are reserved here.
+
+import payments.money
+from django.db import migrations
+from django.db.models import Sum
+
+
+def reserve_pending(apps, schema_editor):
+    Campaign = apps.get_model("payments", "Campaign")
+    WithdrawalRequest = apps.get_model("payments", "WithdrawalRequest")
+    reserved = (
+        WithdrawalRequest.objects.filter(status="pending")
+        .values("campaign_id", "convert_to")
+        .annotate(total=Sum("requested_amount"))
+    )
+    for row in reserved:
+        field = "reserved_birr" if row["convert_to"] == "birr" else "reserved_usd"
+        Campaign.objects.filter(pk=row["campaign_id"]).update(**{field: row["total"]})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("payments", "0025_transaction_expiry_archive"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="campaign",
+            name="reserved_birr",
+            field=payments.money.MoneyField(currency="ETB", default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="campaign",
+            name="reserved_usd",
+            field=payments.money.MoneyField(currency="USD", default=0, editable=False),
+        ),
+        migrations.RunPython(reserve_pending, migrations.RunPython.noop),
+    ]
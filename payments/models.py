@@ -1,12 +1,16 @@
 from django.db import models
 from django.utils import timezone
 from django.conf import settings
-from decimal import Decimal
-from payments.utils.exchange_rate import get_exchange_rate
 import logging
+from .money import MoneyField, Rate, round_div
 
 logger = logging.getLogger(__name__)
 
+# Currency of each payment method's amounts. Offline donations (cash and bank
+# transfers collected by field teams, see payments.ingest) are in birr.
+PAYMENT_METHOD_CURRENCIES = {'chapa': 'ETB', 'paypal': 'USD', 'cash': 'ETB', 'bank_transfer': 'ETB'}
+OFFLINE_PAYMENT_METHODS = ('cash', 'bank_transfer')
+
 class Campaign(models.Model):
     title = models.CharField(max_length=200)
     description = models.TextField(blank=True)
@@ -16,56 +20,246 @@ class Campaign(models.Model):
         null=True,
         blank=True
     )
-    goal = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'))
-    total_usd = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
-    total_birr = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
+    goal = MoneyField(currency='ETB', default=0)
+    total_usd = MoneyField(currency='USD', default=0)
+    total_birr = MoneyField(currency='ETB', default=0)
+    # Held for pending withdrawals (see payments.services.reserve_withdrawal).
+    reserved_usd = MoneyField(currency='USD', default=0, editable=False)
+    reserved_birr = MoneyField(currency='ETB', default=0, editable=False)
     created_at = models.DateTimeField(default=timezone.now)
+    # Bumped with every balance change; progress streams watch it.
+    version = models.PositiveIntegerField(default=0, editable=False)
 
     def __str__(self):
         return self.title
 
-    def get_balance_in_birr(self):
-        """Calculate the total balance in ETB (Birr) including USD conversion."""
-        api_key = getattr(settings, 'EXCHANGE_RATE_API_KEY', None)
-        rate = get_exchange_rate('USD', 'ETB', api_key=api_key)
-        if rate == 0:
-            rate = 132.1
-            logger.warning("Using fallback exchange rate USD to ETB: 132.1 in get_balance_in_birr")
-        else:
-            logger.debug(f"Using exchange rate USD to ETB: {rate} in get_balance_in_birr")
-        balance = self.total_birr + (self.total_usd * Decimal(str(rate)))
-        return balance.quantize(Decimal('0.01'))
-
-    def get_percentage_funded(self):
+    def get_balance_in_birr(self, rate=None):
+        """Calculate the total balance in ETB (Birr) including USD conversion.
+
+        Pass ``rate`` (a number or a ``Rate``) to reuse a USD to ETB rate
+        already fetched for the request. Returns ETB ``Money``.
+        """
+        if rate is None:
+            from payments.utils.exchange_rate import get_exchange_rate
+            api_key = getattr(settings, 'EXCHANGE_RATE_API_KEY', None)
+            rate = get_exchange_rate('USD', 'ETB', api_key=api_key)
+            if rate == 0:
+                rate = 132.1
+                logger.warning("Using fallback exchange rate USD to ETB: 132.1 in get_balance_in_birr")
+            else:
+                logger.debug("Using exchange rate USD to ETB: %s in get_balance_in_birr", rate)
+        rate = rate if isinstance(rate, Rate) else Rate(rate)
+        return self.total_birr + rate.convert(self.total_usd, 'ETB')
+
+    def get_available_in_birr(self, rate):
+        """Balance in ETB that is not reserved for pending withdrawals, at ``rate`` (USD to ETB)."""
+        rate = rate if isinstance(rate, Rate) else Rate(rate)
+        return self.total_birr - self.reserved_birr + rate.convert(self.total_usd - self.reserved_usd, 'ETB')
+
+    def get_percentage_funded(self, rate=None):
         """Calculate the percentage of the goal funded based on balance in Birr."""
-        if self.goal <= 0:
+        goal = self.goal.minor
+        if goal <= 0:
             return 0.0
-        balance = self.get_balance_in_birr()
-        percentage = (balance / self.goal) * 100
-        logger.debug(f"Campaign {self.id}: balance_in_birr={balance}, goal={self.goal}, percentage={percentage}")
-        return float(percentage.quantize(Decimal('0.01')))
+        balance = self.get_balance_in_birr(rate)
+        # Percentage in hundredths, rounded like Decimal.quantize('0.01').
+        percentage = round_div(balance.minor * 10000, goal) / 100
+        logger.debug("Campaign %s: balance_in_birr=%s, goal=%s, percentage=%s", self.id, balance, self.goal, percentage)
+        return percentage
 
 class Transaction(models.Model):
     campaign = models.ForeignKey(Campaign, on_delete=models.CASCADE)
-    amount = models.DecimalField(max_digits=10, decimal_places=2)
-    payment_method = models.CharField(max_length=20, choices=[('paypal', 'PayPal'), ('chapa', 'Chapa')])
+    amount = MoneyField(currency_field='currency')
+    payment_method = models.CharField(max_length=20, choices=[
+        ('paypal', 'PayPal'),
+        ('chapa', 'Chapa'),
+        ('cash', 'Cash'),
+        ('bank_transfer', 'Bank transfer'),
+    ])
     transaction_id = models.CharField(max_length=100, unique=True)
-    donor_email = models.EmailField(blank=True, null=True)
+    donor_email = models.EmailField(blank=True, null=True, db_index=True)
     completed = models.BooleanField(default=False)
-    created_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+    completed_at = models.DateTimeField(blank=True, null=True)
+    # Set by payments.sweeper when a checkout is abandoned; cleared if it completes after all.
+    expired_at = models.DateTimeField(blank=True, null=True, db_index=True)
 
     def __str__(self):
         return f"{self.transaction_id} - {self.campaign.title}"
 
+    @property
+    def currency(self):
+        return PAYMENT_METHOD_CURRENCIES.get(self.payment_method, 'USD')
+
+class TransactionArchive(models.Model):
+    """A completed or expired ``Transaction`` moved out of the hot table (see ``payments.sweeper``)."""
+    id = models.BigIntegerField(primary_key=True)  # the original Transaction id
+    campaign = models.ForeignKey(Campaign, on_delete=models.CASCADE, related_name='archived_transactions')
+    amount = MoneyField(currency_field='currency')
+    payment_method = models.CharField(max_length=20, choices=Transaction._meta.get_field('payment_method').choices)
+    transaction_id = models.CharField(max_length=100, unique=True)
+    donor_email = models.EmailField(blank=True, null=True, db_index=True)
+    completed = models.BooleanField(default=False)
+    created_at = models.DateTimeField(db_index=True)
+    completed_at = models.DateTimeField(blank=True, null=True)
+    expired_at = models.DateTimeField(blank=True, null=True)
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return self.transaction_id
+
+    @property
+    def currency(self):
+        return PAYMENT_METHOD_CURRENCIES.get(self.payment_method, 'USD')
+
+class DonationRollup(models.Model):
+    """Completed donations to one campaign in one hour or day, per provider (see payments.analytics)."""
+    campaign = models.ForeignKey(Campaign, on_delete=models.CASCADE, related_name='donation_rollups')
+    granularity = models.CharField(max_length=4, choices=[('hour', 'Hour'), ('day', 'Day')])
+    period_start = models.DateTimeField()
+    provider = models.CharField(max_length=20, choices=Transaction._meta.get_field('payment_method').choices)
+    currency = models.CharField(max_length=3)
+    amount = MoneyField(currency_field='currency', default=0)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['campaign', 'granularity', 'period_start', 'provider', 'currency'], name='donation_rollup_bucket'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.campaign_id} {self.granularity} {self.period_start:%Y-%m-%d %H:%M} {self.provider}"
+
+class DonorRollup(models.Model):
+    """Running total of one donor's completed donations to one campaign, per currency."""
+    campaign = models.ForeignKey(Campaign, on_delete=models.CASCADE, related_name='donor_rollups')
+    donor_email = models.EmailField()
+    currency = models.CharField(max_length=3)
+    amount = MoneyField(currency_field='currency', default=0)
+    count = models.PositiveIntegerField(default=0)
+    last_donated_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['campaign', 'donor_email', 'currency'], name='donor_rollup_donor'),
+        ]
+        indexes = [
+            models.Index(fields=['campaign', 'currency', '-amount'], name='donor_rollup_leaderboard'),
+        ]
+
+    def __str__(self):
+        return f"{self.donor_email} - {self.campaign_id} ({self.currency})"
+
+class WebhookEvent(models.Model):
+    """A signed provider webhook, stored once per ``event_key`` (see ``payments.webhooks``)."""
+    provider = models.CharField(max_length=20, choices=[('paypal', 'PayPal'), ('chapa', 'Chapa')])
+    event_key = models.CharField(max_length=200)
+    event_type = models.CharField(max_length=50, blank=True)
+    reference = models.CharField(max_length=100, blank=True, db_index=True)
+    payload = models.JSONField()
+    received_at = models.DateTimeField(default=timezone.now)
+    processed_at = models.DateTimeField(blank=True, null=True)
+    outcome = models.CharField(max_length=30, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['provider', 'event_key'], name='webhook_event_once'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_provider_display()} {self.event_type or 'event'} {self.reference}"
+
+class OutboxEvent(models.Model):
+    """A side effect of a committed change, queued in the same transaction (see ``payments.outbox``)."""
+    campaign = models.ForeignKey(Campaign, on_delete=models.CASCADE)
+    topic = models.CharField(max_length=50)
+    payload = models.JSONField()
+    status = models.CharField(max_length=20, choices=[
+        ('pending', 'Pending'),
+        ('delivered', 'Delivered'),
+        ('failed', 'Failed'),
+    ], default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    # Not retried before this time after a failed delivery.
+    available_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    delivered_at = models.DateTimeField(blank=True, null=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'id'], name='outbox_status_id'),
+        ]
+
+    def __str__(self):
+        return f"{self.topic} #{self.pk}"
+
+class PayoutBatch(models.Model):
+    """One provider payout call covering many approved withdrawals."""
+    provider = models.CharField(max_length=20, choices=[('paypal', 'PayPal'), ('chapa', 'Chapa')])
+    status = models.CharField(max_length=20, choices=[
+        ('pending', 'Pending'),
+        ('submitted', 'Submitted'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ], default='pending', db_index=True)
+    provider_batch_id = models.CharField(max_length=100, blank=True)
+    currency = models.CharField(max_length=3)
+    total_amount = MoneyField(currency_field='currency', default=0)
+    item_count = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    submitted_at = models.DateTimeField(blank=True, null=True)
+    last_polled_at = models.DateTimeField(blank=True, null=True)
+    completed_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"{self.get_provider_display()} batch {self.id} ({self.item_count} items)"
+
 class WithdrawalRequest(models.Model):
     campaign = models.ForeignKey(Campaign, on_delete=models.CASCADE)
-    requested_amount = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'))
+    requested_amount = MoneyField(currency_field='requested_currency', default=0)
     payment_method = models.CharField(max_length=20, choices=[('paypal', 'PayPal'), ('chapa', 'Chapa')])
     recipient_email = models.EmailField(blank=True, null=True)
+    recipient_phone = models.CharField(max_length=20, blank=True, null=True)
     status = models.CharField(max_length=20, choices=[('pending', 'Pending'), ('approved', 'Approved'), ('rejected', 'Rejected')], default='pending')
     convert_to = models.CharField(max_length=10, choices=[('usd', 'USD'), ('birr', 'Birr')], default='birr')
-    requested_at = models.DateTimeField(default=timezone.now)
+    requested_at = models.DateTimeField(default=timezone.now, db_index=True)
     processed_at = models.DateTimeField(blank=True, null=True)
+    # Set on approval; payments.payouts moves the withdrawal through a PayoutBatch.
+    payout_status = models.CharField(max_length=20, choices=[
+        ('', 'None'),
+        ('queued', 'Queued'),
+        ('submitted', 'Submitted'),
+        ('paid', 'Paid'),
+        ('failed', 'Failed'),
+    ], default='', blank=True, db_index=True)
+    payout_amount = MoneyField(currency_field='payout_currency', blank=True, null=True)
+    payout_currency = models.CharField(max_length=3, blank=True)
+    payout_batch = models.ForeignKey(PayoutBatch, on_delete=models.SET_NULL, blank=True, null=True, related_name='withdrawals')
+    payout_reference = models.CharField(max_length=100, blank=True)
+    payout_error = models.TextField(blank=True)
+
+    def __str__(self):
+        return f"Withdrawal {self.id} - {self.campaign.title}"
+
+    @property
+    def requested_currency(self):
+        return 'ETB' if self.convert_to == 'birr' else 'USD'
+
+class RequestProfile(models.Model):
+    """Sampled stacks of one staff-flagged request (see RequestProfilerMiddleware)."""
+    user = models.ForeignKey('auth.User', on_delete=models.SET_NULL, null=True, blank=True)
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=500)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    duration_ms = models.FloatField()
+    interval_ms = models.FloatField()
+    sample_count = models.PositiveIntegerField(default=0)
+    collapsed_stacks = models.TextField(blank=True)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
 
     def __str__(self):
-        return f"Withdrawal {self.id} - {self.campaign.title}"
\ No newline at end of file
+        return f"{self.method} {self.path} ({self.duration_ms:.0f} ms)"
\ No newline at end of file
@@ -0,0 +1,289 @@
+"""Money amounts held as integer minor units (cents, santim).
+
+``Money`` pairs an ``int`` count of minor units with an ISO currency code,
+so sums, comparisons and balance checks are plain integer arithmetic.
+Decimals only appear at the edges: ``Money.parse`` reads user input and
+gateway amounts, and ``str()``/``format()`` print the amount.
+
+``Rate`` turns an exchange rate into an exact integer fraction once. After
+that, every conversion is a multiply and a rounded integer divide. Its
+``*_minor`` methods work on raw ints, so loops over ``values()`` rows never
+build a ``Money`` or a ``Decimal``.
+
+``MoneyField`` stores minor units in a BIGINT column. The instance
+attribute reads back as ``Money``, and querysets (``values()``,
+``aggregate(Sum(...))``, ``F()`` updates) work on the raw integers.
+Assigning a bare int to the attribute is an error, since ``100`` could
+mean 1.00 or 100.00; pass ``Money`` or a major-unit string or Decimal.
+"""
+from decimal import Decimal, DecimalException, InvalidOperation
+from functools import total_ordering
+
+from django import forms
+from django.core import exceptions
+from django.db import models
+from django.db.models.query_utils import DeferredAttribute
+
+# Both currencies we handle (USD, ETB) have two decimal places.
+DECIMAL_PLACES = 2
+MINOR_PER_UNIT = 10 ** DECIMAL_PLACES
+MAX_MINOR = 2 ** 63 - 1  # BIGINT
+
+
+def round_div(numerator, denominator):
+    """``numerator / denominator`` rounded half to even, in integers.
+
+    Matches ``Decimal.quantize`` under the default context. ``denominator``
+    must be positive.
+    """
+    quotient, remainder = divmod(numerator, denominator)
+    twice = remainder * 2
+    if twice > denominator or (twice == denominator and quotient & 1):
+        quotient += 1
+    return quotient
+
+
+def to_minor(value):
+    """Convert a major-unit amount (str, Decimal, float or int) to minor units.
+
+    Raises ``ValueError`` for anything that is not a finite number or does
+    not fit a BIGINT. Floats go through ``str`` so ``0.1`` means ``0.10``.
+    """
+    if isinstance(value, float):
+        value = str(value)
+    try:
+        amount = value if isinstance(value, Decimal) else Decimal(value)
+    except (InvalidOperation, TypeError):
+        raise ValueError(f"Invalid amount: {value!r}")
+    if not amount.is_finite():
+        raise ValueError(f"Invalid amount: {value!r}")
+    # Rejected before scaling: a huge exponent overflows the Decimal context.
+    if amount and amount.adjusted() + DECIMAL_PLACES > len(str(MAX_MINOR)):
+        raise ValueError(f"Amount out of range: {value!r}")
+    try:
+        minor = int(amount.scaleb(DECIMAL_PLACES).to_integral_value())
+    except DecimalException:
+        raise ValueError(f"Amount out of range: {value!r}")
+    if abs(minor) > MAX_MINOR:
+        raise ValueError(f"Amount out of range: {value!r}")
+    return minor
+
+
+def format_minor(minor):
+    """Format minor units as a major amount with two decimals (``1234`` -> ``'12.34'``)."""
+    if minor >= 0:
+        return '%d.%02d' % divmod(minor, MINOR_PER_UNIT)
+    return '-%d.%02d' % divmod(-minor, MINOR_PER_UNIT)
+
+
+@total_ordering
+class Money:
+    """An amount of ``currency`` held as an ``int`` number of minor units.
+
+    Money of different currencies cannot be added or compared; convert one
+    side with a ``Rate`` first. ``0`` is accepted on either side of ``+`` so
+    ``sum()`` works.
+    """
+    __slots__ = ('minor', 'currency')
+
+    def __init__(self, minor, currency):
+        self.minor = minor
+        self.currency = currency
+
+    @classmethod
+    def parse(cls, value, currency):
+        """Build Money from a major-unit amount; see ``to_minor``."""
+        return cls(to_minor(value), currency)
+
+    @property
+    def amount(self):
+        """The amount in major units as a two-place ``Decimal``."""
+        return Decimal(self.minor).scaleb(-DECIMAL_PLACES)
+
+    def _check(self, other):
+        if not isinstance(other, Money):
+            return NotImplemented
+        if other.currency != self.currency:
+            raise ValueError(f"Cannot combine {self.currency} and {other.currency} amounts")
+        return other.minor
+
+    def __add__(self, other):
+        if isinstance(other, int) and other == 0:
+            return self
+        minor = self._check(other)
+        if minor is NotImplemented:
+            return NotImplemented
+        return Money(self.minor + minor, self.currency)
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        minor = self._check(other)
+        if minor is NotImplemented:
+            return NotImplemented
+        return Money(self.minor - minor, self.currency)
+
+    def __neg__(self):
+        return Money(-self.minor, self.currency)
+
+    def __eq__(self, other):
+        if not isinstance(other, Money):
+            return NotImplemented
+        return self.minor == other.minor and self.currency == other.currency
+
+    def __lt__(self, other):
+        minor = self._check(other)
+        if minor is NotImplemented:
+            return NotImplemented
+        return self.minor < minor
+
+    def __hash__(self):
+        return hash((self.minor, self.currency))
+
+    def __bool__(self):
+        return self.minor != 0
+
+    def __str__(self):
+        return format_minor(self.minor)
+
+    def __format__(self, spec):
+        if not spec:
+            return format_minor(self.minor)
+        return format(self.amount, spec)
+
+    def __repr__(self):
+        return f"Money('{self}', '{self.currency}')"
+
+
+class Rate:
+    """An exchange rate from ``base`` to ``quote`` as an exact integer fraction.
+
+    ``Rate(132.1)`` is 1 USD = 132.1 ETB. Conversions round half to even,
+    like the ``Decimal`` quantize they replace.
+    """
+    __slots__ = ('value', 'base', 'quote', 'numerator', 'denominator')
+
+    def __init__(self, value, base='USD', quote='ETB'):
+        self.value = value
+        self.base = base
+        self.quote = quote
+        self.numerator, self.denominator = Decimal(str(value)).as_integer_ratio()
+        if self.numerator <= 0:
+            raise ValueError(f"Exchange rate must be positive: {value!r}")
+
+    def to_quote_minor(self, minor):
+        return round_div(minor * self.numerator, self.denominator)
+
+    def to_base_minor(self, minor):
+        return round_div(minor * self.denominator, self.numerator)
+
+    def convert(self, money, currency):
+        """Convert ``money`` to ``currency`` (either side of the rate)."""
+        if money.currency == currency:
+            return money
+        if money.currency == self.base and currency == self.quote:
+            return Money(self.to_quote_minor(money.minor), currency)
+        if money.currency == self.quote and currency == self.base:
+            return Money(self.to_base_minor(money.minor), currency)
+        raise ValueError(f"Rate {self.base}/{self.quote} cannot convert {money.currency} to {currency}")
+
+    def __repr__(self):
+        return f"Rate({self.value!r}, {self.base!r}, {self.quote!r})"
+
+
+class MinorUnits(int):
+    """Minor units read back from the database.
+
+    The only bare int a ``MoneyField`` attribute accepts, so ``goal=100``
+    typed in application code cannot be mistaken for 1.00.
+    """
+    __slots__ = ()
+
+
+class MoneyAttribute(DeferredAttribute):
+    """Keep the raw minor units on the instance and read them back as Money."""
+
+    def __get__(self, instance, cls=None):
+        if instance is None:
+            return self
+        minor = super().__get__(instance, cls)
+        if minor is None:
+            return None
+        return Money(minor, self.field.currency_for(instance))
+
+    def __set__(self, instance, value):
+        if isinstance(value, int) and not isinstance(value, MinorUnits):
+            raise ValueError(
+                f'Cannot assign {value!r} to "{instance._meta.object_name}.{self.field.name}": '
+                f'a bare int could be minor or major units. Use Money or a major-unit string or Decimal.'
+            )
+        if not hasattr(value, 'resolve_expression'):
+            value = self.field.to_python(value)
+        instance.__dict__[self.field.attname] = value
+
+
+class MoneyField(models.BigIntegerField):
+    """A ``Money`` amount stored as BIGINT minor units.
+
+    The currency is either fixed (``currency='ETB'``) or read from another
+    attribute of the instance (``currency_field='payout_currency'``), which
+    may be a property. Assign ``Money``, or a string, Decimal or float in
+    major units as typed into a form. Bare ints are refused: the column
+    holds minor units, and only values loaded from the database (or the
+    field default) come through as ``MinorUnits``.
+    """
+    descriptor_class = MoneyAttribute
+
+    def __init__(self, *args, currency=None, currency_field=None, **kwargs):
+        if (currency is None) == (currency_field is None):
+            raise TypeError("MoneyField needs exactly one of currency or currency_field")
+        self.currency = currency
+        self.currency_field = currency_field
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if self.currency is not None:
+            kwargs['currency'] = self.currency
+        else:
+            kwargs['currency_field'] = self.currency_field
+        return name, path, args, kwargs
+
+    def currency_for(self, instance):
+        return self.currency or getattr(instance, self.currency_field, '')
+
+    def get_default(self):
+        default = super().get_default()
+        return MinorUnits(default) if isinstance(default, int) else default
+
+    def from_db_value(self, value, expression, connection):
+        return value if value is None else MinorUnits(value)
+
+    def to_python(self, value):
+        if value is None or isinstance(value, int):
+            return value
+        if isinstance(value, Money):
+            return MinorUnits(value.minor)
+        try:
+            return to_minor(value)
+        except ValueError:
+            raise exceptions.ValidationError(self.error_messages['invalid'], code='invalid', params={'value': value})
+
+    def get_prep_value(self, value):
+        if isinstance(value, Money):
+            value = value.minor
+        elif value is not None and not isinstance(value, int) and not hasattr(value, 'resolve_expression'):
+            value = to_minor(value)
+        return super().get_prep_value(value)
+
+    def value_to_string(self, obj):
+        value = self.value_from_object(obj)
+        return '' if value is None else str(value)
+
+    def formfield(self, **kwargs):
+        # Skip BigIntegerField's min/max, which are in minor units.
+        return models.Field.formfield(self, **{
+            'form_class': forms.DecimalField,
+            'decimal_places': DECIMAL_PLACES,
+            **kwargs,
+        })
@@ -0,0 +1,159 @@
+"""Transactional outbox for donation and withdrawal side effects.
+
+The code that completes a donation (``credit_transaction``, the offline
+import) or approves a withdrawal (``approve_withdrawals``) also writes an
+``OutboxEvent`` in the same database transaction. The event exists if and
+only if the change committed. Receipts, notifications and the like
+therefore never run inside a provider callback, and they are not lost
+when a worker dies right after the commit.
+
+``manage.py dispatch_outbox --loop`` drains the table. Each pass reads up
+to ``OUTBOX_BATCH_SIZE`` pending events in id order and hands each one to
+the handlers registered for its topic:
+
+    outbox.register(outbox.DONATION_COMPLETED, send_receipt)
+
+Delivery is at least once. A handler that raises fails the event, which is
+retried with exponential backoff, and every handler of the topic runs
+again. Handlers must therefore be idempotent; ``event.pk`` is a stable key
+for that. Delivery is ordered per campaign. While an event waits for its
+retry, later events of the same campaign wait behind it. After
+``OUTBOX_MAX_ATTEMPTS`` the event is marked failed and its campaign moves
+on; failed events can be requeued from the admin.
+
+Run a single dispatcher. Outcomes of a pass are saved together at the end,
+so a dispatcher killed mid-pass redelivers that pass's events.
+"""
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import metrics
+from .models import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+DONATION_COMPLETED = 'donation.completed'
+WITHDRAWAL_APPROVED = 'withdrawal.approved'
+
+RETRY_BASE_SECONDS = 5
+RETRY_MAX_SECONDS = 3600
+PRUNE_INTERVAL = 3600
+
+_handlers = {}  # topic -> list of callables taking the OutboxEvent
+_last_prune = time.time()
+
+
+def register(topic, handler):
+    """Deliver ``topic`` events to ``handler`` (call from ``AppConfig.ready``)."""
+    _handlers.setdefault(topic, []).append(handler)
+
+
+def unregister(topic, handler):
+    _handlers.get(topic, []).remove(handler)
+
+
+def donation_completed(transaction, amount, completed_at):
+    """Outbox event for a completed donation of ``amount`` (Money); not saved."""
+    return OutboxEvent(
+        campaign_id=transaction.campaign_id, topic=DONATION_COMPLETED, payload={
+            'transaction': transaction.pk,
+            'transaction_id': transaction.transaction_id,
+            'payment_method': transaction.payment_method,
+            'amount': amount.minor,
+            'currency': amount.currency,
+            'donor_email': transaction.donor_email,
+            'completed_at': completed_at.isoformat(),
+        },
+    )
+
+
+def withdrawal_approved(withdrawal, amount):
+    """Outbox event for an approved withdrawal of ``amount`` (Money, from the balance); not saved."""
+    return OutboxEvent(
+        campaign_id=withdrawal.campaign_id, topic=WITHDRAWAL_APPROVED, payload={
+            'withdrawal': withdrawal.pk,
+            'payment_method': withdrawal.payment_method,
+            'amount': amount.minor,
+            'currency': amount.currency,
+            'payout_amount': withdrawal.payout_amount.minor,
+            'payout_currency': withdrawal.payout_currency,
+            'approved_at': withdrawal.processed_at.isoformat(),
+        },
+    )
+
+
+def publish(events):
+    """Save ``events``; call inside the transaction that makes the change they describe."""
+    OutboxEvent.objects.bulk_create(events, batch_size=500)
+
+
+def retry_delay(attempts):
+    return timedelta(seconds=min(RETRY_BASE_SECONDS * 2 ** (attempts - 1), RETRY_MAX_SECONDS))
+
+
+def dispatch(batch_size=None):
+    """Deliver one batch of pending events. Returns ``{'delivered', 'retrying', 'failed'}`` counts."""
+    batch_size = batch_size or getattr(settings, 'OUTBOX_BATCH_SIZE', 200)
+    max_attempts = getattr(settings, 'OUTBOX_MAX_ATTEMPTS', 10)
+    now = timezone.now()
+    # Campaigns whose oldest pending event is waiting for a retry.
+    waiting = OutboxEvent.objects.filter(status='pending', available_at__gt=now).values('campaign_id')
+    events = list(
+        OutboxEvent.objects.filter(status='pending').exclude(campaign_id__in=waiting).order_by('pk')[:batch_size]
+    )
+    summary = {'delivered': 0, 'retrying': 0, 'failed': 0}
+    held = set()
+    done = []
+    for event in events:
+        if event.campaign_id in held:
+            continue
+        event.attempts += 1
+        try:
+            for handler in _handlers.get(event.topic, ()):
+                handler(event)
+        except Exception as e:
+            event.last_error = f"{type(e).__name__}: {e}"[:2000]
+            if event.attempts >= max_attempts:
+                logger.error("Outbox event %s (%s) failed after %d attempts: %s", event.pk, event.topic, event.attempts, e)
+                event.status = 'failed'
+                outcome = 'failed'
+            else:
+                logger.warning("Outbox event %s (%s) failed, attempt %d: %s", event.pk, event.topic, event.attempts, e)
+                event.available_at = timezone.now() + retry_delay(event.attempts)
+                held.add(event.campaign_id)
+                outcome = 'retrying'
+            summary[outcome] += 1
+            metrics.OUTBOX_EVENTS.labels(event.topic, outcome).inc()
+        else:
+            event.status = 'delivered'
+            event.delivered_at = timezone.now()
+            event.last_error = ''
+            summary['delivered'] += 1
+            metrics.OUTBOX_EVENTS.labels(event.topic, 'delivered').inc()
+            metrics.OUTBOX_LAG.labels(event.topic).observe((event.delivered_at - event.created_at).total_seconds())
+        done.append(event)
+    if done:
+        OutboxEvent.objects.bulk_update(
+            done, ['status', 'attempts', 'available_at', 'last_error', 'delivered_at'], batch_size=500
+        )
+    _maybe_prune()
+    return summary
+
+
+def requeue(events):
+    """Put failed ``events`` (a queryset) back in the queue; returns how many."""
+    return events.filter(status='failed').update(status='pending', attempts=0, available_at=timezone.now())
+
+
+def _maybe_prune():
+    """Delete delivered events older than ``OUTBOX_RETENTION_DAYS``, at most once per ``PRUNE_INTERVAL``."""
+    global _last_prune
+    if time.time() - _last_prune < PRUNE_INTERVAL:
+        return
+    _last_prune = time.time()
+    cutoff = timezone.now() - timedelta(days=getattr(settings, 'OUTBOX_RETENTION_DAYS', 7))
+    OutboxEvent.objects.filter(status='delivered', delivered_at__lt=cutoff).delete()
@@ -0,0 +1,389 @@
+"""Batched payouts for approved withdrawals.
+
+Approval queues a withdrawal (``payout_status='queued'``) with the amount and
+currency to send. :func:`create_batches` groups queued withdrawals into
+``PayoutBatch`` rows per provider, :func:`submit_batch` sends a whole batch in
+one PayPal Payouts or Chapa bulk-transfer call, and :func:`poll_batches`
+fetches each submitted batch's item statuses in one (paged) call and updates
+its withdrawals in bulk. The ``process_payouts`` management command runs the
+three steps from a worker process, so admin requests never wait on a payout
+API. Run a single worker.
+
+A submission whose response is lost (timeout, 5xx) may still have been
+accepted, so nothing derived from it may change on retry:
+
+* each withdrawal's reference (``wd-<pk>``) is set once and kept when a
+  failed payout is requeued into a new batch. Chapa refuses a transfer
+  whose reference it already accepted. PayPal only deduplicates within one
+  ``sender_batch_id`` and a requeued item goes out in a new batch, so a
+  PayPal payout must be checked in PayPal before it is requeued;
+* PayPal calls carry ``PayPal-Request-Id`` (the ``sender_batch_id``), so a
+  retried POST returns the original batch instead of creating another;
+* a provider answering that the batch or a reference already exists means
+  "already submitted", never "failed". The batch is marked submitted and
+  its items are looked up by reference (Chapa). PayPal offers no lookup by
+  ``sender_batch_id``, so such a batch is left submitted without a
+  provider id and logged for staff to reconcile; it is never resent.
+"""
+import logging
+from datetime import timedelta
+
+import requests
+from django.conf import settings
+from django.db import transaction as db_transaction
+from django.utils import timezone
+
+from . import metrics
+from .models import PayoutBatch, WithdrawalRequest
+from .services import BULK_BATCH_SIZE
+from .utils import http, timing
+from .utils.log import Truncated
+from .views import get_paypal_access_token
+
+logger = logging.getLogger(__name__)
+
+PAYPAL_PAGE_SIZE = 1000
+# Lower-cased fragments of a 4xx body saying the batch or a reference was already accepted.
+DUPLICATE_MARKERS = ('duplicate', 'already exist', 'already been used', 'already used')
+
+# Item statuses reported by the providers, mapped to WithdrawalRequest.payout_status.
+# Anything not listed (PENDING, UNCLAIMED, ONHOLD, queued...) is still in flight.
+PAYPAL_ITEM_STATUSES = {
+    'SUCCESS': 'paid',
+    'FAILED': 'failed',
+    'RETURNED': 'failed',
+    'BLOCKED': 'failed',
+    'REFUNDED': 'failed',
+    'REVERSED': 'failed',
+    'DENIED': 'failed',
+}
+CHAPA_ITEM_STATUSES = {
+    'success': 'paid',
+    'failed': 'failed',
+    'reversed': 'failed',
+    'cancelled': 'failed',
+}
+
+class PayoutError(Exception):
+    """A provider call failed; ``retryable`` errors leave the batch pending.
+
+    ``duplicate`` errors say the provider already holds the submission.
+    """
+
+    def __init__(self, message, retryable=False, duplicate=False):
+        super().__init__(message)
+        self.retryable = retryable
+        self.duplicate = duplicate
+
+def _batch_size(provider):
+    if provider == 'paypal':
+        return getattr(settings, 'PAYOUT_BATCH_SIZE_PAYPAL', 500)
+    return getattr(settings, 'PAYOUT_BATCH_SIZE_CHAPA', 100)
+
+def _call(gateway, method, url, **kwargs):
+    """Make one provider request and return its JSON body, or raise PayoutError."""
+    try:
+        with timing.track(gateway):
+            response = http.get_session().request(method, url, timeout=getattr(settings, 'PAYOUT_REQUEST_TIMEOUT', 30), **kwargs)
+    except requests.RequestException as e:
+        raise PayoutError(str(e), retryable=True)
+    if response.status_code >= 400:
+        retryable = response.status_code >= 500 or response.status_code == 429
+        duplicate = not retryable and (
+            response.status_code == 409 or any(marker in response.text.lower() for marker in DUPLICATE_MARKERS)
+        )
+        raise PayoutError(f"HTTP {response.status_code}: {response.text[:500]}", retryable=retryable, duplicate=duplicate)
+    try:
+        return response.json()
+    except ValueError:
+        raise PayoutError(f"Invalid JSON from {gateway}: {response.text[:500]}", retryable=True)
+
+def create_batches():
+    """Group queued withdrawals into pending ``PayoutBatch`` rows.
+
+    Withdrawals are grouped by provider and currency and chunked to the
+    provider's batch size (``PAYOUT_BATCH_SIZE_PAYPAL``/``PAYOUT_BATCH_SIZE_CHAPA``).
+    Returns the new batches.
+    """
+    batches = []
+    with db_transaction.atomic():
+        queued = list(
+            WithdrawalRequest.objects.select_for_update()
+            .filter(status='approved', payout_status='queued', payout_batch__isnull=True)
+            .order_by('pk')
+        )
+        groups = {}
+        for withdrawal in queued:
+            groups.setdefault((withdrawal.payment_method, withdrawal.payout_currency), []).append(withdrawal)
+
+        assigned = []
+        for (provider, currency), withdrawals in groups.items():
+            size = _batch_size(provider)
+            for start in range(0, len(withdrawals), size):
+                chunk = withdrawals[start:start + size]
+                batch = PayoutBatch.objects.create(
+                    provider=provider,
+                    currency=currency,
+                    item_count=len(chunk),
+                    total_amount=sum(w.payout_amount for w in chunk),
+                )
+                for withdrawal in chunk:
+                    withdrawal.payout_batch = batch
+                    # Kept across requeues: the provider may already hold this reference.
+                    withdrawal.payout_reference = withdrawal.payout_reference or f"wd-{withdrawal.pk}"
+                    withdrawal.payout_error = ''
+                assigned.extend(chunk)
+                batches.append(batch)
+        if assigned:
+            WithdrawalRequest.objects.bulk_update(
+                assigned, ['payout_batch', 'payout_reference', 'payout_error'], batch_size=BULK_BATCH_SIZE
+            )
+    for batch in batches:
+        logger.info("Created %s payout batch %s with %s items (%s %s)",
+                    batch.provider, batch.id, batch.item_count, batch.total_amount, batch.currency)
+    return batches
+
+def _submit_paypal(batch, withdrawals):
+    token, error = get_paypal_access_token()
+    if not token:
+        raise PayoutError(f"PayPal authentication failed: {error}", retryable=True)
+    sender_batch_id = f"payout-batch-{batch.pk}"
+    payload = {
+        "sender_batch_header": {
+            "sender_batch_id": sender_batch_id,
+            "email_subject": "You have a payout from Community Funding",
+            "recipient_type": "EMAIL",
+        },
+        "items": [
+            {
+                "recipient_type": "EMAIL",
+                "amount": {"value": format(w.payout_amount, '.2f'), "currency": w.payout_currency},
+                "receiver": w.recipient_email,
+                "sender_item_id": w.payout_reference,
+                "note": f"Withdrawal {w.pk} from {w.campaign.title}",
+            }
+            for w in withdrawals
+        ],
+    }
+    data = _call('paypal', 'POST', f"{settings.PAYPAL_API_BASE}/v1/payments/payouts", json=payload, headers={
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {token}",
+        "PayPal-Request-Id": sender_batch_id,
+    })
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("PayPal payout response: %s", Truncated(data), extra={'payload': True})
+    payout_batch_id = data.get('batch_header', {}).get('payout_batch_id')
+    if not payout_batch_id:
+        raise PayoutError(f"PayPal returned no payout_batch_id: {Truncated(data)}")
+    return payout_batch_id
+
+def _chapa_account_name(withdrawal):
+    creator = withdrawal.campaign.creator
+    if creator is not None:
+        return creator.get_full_name() or creator.username
+    return withdrawal.campaign.title
+
+def _submit_chapa(batch, withdrawals):
+    bank_code = getattr(settings, 'CHAPA_PAYOUT_BANK_CODE', '')
+    if not bank_code:
+        raise PayoutError("CHAPA_PAYOUT_BANK_CODE is not set", retryable=True)
+    payload = {
+        "title": f"Payout batch {batch.pk}",
+        "currency": batch.currency,
+        "bulk_data": [
+            {
+                "account_name": _chapa_account_name(w),
+                "account_number": w.recipient_phone,
+                "amount": format(w.payout_amount, '.2f'),
+                "reference": w.payout_reference,
+                "bank_code": bank_code,
+            }
+            for w in withdrawals
+        ],
+    }
+    data = _call('chapa', 'POST', f"{settings.CHAPA_API_BASE}/v1/bulk-transfers", json=payload, headers={
+        "Authorization": f"Bearer {settings.CHAPA_TEST_SECRET_KEY}",
+        "Content-Type": "application/json",
+    })
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Chapa bulk transfer response: %s", Truncated(data), extra={'payload': True})
+    batch_id = (data.get('data') or {}).get('id')
+    if data.get('status') != 'success' or not batch_id:
+        raise PayoutError(data.get('message') or f"Chapa bulk transfer failed: {Truncated(data)}")
+    return str(batch_id)
+
+def submit_batch(batch):
+    """Send ``batch`` to its provider in one API call.
+
+    On success the batch and its withdrawals become ``submitted``. So they
+    do when the provider reports the submission as a duplicate: an earlier
+    attempt got through and only its response was lost. Retryable errors
+    (network, 5xx, 429, missing configuration) leave the batch pending for
+    the next run; any other error fails the batch and its withdrawals,
+    which staff can requeue from the admin.
+    """
+    withdrawals = list(batch.withdrawals.select_related('campaign__creator').order_by('pk'))
+    submit = _submit_paypal if batch.provider == 'paypal' else _submit_chapa
+    error = ''
+    try:
+        provider_batch_id = submit(batch, withdrawals)
+    except PayoutError as e:
+        if e.duplicate:
+            logger.warning("Payout batch %s was already submitted to %s: %s", batch.id, batch.provider, e)
+            provider_batch_id = ''
+            error = f"Already submitted; matched by reference. {e}"
+        elif e.retryable:
+            logger.warning("Payout batch %s not submitted, will retry: %s", batch.id, e)
+            batch.error = str(e)
+            batch.save(update_fields=['error'])
+            return False
+        else:
+            logger.error("Payout batch %s rejected by %s: %s", batch.id, batch.provider, e)
+            with db_transaction.atomic():
+                batch.status = 'failed'
+                batch.error = str(e)
+                batch.completed_at = timezone.now()
+                batch.save(update_fields=['status', 'error', 'completed_at'])
+                batch.withdrawals.update(payout_status='failed', payout_error=str(e))
+            metrics.PAYOUTS.labels(batch.provider, 'failed').inc(len(withdrawals))
+            return False
+
+    with db_transaction.atomic():
+        batch.status = 'submitted'
+        batch.provider_batch_id = provider_batch_id
+        batch.submitted_at = timezone.now()
+        batch.error = error
+        batch.save(update_fields=['status', 'provider_batch_id', 'submitted_at', 'error'])
+        batch.withdrawals.update(payout_status='submitted')
+    metrics.PAYOUT_BATCHES_SUBMITTED.labels(batch.provider).inc()
+    logger.info("Submitted %s payout batch %s as %s", batch.provider, batch.id, provider_batch_id)
+    return True
+
+def _fetch_paypal_results(batch):
+    """Return ``{reference: (payout_status, error)}`` and whether PayPal finished the batch."""
+    if not batch.provider_batch_id:
+        raise PayoutError(
+            f"PayPal accepted payout-batch-{batch.pk} earlier but its payout_batch_id is unknown; reconcile it in PayPal"
+        )
+    token, error = get_paypal_access_token()
+    if not token:
+        raise PayoutError(f"PayPal authentication failed: {error}", retryable=True)
+    results = {}
+    page = 1
+    while True:
+        data = _call(
+            'paypal', 'GET', f"{settings.PAYPAL_API_BASE}/v1/payments/payouts/{batch.provider_batch_id}",
+            params={'page': page, 'page_size': PAYPAL_PAGE_SIZE},
+            headers={"Authorization": f"Bearer {token}"},
+        )
+        items = data.get('items', [])
+        for item in items:
+            reference = item.get('payout_item', {}).get('sender_item_id')
+            status = PAYPAL_ITEM_STATUSES.get(item.get('transaction_status'), 'submitted')
+            error = (item.get('errors') or {}).get('message', '') if status == 'failed' else ''
+            results[reference] = (status, error)
+        if len(items) < PAYPAL_PAGE_SIZE:
+            break
+        page += 1
+    batch_status = data.get('batch_header', {}).get('batch_status')
+    if batch_status in ('DENIED', 'CANCELED'):
+        for reference, (status, error) in list(results.items()):
+            if status == 'submitted':
+                results[reference] = ('failed', f"PayPal batch {batch_status.lower()}")
+    return results
+
+def _chapa_result(item):
+    status = CHAPA_ITEM_STATUSES.get(str(item.get('status', '')).lower(), 'submitted')
+    return status, item.get('message', '') if status == 'failed' else ''
+
+def _fetch_chapa_results(batch):
+    """Return ``{reference: (payout_status, error)}`` for a Chapa bulk transfer.
+
+    A batch matched as a duplicate has no bulk-transfer id; its transfers
+    are verified one reference at a time instead.
+    """
+    if not batch.provider_batch_id:
+        results = {}
+        headers = {"Authorization": f"Bearer {settings.CHAPA_TEST_SECRET_KEY}"}
+        for reference in batch.withdrawals.filter(payout_status='submitted').values_list('payout_reference', flat=True):
+            data = _call('chapa', 'GET', f"{settings.CHAPA_API_BASE}/v1/transfers/verify/{reference}", headers=headers)
+            results[reference] = _chapa_result(data.get('data') or {})
+        return results
+    data = _call('chapa', 'GET', f"{settings.CHAPA_API_BASE}/v1/transfers", params={'batch_id': batch.provider_batch_id}, headers={
+        "Authorization": f"Bearer {settings.CHAPA_TEST_SECRET_KEY}",
+    })
+    results = {}
+    for item in data.get('data') or []:
+        reference = item.get('reference') or item.get('tx_ref')
+        results[reference] = _chapa_result(item)
+    return results
+
+def poll_batch(batch):
+    """Fetch ``batch``'s item statuses and update its withdrawals in bulk.
+
+    The batch is completed once no withdrawal in it is still ``submitted``.
+    Failed payouts are not credited back to the campaign; staff decide
+    whether to requeue them.
+    """
+    fetch = _fetch_paypal_results if batch.provider == 'paypal' else _fetch_chapa_results
+    now = timezone.now()
+    try:
+        results = fetch(batch)
+    except PayoutError as e:
+        logger.warning("Polling payout batch %s failed: %s", batch.id, e)
+        batch.last_polled_at = now
+        batch.save(update_fields=['last_polled_at'])
+        return False
+
+    changed = []
+    pending = 0
+    for withdrawal in batch.withdrawals.filter(payout_status='submitted').only('pk', 'payout_reference'):
+        status, error = results.get(withdrawal.payout_reference, ('submitted', ''))
+        if status == 'submitted':
+            pending += 1
+            continue
+        withdrawal.payout_status = status
+        withdrawal.payout_error = error
+        changed.append(withdrawal)
+
+    with db_transaction.atomic():
+        if changed:
+            WithdrawalRequest.objects.bulk_update(changed, ['payout_status', 'payout_error'], batch_size=BULK_BATCH_SIZE)
+        batch.last_polled_at = now
+        update_fields = ['last_polled_at']
+        if not pending:
+            batch.status = 'completed'
+            batch.completed_at = now
+            update_fields += ['status', 'completed_at']
+        batch.save(update_fields=update_fields)
+
+    for status in ('paid', 'failed'):
+        count = sum(1 for w in changed if w.payout_status == status)
+        if count:
+            metrics.PAYOUTS.labels(batch.provider, status).inc(count)
+    logger.info("Polled payout batch %s: %s updated, %s pending", batch.id, len(changed), pending)
+    return not pending
+
+def requeue_failed(withdrawals):
+    """Queue the failed payouts among ``withdrawals`` (a queryset) again; returns how many.
+
+    Their references are kept, so Chapa rejects a transfer it already made
+    as a duplicate. PayPal does not: a requeued PayPal payout is sent again
+    in a new batch, so check in PayPal that the earlier one was not paid.
+    """
+    return withdrawals.filter(status='approved', payout_status='failed').update(
+        payout_status='queued', payout_batch=None, payout_error=''
+    )
+
+def poll_batches():
+    """Poll submitted batches not polled within ``PAYOUT_POLL_INTERVAL`` seconds."""
+    cutoff = timezone.now() - timedelta(seconds=getattr(settings, 'PAYOUT_POLL_INTERVAL', 60))
+    due = PayoutBatch.objects.filter(status='submitted').exclude(last_polled_at__gte=cutoff).order_by('pk')
+    return sum(1 for batch in due if poll_batch(batch))
+
+def process_payouts():
+    """Run one pass of the pipeline; returns counts for logging."""
+    created = create_batches()
+    submitted = sum(1 for batch in PayoutBatch.objects.filter(status='pending').order_by('pk') if submit_batch(batch))
+    completed = poll_batches()
+    return {'created': len(created), 'submitted': submitted, 'completed': completed}
@@ -0,0 +1,183 @@
+"""Live campaign progress for the Server-Sent Events stream.
+
+Each process runs one ``Publisher`` that fans campaign snapshots out to
+every connected stream (``CampaignProgressStreamView``). A snapshot is the
+``GET /api/campaigns/<pk>/`` payload plus the campaign's ``version``, which
+``payments.services`` bumps in the same UPDATE that changes a balance.
+
+The publisher keeps the set of campaigns that have subscribers. When it
+wakes, it reads their versions in one query and serializes and pushes
+only the campaigns whose version moved. It wakes:
+
+* right away when this process credits a donation or approves a
+  withdrawal (``notify``, registered with ``on_commit``);
+* every ``PROGRESS_POLL_INTERVAL`` seconds while a stream is open, to pick
+  up changes committed by other processes.
+
+A process therefore costs one small query per interval however many
+clients are connected, where polling cost one detail request per client.
+A subscriber only holds the latest snapshot per campaign, so a slow client
+never queues more than one event per campaign. The publisher task stops
+when the last stream closes.
+
+Streams hold their connection open, so they are only served by the ASGI
+application (``community_funding.asgi``), which the web process runs
+under gunicorn's uvicorn workers (see the Procfile). Django's WSGI handler
+would read the endless stream to the end before sending a byte and pin
+the worker, so under a WSGI server (``runserver``, the benchmark server)
+the view answers 501 and clients fall back to polling the detail
+endpoint.
+"""
+import asyncio
+import logging
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """One stream's view of the publisher: the latest snapshot per campaign."""
+
+    def __init__(self, campaign_ids):
+        self.campaign_ids = frozenset(campaign_ids)
+        self.channel = None
+        self.pending = {}
+        self.ready = asyncio.Event()
+
+    def push(self, snapshot):
+        self.pending[snapshot['id']] = snapshot
+        self.ready.set()
+
+    async def get(self, timeout):
+        """Snapshots pushed since the last call, waiting up to ``timeout`` seconds; [] on timeout."""
+        try:
+            await asyncio.wait_for(self.ready.wait(), timeout)
+        except TimeoutError:
+            return []
+        self.ready.clear()
+        snapshots, self.pending = list(self.pending.values()), {}
+        return snapshots
+
+
+def fetch_snapshots(campaign_ids, versions):
+    """Snapshots of the campaigns in ``campaign_ids`` whose version differs from ``versions``."""
+    from .models import Campaign
+    from .serializers import CAMPAIGN_VALUES, serialize_campaigns
+    from .utils.exchange_rate import get_usd_to_etb_rate
+
+    changed = [
+        pk for pk, version in Campaign.objects.filter(pk__in=campaign_ids).values_list('pk', 'version')
+        if versions.get(pk) != version
+    ]
+    if not changed:
+        return []
+    rows = list(Campaign.objects.filter(pk__in=changed).order_by('pk').values(*CAMPAIGN_VALUES, 'version'))
+    snapshots = serialize_campaigns(rows, get_usd_to_etb_rate())
+    for snapshot, row in zip(snapshots, rows):
+        snapshot['version'] = row['version']
+    return snapshots
+
+
+class Channel:
+    """Subscribers of the streams served by one event loop, and their publisher task."""
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.subscribers = {}  # campaign id -> set of Subscription
+        self.latest = {}  # campaign id -> last snapshot sent
+        self.wake = asyncio.Event()
+        self.task = None
+
+
+class Publisher:
+    """Per-process fan-out of campaign snapshots to ``Subscription``s.
+
+    ``subscribe``/``unsubscribe`` run on the event loop serving the streams;
+    ``notify`` may be called from any thread. The ASGI server runs a single
+    loop, but state is kept per loop (``Channel``) so that streams on one
+    loop never disturb those on another.
+    """
+
+    def __init__(self):
+        self._channels = {}  # event loop -> Channel
+
+    def subscribe(self, campaign_ids):
+        loop = asyncio.get_running_loop()
+        channel = self._channels.get(loop)
+        if channel is None:
+            channel = self._channels[loop] = Channel(loop)
+        subscription = Subscription(campaign_ids)
+        subscription.channel = channel
+        unknown = False
+        for campaign_id in subscription.campaign_ids:
+            channel.subscribers.setdefault(campaign_id, set()).add(subscription)
+            if campaign_id in channel.latest:
+                subscription.push(channel.latest[campaign_id])
+            else:
+                unknown = True
+        if unknown:
+            channel.wake.set()
+        if channel.task is None or channel.task.done():
+            channel.task = loop.create_task(self._run(channel))
+        return subscription
+
+    def unsubscribe(self, subscription):
+        channel = subscription.channel
+        for campaign_id in subscription.campaign_ids:
+            subscribers = channel.subscribers.get(campaign_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del channel.subscribers[campaign_id]
+                    channel.latest.pop(campaign_id, None)
+        if not channel.subscribers:
+            self._close(channel)
+            channel.wake.set()  # let the task exit
+
+    def notify(self):
+        """Check subscribed campaigns now rather than at the next poll."""
+        for channel in list(self._channels.values()):
+            if channel.loop.is_closed() or not channel.subscribers:
+                continue
+            try:
+                channel.loop.call_soon_threadsafe(channel.wake.set)
+            except RuntimeError:  # loop closed meanwhile
+                pass
+
+    def _close(self, channel):
+        if self._channels.get(channel.loop) is channel:
+            del self._channels[channel.loop]
+
+    async def _run(self, channel):
+        interval = getattr(settings, 'PROGRESS_POLL_INTERVAL', 2)
+        while channel.subscribers:
+            try:
+                await asyncio.wait_for(channel.wake.wait(), interval)
+            except TimeoutError:
+                pass
+            channel.wake.clear()
+            if not channel.subscribers:
+                break
+            versions = {pk: snapshot['version'] for pk, snapshot in channel.latest.items()}
+            try:
+                snapshots = await sync_to_async(fetch_snapshots)(set(channel.subscribers), versions)
+            except Exception:
+                logger.exception("Failed to read campaign progress")
+                continue
+            for snapshot in snapshots:
+                subscribers = channel.subscribers.get(snapshot['id'])
+                if not subscribers:
+                    continue  # unsubscribed while the query ran
+                channel.latest[snapshot['id']] = snapshot
+                for subscription in subscribers:
+                    subscription.push(snapshot)
+        self._close(channel)
+
+
+publisher = Publisher()
+
+
+def notify():
+    publisher.notify()
@@ -0,0 +1,56 @@
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to DRF's stdlib json path
+    orjson = None
+
+_encoder = encoders.JSONEncoder()
+
+
+def _default(obj):
+    """Encode anything orjson doesn't handle natively the same way DRF does."""
+    return _encoder.default(obj)
+
+
+class ORJSONRenderer(JSONRenderer):
+    """JSON renderer backed by orjson when it is installed.
+
+    Output matches ``JSONRenderer``: datetimes and Decimals go through DRF's
+    encoder so payloads are byte-for-byte compatible. Indented output
+    (``application/json; indent=4`` or the browsable API) uses the parent.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b''
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+        ret = orjson.dumps(
+            data,
+            default=_default,
+            option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS,
+        )
+        # Keep the output a strict javascript subset, as JSONRenderer does.
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
+
+
+class ORJSONParser(JSONParser):
+    """JSON parser backed by orjson when it is installed."""
+
+    renderer_class = ORJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if orjson is None:
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
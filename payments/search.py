@@ -0,0 +1,179 @@
+"""Full-text search over campaigns and transactions.
+
+On SQLite, migration 0019 builds two FTS5 indexes next to the payments
+tables:
+
+* ``payments_campaign_fts`` holds campaign title and description. It uses
+  the unicode61 tokenizer with prefix indexes, so ``wat proj`` matches
+  "Water project". Results are ranked with bm25, and a title hit counts
+  more than a description hit.
+* ``payments_transaction_fts`` holds transaction ids and donor emails. It
+  uses the trigram tokenizer, so any substring of three or more
+  characters is an index lookup, the same matches the old
+  ``icontains`` scans found.
+
+Both are external-content tables that triggers keep in sync, so every
+write path (``save()``, ``bulk_create``, ``update()``) updates the index
+row by row. On other databases the same functions fall back to the
+``LIKE`` lookups the admin used before.
+
+SQLite migrations that rebuild a table (most ``AlterField`` and
+``AddField`` operations) drop its triggers. A ``post_migrate`` handler
+(``ensure_index``, connected in ``PaymentsConfig.ready``) puts back any
+missing trigger and rebuilds that index.
+"""
+import logging
+import re
+
+from django.db import connection, connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+logger = logging.getLogger(__name__)
+
+CAMPAIGN_FTS = 'payments_campaign_fts'
+TRANSACTION_FTS = 'payments_transaction_fts'
+# bm25 column weights (title, description).
+CAMPAIGN_WEIGHTS = (10.0, 1.0)
+# The trigram tokenizer cannot match anything shorter.
+TRIGRAM_MIN_LENGTH = 3
+
+_WORD = re.compile(r'\w+')
+
+# index -> (content table, indexed columns, FTS5 options)
+INDEXES = {
+    CAMPAIGN_FTS: ('payments_campaign', ('title', 'description'), "tokenize='unicode61 remove_diacritics 2', prefix='2 3'"),
+    TRANSACTION_FTS: ('payments_transaction', ('transaction_id', 'donor_email'), "tokenize='trigram'"),
+}
+
+
+def _triggers(index, table, columns):
+    cols = ', '.join(columns)
+    new = ', '.join(f'new.{c}' for c in columns)
+    old = ', '.join(f'old.{c}' for c in columns)
+    insert = f"INSERT INTO {index}(rowid, {cols}) VALUES (new.id, {new});"
+    delete = f"INSERT INTO {index}({index}, rowid, {cols}) VALUES ('delete', old.id, {old});"
+    return {
+        f'{index}_ai': f"CREATE TRIGGER {index}_ai AFTER INSERT ON {table} BEGIN {insert} END",
+        f'{index}_ad': f"CREATE TRIGGER {index}_ad AFTER DELETE ON {table} BEGIN {delete} END",
+        # Only edits to indexed columns touch the index, not balance updates.
+        f'{index}_au': f"CREATE TRIGGER {index}_au AFTER UPDATE OF {cols} ON {table} BEGIN {delete} {insert} END",
+    }
+
+
+def create_index(schema_editor):
+    """Create the FTS5 tables and their triggers, and index existing rows."""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for index, (table, columns, options) in INDEXES.items():
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {index} USING fts5({', '.join(columns)}, "
+            f"content='{table}', content_rowid='id', {options})"
+        )
+    ensure_index(using=schema_editor.connection.alias)
+
+
+def drop_index(schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for index, (table, columns, _) in INDEXES.items():
+        for trigger in _triggers(index, table, columns):
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        schema_editor.execute(f"DROP TABLE IF EXISTS {index}")
+
+
+def ensure_index(using='default', **kwargs):
+    """Recreate any missing sync trigger and rebuild the index it belongs to."""
+    conn = connections[using]
+    if conn.vendor != 'sqlite':
+        return
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger')")
+        existing = {row[0] for row in cursor.fetchall()}
+        for index, (table, columns, _) in INDEXES.items():
+            if index not in existing:
+                continue  # migrated below 0019
+            missing = [sql for name, sql in _triggers(index, table, columns).items() if name not in existing]
+            if not missing:
+                continue
+            for sql in missing:
+                cursor.execute(sql)
+            cursor.execute(f"INSERT INTO {index}({index}) VALUES ('rebuild')")
+            logger.info("Rebuilt search index %s (%d trigger(s) were missing)", index, len(missing))
+
+
+def is_enabled():
+    return connection.vendor == 'sqlite'
+
+
+def prefix_query(term):
+    """FTS5 query matching rows that contain every word of ``term`` as a prefix.
+
+    Only word characters survive, so user input cannot inject FTS5 syntax.
+    Returns '' when ``term`` has no words.
+    """
+    return ' '.join(f'"{word}"*' for word in _WORD.findall(term))
+
+
+def _phrase(term):
+    return '"' + term.replace('"', '""') + '"'
+
+
+def _campaign_match(query):
+    return RawSQL(f"SELECT rowid FROM {CAMPAIGN_FTS} WHERE {CAMPAIGN_FTS} MATCH %s", (query,))
+
+
+def ranked_campaign_ids(term, limit):
+    """Ids of the campaigns best matching ``term``, best first."""
+    if not is_enabled():
+        return list(
+            _campaign_like(term).values_list('pk', flat=True).order_by('pk')[:limit]
+        )
+    query = prefix_query(term)
+    if not query:
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid FROM {CAMPAIGN_FTS} WHERE {CAMPAIGN_FTS} MATCH %s "
+            f"ORDER BY bm25({CAMPAIGN_FTS}, %s, %s) LIMIT %s",
+            [query, *CAMPAIGN_WEIGHTS, limit],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _campaign_like(term, queryset=None):
+    from .models import Campaign
+    queryset = Campaign.objects.all() if queryset is None else queryset
+    return queryset.filter(Q(title__icontains=term) | Q(description__icontains=term))
+
+
+def filter_campaigns(queryset, term):
+    """Narrow a Campaign ``queryset`` to rows matching every word of ``term``."""
+    query = prefix_query(term) if is_enabled() else ''
+    if not query:
+        return _campaign_like(term, queryset)
+    return queryset.filter(pk__in=_campaign_match(query))
+
+
+def filter_transactions(queryset, term):
+    """Narrow a Transaction ``queryset`` to rows matching ``term``.
+
+    A term equal to a transaction id or donor email is answered from
+    those columns' own indexes. Otherwise each whitespace-separated word
+    must appear in the transaction id, the donor email or (as a word
+    prefix) the campaign title.
+    """
+    term = term.strip()
+    exact = queryset.filter(Q(transaction_id=term) | Q(donor_email=term))
+    if exact.exists():
+        return exact
+    for word in term.split():
+        if is_enabled() and len(word) >= TRIGRAM_MIN_LENGTH:
+            match = Q(pk__in=RawSQL(f"SELECT rowid FROM {TRANSACTION_FTS} WHERE {TRANSACTION_FTS} MATCH %s", (_phrase(word),)))
+            query = prefix_query(word)
+            if query:
+                match |= Q(campaign_id__in=_campaign_match(query))
+        else:
+            match = Q(transaction_id__icontains=word) | Q(donor_email__icontains=word) | Q(campaign__title__icontains=word)
+        queryset = queryset.filter(match)
+    return queryset
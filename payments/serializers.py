@@ -1,22 +1,148 @@
+from django.utils import timezone
+from django.utils.functional import cached_property
 from rest_framework import serializers
-from .models import Campaign
+from .models import Campaign, Transaction
+from .money import MINOR_PER_UNIT, Rate, format_minor
+
+CAMPAIGN_VALUES = ('id', 'title', 'description', 'creator_id', 'total_usd', 'total_birr', 'goal', 'created_at')
+TRANSACTION_VALUES = ('transaction_id', 'campaign_id', 'amount', 'payment_method', 'completed', 'created_at', 'expired_at')
+
+class MoneyField(serializers.Field):
+    """Read-only ``Money`` as a two-decimal string, like a coerced ``DecimalField``."""
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        return str(value)
 
 class CampaignSerializer(serializers.ModelSerializer):
     balance_in_birr = serializers.SerializerMethodField()
     percentage_funded = serializers.SerializerMethodField()
-    total_usd = serializers.DecimalField(max_digits=10, decimal_places=2)
-    total_birr = serializers.DecimalField(max_digits=10, decimal_places=2)
+    total_usd = MoneyField()
+    total_birr = MoneyField()
+    goal = MoneyField()
 
     class Meta:
         model = Campaign
         fields = [
             'id', 'title', 'description', 'creator', 'total_usd', 'total_birr',
-            'target_amount', 'target_currency', 'balance_in_birr', 'percentage_funded',
-            'created_at'
+            'goal', 'balance_in_birr', 'percentage_funded', 'created_at'
         ]
 
+    @cached_property
+    def usd_to_etb_rate(self):
+        # Built once and shared by every row of a many=True serializer.
+        rate = self.context.get('usd_to_etb_rate')
+        return rate if rate is None or isinstance(rate, Rate) else Rate(rate)
+
     def get_balance_in_birr(self, obj):
-        return obj.get_balance_in_birr()
+        return obj.get_balance_in_birr(self.usd_to_etb_rate).amount
 
     def get_percentage_funded(self, obj):
-        return obj.get_percentage_funded()
\ No newline at end of file
+        return obj.get_percentage_funded(self.usd_to_etb_rate)
+
+class TransactionSerializer(serializers.ModelSerializer):
+    amount = MoneyField()
+
+    class Meta:
+        model = Transaction
+        fields = ['transaction_id', 'campaign', 'amount', 'payment_method', 'completed', 'created_at', 'expired_at']
+        read_only_fields = fields
+
+def _format_datetime(value):
+    """Format a datetime exactly like DRF's ``DateTimeField``."""
+    if value is None:
+        return None
+    value = timezone.localtime(value).isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+def serialize_campaigns(rows, rate):
+    """Read-only fast path producing the same payload as ``CampaignSerializer(many=True)``.
+
+    ``rows`` are dicts from ``Campaign.objects.values(*CAMPAIGN_VALUES)``, so
+    amounts arrive as integer minor units and every row is integer arithmetic.
+    The USD to ETB ``rate`` is looked up once by the caller instead of per
+    campaign.
+    """
+    rate = rate if isinstance(rate, Rate) else Rate(rate)
+    numerator, denominator = rate.numerator, rate.denominator
+    data = []
+    append = data.append
+    for row in rows:
+        total_usd = row['total_usd']
+        total_birr = row['total_birr']
+        goal = row['goal']
+        # round_div inlined: this loop runs once per campaign.
+        quotient, remainder = divmod(total_usd * numerator, denominator)
+        if remainder * 2 > denominator or (remainder * 2 == denominator and quotient & 1):
+            quotient += 1
+        balance = total_birr + quotient
+        if goal <= 0:
+            percentage = 0.0
+        else:
+            quotient, remainder = divmod(balance * 10000, goal)
+            if remainder * 2 > goal or (remainder * 2 == goal and quotient & 1):
+                quotient += 1
+            percentage = quotient / 100
+        append({
+            'id': row['id'],
+            'title': row['title'],
+            'description': row['description'],
+            'creator': row['creator_id'],
+            'total_usd': format_minor(total_usd),
+            'total_birr': format_minor(total_birr),
+            'goal': format_minor(goal),
+            # The DRF serializer's Decimal renders as a float.
+            'balance_in_birr': balance / MINOR_PER_UNIT,
+            'percentage_funded': percentage,
+            'created_at': _format_datetime(row['created_at']),
+        })
+    return data
+
+def serialize_transactions(rows):
+    """Read-only fast path producing the same payload as ``TransactionSerializer(many=True)``.
+
+    ``rows`` are dicts from ``Transaction.objects.values(*TRANSACTION_VALUES)``
+    (or the same values of ``TransactionArchive``).
+    """
+    return [
+        {
+            'transaction_id': row['transaction_id'],
+            'campaign': row['campaign_id'],
+            'amount': format_minor(row['amount']),
+            'payment_method': row['payment_method'],
+            'completed': row['completed'],
+            'created_at': _format_datetime(row['created_at']),
+            'expired_at': _format_datetime(row['expired_at']),
+        }
+        for row in rows
+    ]
+
+def serialize_donation_series(rows):
+    """Payload for ``analytics.donation_series`` rows."""
+    return [
+        {
+            'period': _format_datetime(row['period_start']),
+            'provider': row['provider'],
+            'currency': row['currency'],
+            'amount': format_minor(row['amount']),
+            'count': row['count'],
+        }
+        for row in rows
+    ]
+
+def serialize_top_donors(rows):
+    """Payload for ``analytics.top_donors`` rows."""
+    return [
+        {
+            'donor_email': row['donor_email'],
+            'amount': format_minor(row['amount']),
+            'count': row['count'],
+            'last_donated_at': _format_datetime(row['last_donated_at']),
+        }
+        for row in rows
+    ]
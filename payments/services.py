@@ -0,0 +1,257 @@
+from django.db import transaction as db_transaction
+from django.db.models import BigIntegerField, Case, F, Value, When
+from django.utils import timezone
+from . import analytics, metrics, outbox, progress
+from .models import Campaign, Transaction, WithdrawalRequest
+from .money import Money, Rate, format_minor
+from .utils.exchange_rate import get_usd_to_etb_rate
+
+# Rows per UPDATE statement in set-based writes (keeps SQLite under its parameter limit).
+BULK_BATCH_SIZE = 500
+
+def credit_transaction(transaction, amount):
+    """Mark ``transaction`` completed and add ``amount`` to its campaign balance.
+
+    ``amount`` is Money: ETB amounts (Chapa) are credited to ``total_birr``
+    and USD amounts (PayPal) to ``total_usd``. The completed flag is flipped with a conditional UPDATE so
+    a duplicate callback racing this one cannot credit the campaign twice;
+    returns False when another request already completed it. A checkout the
+    sweeper expired is still credited if the provider confirms it. The
+    donation is added to the analytics rollups and a ``donation.completed``
+    outbox event is queued in the same database transaction.
+    """
+    field = 'total_birr' if transaction.currency == 'ETB' else 'total_usd'
+    campaign = transaction.campaign
+    now = timezone.now()
+    with db_transaction.atomic():
+        if not Transaction.objects.filter(pk=transaction.pk, completed=False).update(completed=True, completed_at=now, expired_at=None):
+            return False
+        Campaign.objects.filter(pk=transaction.campaign_id).update(
+            **{field: F(field) + amount.minor}, version=F('version') + 1
+        )
+        analytics.record_donation(transaction, amount, now)
+        outbox.publish([outbox.donation_completed(transaction, amount, now)])
+        db_transaction.on_commit(progress.notify)
+    transaction.completed = True
+    transaction.completed_at = now
+    transaction.expired_at = None
+    setattr(campaign, field, getattr(campaign, field) + amount)
+
+    metrics.DONATIONS_COMPLETED.labels(transaction.payment_method).inc()
+    metrics.WEBHOOK_LAG.labels(transaction.payment_method).observe(
+        (now - transaction.created_at).total_seconds()
+    )
+    return True
+
+def _reserved_field(currency):
+    return 'reserved_birr' if currency == 'ETB' else 'reserved_usd'
+
+def reserve_withdrawal(campaign_id, amount, rate, **fields):
+    """Create a pending withdrawal of ``amount`` (Money) if the campaign can cover it.
+
+    The campaign's available balance is its balance less what pending
+    withdrawals have reserved, with USD counted in ETB at ``rate``. The
+    check and the reservation are one conditional UPDATE of the campaign
+    row, so concurrent requests cannot together reserve more than the
+    campaign holds. The comparison is exact: both sides are scaled by the
+    rate's denominator rather than rounded. Returns the new
+    ``WithdrawalRequest``, or None when the available balance is short.
+    """
+    rate = rate if isinstance(rate, Rate) else Rate(rate)
+    field = _reserved_field(amount.currency)
+    # Available balance and the request, in ETB minor units times rate.denominator.
+    spare = (
+        (F('total_birr') - F('reserved_birr')) * rate.denominator
+        + (F('total_usd') - F('reserved_usd')) * rate.numerator
+    )
+    needed = amount.minor * (rate.denominator if amount.currency == 'ETB' else rate.numerator)
+    with db_transaction.atomic():
+        reserved = (
+            Campaign.objects.filter(pk=campaign_id)
+            .alias(spare=spare)
+            .filter(spare__gte=needed)
+            .update(**{field: F(field) + amount.minor})
+        )
+        if not reserved:
+            return None
+        return WithdrawalRequest.objects.create(campaign_id=campaign_id, requested_amount=amount, **fields)
+
+def hold_funds(withdrawal):
+    """Reserve a pending withdrawal's amount without checking the balance (staff-created withdrawals)."""
+    field = _reserved_field(withdrawal.requested_currency)
+    Campaign.objects.filter(pk=withdrawal.campaign_id).update(**{field: F(field) + withdrawal.requested_amount.minor})
+
+def release_funds(withdrawals):
+    """Release the reservations of ``withdrawals`` that are leaving the pending state.
+
+    One UPDATE covers every campaign involved.
+    """
+    totals = {}  # reserved field -> {campaign id: minor units}
+    for withdrawal in withdrawals:
+        per_campaign = totals.setdefault(_reserved_field(withdrawal.requested_currency), {})
+        per_campaign[withdrawal.campaign_id] = per_campaign.get(withdrawal.campaign_id, 0) + withdrawal.requested_amount.minor
+    if not totals:
+        return
+    Campaign.objects.filter(pk__in={w.campaign_id for w in withdrawals}).update(**{
+        field: F(field) - Case(
+            *[When(pk=campaign_id, then=Value(minor)) for campaign_id, minor in per_campaign.items()],
+            default=Value(0), output_field=BigIntegerField(),
+        )
+        for field, per_campaign in totals.items()
+    })
+
+def delete_withdrawals(withdrawals):
+    """Delete ``withdrawals`` (a queryset), releasing the reservations of the pending ones."""
+    with db_transaction.atomic():
+        pending = list(
+            withdrawals.select_related(None).select_for_update().filter(status='pending')
+            .only('pk', 'status', 'campaign_id', 'requested_amount', 'convert_to')
+        )
+        release_funds(pending)
+        withdrawals.delete()
+
+def _plan_withdrawal(campaign, withdrawal, rate):
+    """Work out how much USD and Birr ``withdrawal`` takes from ``campaign``.
+
+    Returns ``(deduct_usd, deduct_birr, total_withdrawn, error)`` as Money;
+    the requested currency is drained first and the rest converted at
+    ``rate`` (a ``Rate``). All of the arithmetic is on integer minor units.
+    """
+    requested = withdrawal.requested_amount.minor
+    usd = campaign.total_usd.minor
+    birr = campaign.total_birr.minor
+    convert_to = withdrawal.convert_to
+    if convert_to == 'birr':
+        total_available = birr + rate.to_quote_minor(usd)
+    else:  # convert_to == 'usd'
+        total_available = usd + rate.to_base_minor(birr)
+    if requested > total_available:
+        return None, None, None, (
+            f"Insufficient funds for withdrawal {withdrawal.id}! Requested {withdrawal.requested_amount} "
+            f"{convert_to.upper()}, available {format_minor(total_available)} {convert_to.upper()}."
+        )
+
+    deduct_usd = 0
+    deduct_birr = 0
+    if convert_to == 'usd':
+        deduct_usd = min(requested, usd)
+        remaining_usd = requested - deduct_usd
+        if remaining_usd > 0:
+            deduct_birr = rate.to_quote_minor(remaining_usd)
+            if deduct_birr > birr:
+                return None, None, None, f"Insufficient Birr funds for withdrawal {withdrawal.id}!"
+        total_withdrawn = Money(deduct_usd + rate.to_base_minor(deduct_birr), 'USD')
+    else:  # convert_to == 'birr'
+        deduct_birr = min(requested, birr)
+        remaining_birr = requested - deduct_birr
+        if remaining_birr > 0:
+            deduct_usd = rate.to_base_minor(remaining_birr)
+            if deduct_usd > usd:
+                return None, None, None, f"Insufficient USD funds for withdrawal {withdrawal.id}!"
+        total_withdrawn = Money(deduct_birr + rate.to_quote_minor(deduct_usd), 'ETB')
+    return Money(deduct_usd, 'USD'), Money(deduct_birr, 'ETB'), total_withdrawn, None
+
+def approve_withdrawals(withdrawal_ids, rate=None):
+    """Approve a batch of pending withdrawals in a single database transaction.
+
+    One exchange-rate snapshot is used for the whole batch. Withdrawals are
+    applied per campaign in request order against a running balance, so
+    several requests on one campaign cannot together overdraw it. Balances
+    are written with one ``bulk_update`` and withdrawals with another. An
+    approved withdrawal's reservation is released as its amount leaves the
+    balance; a failed one keeps its reservation and stays pending.
+
+    Approved withdrawals are queued for payout (see ``payments.payouts``)
+    with the amount to send: USD for PayPal and ETB for Chapa, converted at
+    the same rate snapshot, and a ``withdrawal.approved`` outbox event is
+    queued for each in the same transaction.
+
+    Returns one outcome dict per withdrawal with ``id``, ``status``
+    (``'approved'``, ``'skipped'`` or ``'failed'``) and ``message``; approved
+    outcomes also carry ``withdrawal``, ``amount`` (Money) and ``currency``.
+    """
+    rate = Rate(rate if rate is not None else get_usd_to_etb_rate())
+    now = timezone.now()
+    outcomes = []
+    with db_transaction.atomic():
+        withdrawals = list(
+            WithdrawalRequest.objects.select_for_update()
+            .filter(pk__in=list(withdrawal_ids))
+            .order_by('campaign_id', 'requested_at', 'pk')
+        )
+        campaigns = Campaign.objects.select_for_update().in_bulk({w.campaign_id for w in withdrawals})
+        touched = {}
+        approved = []
+        events = []
+        for withdrawal in withdrawals:
+            if withdrawal.status != 'pending':
+                outcomes.append({
+                    'id': withdrawal.id,
+                    'status': 'skipped',
+                    'message': f"Withdrawal {withdrawal.id} is already {withdrawal.status}.",
+                })
+                continue
+            campaign = campaigns[withdrawal.campaign_id]
+            withdrawal.campaign = campaign
+            deduct_usd, deduct_birr, total_withdrawn, error = _plan_withdrawal(campaign, withdrawal, rate)
+            if error:
+                outcomes.append({'id': withdrawal.id, 'status': 'failed', 'message': error})
+                continue
+            campaign.total_usd -= deduct_usd
+            campaign.total_birr -= deduct_birr
+            field = _reserved_field(withdrawal.requested_currency)
+            setattr(campaign, field, getattr(campaign, field) - withdrawal.requested_amount)
+            campaign.version += 1
+            touched[campaign.pk] = campaign
+            withdrawal.status = 'approved'
+            withdrawal.processed_at = now
+            withdrawal.payout_status = 'queued'
+            withdrawal.payout_currency = 'USD' if withdrawal.payment_method == 'paypal' else 'ETB'
+            withdrawal.payout_amount = rate.convert(total_withdrawn, withdrawal.payout_currency)
+            approved.append(withdrawal)
+            events.append(outbox.withdrawal_approved(withdrawal, total_withdrawn))
+            outcomes.append({
+                'id': withdrawal.id,
+                'status': 'approved',
+                'message': f"Withdrawal {withdrawal.id} approved.",
+                'withdrawal': withdrawal,
+                'amount': total_withdrawn,
+                'currency': total_withdrawn.currency,
+            })
+
+        if approved:
+            Campaign.objects.bulk_update(
+                touched.values(), ['total_usd', 'total_birr', 'reserved_usd', 'reserved_birr', 'version'],
+                batch_size=BULK_BATCH_SIZE,
+            )
+            WithdrawalRequest.objects.bulk_update(
+                approved,
+                ['status', 'processed_at', 'payout_status', 'payout_amount', 'payout_currency'],
+                batch_size=BULK_BATCH_SIZE,
+            )
+            outbox.publish(events)
+            db_transaction.on_commit(progress.notify)
+    if approved:
+        metrics.WITHDRAWALS_PROCESSED.labels('approved').inc(len(approved))
+    return outcomes
+
+def reject_withdrawals(withdrawal_ids):
+    """Reject the pending withdrawals among ``withdrawal_ids`` and release their reservations.
+
+    Returns ``(rejected_count, skipped)`` where ``skipped`` lists
+    ``(id, status)`` for withdrawals that were no longer pending.
+    """
+    with db_transaction.atomic():
+        withdrawals = list(
+            WithdrawalRequest.objects.select_for_update().filter(pk__in=list(withdrawal_ids))
+            .only('pk', 'status', 'campaign_id', 'requested_amount', 'convert_to')
+        )
+        skipped = [(w.pk, w.status) for w in withdrawals if w.status != 'pending']
+        pending = [w for w in withdrawals if w.status == 'pending']
+        rejected = WithdrawalRequest.objects.filter(pk__in=[w.pk for w in pending], status='pending').update(
+            status='rejected', processed_at=timezone.now()
+        )
+        release_funds(pending)
+    if rejected:
+        metrics.WITHDRAWALS_PROCESSED.labels('rejected').inc(rejected)
+    return rejected, skipped
@@ -0,0 +1,161 @@
+"""Content-hashed, precompressed static files served from the app.
+
+``manage.py collectstatic`` stores files through
+``CompressedManifestStaticFilesStorage``. Every file is copied under a
+content-hashed name (``app.3f2a9c1b7e4d.css``), as with Django's
+``ManifestStaticFilesStorage``. Next to it, the storage writes a ``.gz``
+variant and, when the optional ``brotli`` package is installed, a ``.br``
+variant. A variant is kept only if it saves at least
+``1 - MAX_COMPRESSED_RATIO`` of the file, and formats that are already
+compressed (images, fonts, archives) are skipped.
+
+``payments.middleware.StaticFilesMiddleware`` serves ``STATIC_ROOT``. It
+runs first in the stack, so a static request touches no session, user or
+database. At start-up it indexes the collected files with their
+variants and headers (``scan``). Each request then costs a dict lookup,
+and the chosen file is handed to the server as a ``FileResponse``, which
+it streams in blocks. The encoding is taken from
+``Accept-Encoding`` (brotli over gzip over identity). Hashed names never
+change content, so they are served ``immutable`` for a year. Other names
+are cached for ``STATIC_MAX_AGE`` seconds. Files collected after a worker
+started are served from the next restart.
+"""
+import gzip
+import json
+import logging
+import mimetypes
+import os
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; only gzip variants are written without it
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Preferred first; each is served only to clients that accept it.
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+SKIP_COMPRESS_EXTENSIONS = {
+    '.br', '.gz', '.zip', '.bz2', '.xz', '.7z', '.png', '.jpg', '.jpeg', '.gif', '.webp', '.avif',
+    '.woff', '.woff2', '.mp3', '.mp4', '.webm', '.ogg', '.pdf',
+}
+# A variant must be smaller than this share of the original to be written.
+MAX_COMPRESSED_RATIO = 0.95
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+TEXT_CONTENT_TYPES = {'application/javascript', 'application/json', 'application/xml', 'image/svg+xml'}
+
+
+def _compressors():
+    if brotli is not None:
+        yield '.br', lambda data: brotli.compress(data, quality=11)
+    yield '.gz', lambda data: gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def compress_file(path):
+    """Write the worthwhile ``.br``/``.gz`` variants of ``path``; returns how many."""
+    if os.path.splitext(path)[1].lower() in SKIP_COMPRESS_EXTENSIONS:
+        return 0
+    with open(path, 'rb') as f:
+        data = f.read()
+    written = 0
+    for suffix, compress in _compressors():
+        compressed = compress(data)
+        if len(compressed) < len(data) * MAX_COMPRESSED_RATIO:
+            with open(path + suffix, 'wb') as f:
+                f.write(compressed)
+            written += 1
+        elif os.path.exists(path + suffix):
+            os.remove(path + suffix)  # left by an earlier collectstatic
+    return written
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """``ManifestStaticFilesStorage`` that also writes compressed variants."""
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        names = set(paths) | set(self.hashed_files.values())
+        variants = sum(compress_file(self.path(name)) for name in sorted(names))
+        logger.info("Wrote %d compressed variants of %d static files", variants, len(names))
+
+    def stored_name(self, name):
+        if not self.hashed_files:
+            # Nothing collected yet (tests, development): use the plain name.
+            return name
+        return super().stored_name(name)
+
+
+class StaticFile:
+    """A collected file, its compressed variants and its response headers."""
+
+    def __init__(self, path, immutable, max_age):
+        stat = os.stat(path)
+        self.variants = [
+            (encoding, path + suffix, os.path.getsize(path + suffix))
+            for encoding, suffix in ENCODINGS if os.path.exists(path + suffix)
+        ]
+        self.variants.append((None, path, stat.st_size))
+        content_type, _ = mimetypes.guess_type(path)
+        content_type = content_type or 'application/octet-stream'
+        if content_type.startswith('text/') or content_type in TEXT_CONTENT_TYPES:
+            content_type += '; charset=utf-8'
+        self.content_type = content_type
+        self.etag = '%x-%x' % (int(stat.st_mtime), stat.st_size)
+        self.headers = {
+            'Cache-Control': IMMUTABLE_CACHE_CONTROL if immutable else f'public, max-age={max_age}',
+        }
+        if len(self.variants) > 1:
+            self.headers['Vary'] = 'Accept-Encoding'
+
+    def select(self, accept_encoding):
+        """Return ``(encoding, path, size)`` of the best variant for ``accept_encoding``."""
+        if len(self.variants) > 1 and accept_encoding:
+            accepted = accepted_encodings(accept_encoding)
+            for variant in self.variants[:-1]:
+                if variant[0] in accepted:
+                    return variant
+        return self.variants[-1]
+
+    def etag_for(self, encoding):
+        return f'"{self.etag}-{encoding}"' if encoding else f'"{self.etag}"'
+
+
+def accepted_encodings(header):
+    """Content codings listed in an ``Accept-Encoding`` header, less those with ``q=0``."""
+    accepted = set()
+    for part in header.split(','):
+        coding, _, params = part.partition(';')
+        params = params.replace(' ', '').lower()
+        if params.startswith('q='):
+            try:
+                if float(params[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+def scan(root, max_age):
+    """Index the collected files under ``root`` as ``{relative URL path: StaticFile}``."""
+    if not root or not os.path.isdir(root):
+        return {}
+    immutable = set()
+    manifest = os.path.join(root, ManifestStaticFilesStorage.manifest_name)
+    if os.path.exists(manifest):
+        with open(manifest, encoding='utf-8') as f:
+            immutable.update(json.load(f).get('paths', {}).values())
+    files = {}
+    for directory, _, filenames in os.walk(root):
+        for filename in filenames:
+            path = os.path.join(directory, filename)
+            base, suffix = os.path.splitext(path)
+            if suffix in ('.br', '.gz') and os.path.exists(base):
+                continue  # a variant, served through its original
+            name = os.path.relpath(path, root).replace(os.sep, '/')
+            files[name] = StaticFile(path, name in immutable, max_age)
+    return files
@@ -0,0 +1,88 @@
+"""Expiry and archival of old transactions.
+
+``DonateView`` creates a pending ``Transaction`` before the donor is sent
+to the gateway, and abandoned checkouts never complete. ``manage.py
+sweep_transactions`` (from cron, or with ``--loop``) keeps the hot table
+down to recent and in-flight rows:
+
+* pending transactions created more than ``TRANSACTION_PENDING_TTL_HOURS``
+  ago are marked expired (``expired_at``);
+* completed transactions created, and expired ones expired, more than
+  ``TRANSACTION_ARCHIVE_AFTER_DAYS`` ago are moved to
+  ``TransactionArchive``.
+
+Both steps work through ``SWEEPER_BATCH_SIZE`` rows at a time, each batch
+in its own short transaction, so neither holds locks for long however far
+behind the sweep is.
+
+An expired checkout is still credited if the provider confirms it later.
+Once archived, a transaction no longer answers callbacks, so keep the
+archive window well past the providers' retry horizon. The offline
+import, the bulk status lookup and ``analytics.rebuild`` also read the
+archive.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction as db_transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Transaction, TransactionArchive
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_FIELDS = (
+    'id', 'campaign_id', 'amount', 'payment_method', 'transaction_id', 'donor_email', 'completed',
+    'created_at', 'completed_at', 'expired_at',
+)
+
+
+def _batch_size(batch_size):
+    return batch_size or getattr(settings, 'SWEEPER_BATCH_SIZE', 500)
+
+
+def expire_pending(now=None, batch_size=None):
+    """Mark pending transactions older than the TTL expired; returns how many."""
+    now = now or timezone.now()
+    batch_size = _batch_size(batch_size)
+    cutoff = now - timedelta(hours=getattr(settings, 'TRANSACTION_PENDING_TTL_HOURS', 24))
+    stale = Transaction.objects.filter(completed=False, expired_at__isnull=True, created_at__lt=cutoff)
+    expired = 0
+    while True:
+        ids = list(stale.order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if ids:
+            # Re-checked in the UPDATE: a callback may complete one meanwhile.
+            expired += stale.filter(pk__in=ids).update(expired_at=now)
+        if len(ids) < batch_size:
+            break
+    return expired
+
+
+def archive_old(now=None, batch_size=None):
+    """Move completed and expired transactions past the archive window; returns how many."""
+    now = now or timezone.now()
+    batch_size = _batch_size(batch_size)
+    cutoff = now - timedelta(days=getattr(settings, 'TRANSACTION_ARCHIVE_AFTER_DAYS', 90))
+    old = Transaction.objects.filter(Q(completed=True, created_at__lt=cutoff) | Q(expired_at__lt=cutoff))
+    archived = 0
+    while True:
+        with db_transaction.atomic():
+            rows = list(old.select_for_update().order_by('pk').values(*ARCHIVE_FIELDS)[:batch_size])
+            if rows:
+                TransactionArchive.objects.bulk_create([TransactionArchive(**row, archived_at=now) for row in rows])
+                Transaction.objects.filter(pk__in=[row['id'] for row in rows]).delete()
+        archived += len(rows)
+        if len(rows) < batch_size:
+            break
+    return archived
+
+
+def sweep(now=None, batch_size=None):
+    """Run both steps; returns ``{'expired', 'archived'}`` counts."""
+    now = now or timezone.now()
+    summary = {'expired': expire_pending(now, batch_size), 'archived': archive_old(now, batch_size)}
+    if any(summary.values()):
+        logger.info("Swept transactions: %d expired, %d archived", summary['expired'], summary['archived'])
+    return summary
@@ -0,0 +1,85 @@
+"""Donation rollups: kept by credit_transaction, rebuildable, read by the dashboard API."""
+from datetime import datetime
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from payments import analytics
+from payments.models import Campaign, DonationRollup, DonorRollup, Transaction
+from payments.money import Money
+from payments.services import credit_transaction
+
+
+def rollup_rows():
+    return (
+        sorted(DonationRollup.objects.values_list('granularity', 'period_start', 'provider', 'currency', 'amount', 'count')),
+        sorted(DonorRollup.objects.values_list('donor_email', 'currency', 'amount', 'count', 'last_donated_at')),
+    )
+
+
+class RollupTests(TestCase):
+    def setUp(self):
+        self.creator = User.objects.create_user('creator', password='pw')
+        self.campaign = Campaign.objects.create(title='Well', creator=self.creator)
+
+    def donate(self, tx_id, amount, method='chapa', email='Donor@Example.com', at=None):
+        transaction = Transaction.objects.create(
+            campaign=self.campaign, amount=amount, payment_method=method, transaction_id=tx_id, donor_email=email,
+        )
+        at = at or timezone.make_aware(datetime(2026, 3, 1, 23, 30))
+        with mock.patch('payments.services.timezone.now', return_value=at):
+            credit_transaction(transaction, transaction.amount)
+
+    def test_buckets_accumulate_in_local_time(self):
+        self.donate('C1', '10.00')
+        self.donate('C2', '5.50', email='donor@example.com')
+        self.donate('P1', '3.00', method='paypal', at=timezone.make_aware(datetime(2026, 3, 2, 0, 15)))
+        daily = analytics.donation_series(
+            self.campaign.pk, 'day', since=timezone.make_aware(datetime(2026, 3, 1)),
+            until=timezone.make_aware(datetime(2026, 3, 3)),
+        )
+        self.assertEqual(
+            [(timezone.localdate(row['period_start']).isoformat(), row['provider'], row['amount'], row['count']) for row in daily],
+            [('2026-03-01', 'chapa', 1550, 2), ('2026-03-02', 'paypal', 300, 1)],
+        )
+        self.assertEqual(
+            [(row['donor_email'], row['amount'], row['count']) for row in analytics.top_donors(self.campaign.pk, 'ETB')],
+            [('donor@example.com', 1550, 2)],
+        )
+
+    def test_duplicate_credit_is_not_counted(self):
+        self.donate('C1', '10.00')
+        transaction = Transaction.objects.get(transaction_id='C1')
+        self.assertFalse(credit_transaction(transaction, Money(1000, 'ETB')))
+        self.assertEqual(DonationRollup.objects.get(granularity='day').count, 1)
+
+    def test_rebuild_matches_incremental_rollups(self):
+        self.donate('C1', '10.00')
+        self.donate('C2', '7.25', email='')
+        self.donate('P1', '3.00', method='paypal', at=timezone.make_aware(datetime(2026, 3, 2, 9, 5)))
+        Transaction.objects.create(campaign=self.campaign, amount='99', payment_method='chapa', transaction_id='PENDING')
+        incremental = rollup_rows()
+        self.assertEqual(analytics.rebuild([self.campaign.pk]), (4, 2))
+        self.assertEqual(rollup_rows(), incremental)
+
+
+class AnalyticsApiTests(TestCase):
+    def setUp(self):
+        self.creator = User.objects.create_user('creator', password='pw')
+        self.campaign = Campaign.objects.create(title='Well', creator=self.creator)
+        self.url = reverse('campaign_donation_series', args=[self.campaign.pk])
+
+    def test_only_creator_and_staff(self):
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        self.client.force_login(User.objects.create_user('other', password='pw'))
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        self.client.force_login(self.creator)
+        self.assertEqual(self.client.get(self.url).json(), {'campaign': self.campaign.pk, 'granularity': 'day', 'series': []})
+        self.assertEqual(self.client.get(self.url, {'granularity': 'week'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'since': 'yesterday'}).status_code, 400)
+        self.client.force_login(User.objects.create_superuser('staff', 'staff@example.com', 'pw'))
+        response = self.client.get(reverse('campaign_top_donors', args=[self.campaign.pk]), {'currency': 'etb'})
+        self.assertEqual(response.json(), {'campaign': self.campaign.pk, 'currency': 'ETB', 'donors': []})
@@ -0,0 +1,39 @@
+"""The middleware stack under the ASGI handler the web process runs."""
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.contrib.auth.models import User
+from django.http import HttpResponse
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from payments.middleware import RequestProfilerMiddleware, ServerTimingMiddleware
+from payments.models import Campaign, RequestProfile
+
+
+@override_settings(EXCHANGE_RATE_API_KEY='')
+class AsgiMiddlewareTests(TestCase):
+    def setUp(self):
+        Campaign.objects.create(title='Well')
+
+    def get(self, *args, **kwargs):
+        return async_to_sync(self.async_client.get)(*args, **kwargs)
+
+    def test_middleware_stays_async(self):
+        async def view(request):
+            return HttpResponse()
+
+        for middleware in (ServerTimingMiddleware, RequestProfilerMiddleware):
+            self.assertTrue(iscoroutinefunction(middleware(view)))
+            self.assertFalse(iscoroutinefunction(middleware(lambda request: HttpResponse())))
+
+    def test_server_timing_counts_queries_of_sync_views(self):
+        response = self.get(reverse('campaign_list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('db;dur=', response['Server-Timing'])
+
+    def test_flagged_staff_request_is_profiled(self):
+        staff = User.objects.create_user('staff', password='pw', is_staff=True)
+        self.async_client.force_login(staff)
+        response = self.get(reverse('campaign_list'), headers={'X-Profile': '1'})
+        profile = RequestProfile.objects.get(pk=response['X-Profile-Id'])
+        self.assertEqual((profile.path, profile.user), (reverse('campaign_list'), staff))
+        self.assertNotIn('X-Profile-Id', self.get(reverse('campaign_list')))
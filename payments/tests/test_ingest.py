@@ -0,0 +1,123 @@
+"""Bulk import of offline donations: validation, one increment per campaign, idempotent re-runs."""
+import json
+from datetime import datetime
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from payments import analytics, ingest
+from payments.models import Campaign, DonorRollup, Transaction
+from payments.money import Money
+
+CSV = """campaign_id,amount,payment_method,transaction_id,donor_email,received_at
+{a},100.00,cash,R-1,donor@example.com,2026-03-01T10:00:00
+{a},50.25,bank_transfer,B-1,Donor@Example.com,2026-03-02
+{b},20,,R-2,,
+{a},-5,cash,R-3,,
+999999,10,cash,R-4,,
+{a},10,paypal,R-5,,
+{a},10,cash,R-6,not-an-email,
+{a},10,cash,R-1,,
+"""
+
+
+class ImportDonationsTests(TestCase):
+    def setUp(self):
+        self.a = Campaign.objects.create(title='Well')
+        self.b = Campaign.objects.create(title='School')
+
+    def run_import(self, **kwargs):
+        return ingest.import_donations(CSV.format(a=self.a.pk, b=self.b.pk).splitlines(keepends=True), **kwargs)
+
+    def test_imports_valid_rows_and_reports_the_rest(self):
+        summary = self.run_import(chunk_size=3)
+        self.assertEqual((summary['rows'], summary['imported'], summary['duplicates'], summary['failed']), (8, 3, 1, 4))
+        self.assertEqual([error['line'] for error in summary['errors']], [5, 6, 7, 8])
+        self.assertIn('does not exist', summary['errors'][1]['error'])
+        self.a.refresh_from_db()
+        self.b.refresh_from_db()
+        self.assertEqual(self.a.total_birr, Money(15025, 'ETB'))
+        self.assertEqual(self.b.total_birr, Money(2000, 'ETB'))
+        self.assertEqual(self.a.total_usd, Money(0, 'USD'))
+        self.assertTrue(Transaction.objects.filter(transaction_id='R-1', completed=True).exists())
+        received = Transaction.objects.get(transaction_id='R-1').completed_at
+        self.assertEqual(received, timezone.make_aware(datetime(2026, 3, 1, 10)))
+
+        donor = DonorRollup.objects.get(campaign=self.a)
+        self.assertEqual((donor.donor_email, donor.amount, donor.count), ('donor@example.com', Money(15025, 'ETB'), 2))
+        daily = analytics.donation_series(self.a.pk, 'day', since=received, until=timezone.now())
+        self.assertEqual(sum(row['amount'] for row in daily), 15025)
+        self.assertEqual(analytics.rebuild(), (6, 1))
+        self.assertEqual(DonorRollup.objects.get(campaign=self.a).amount, Money(15025, 'ETB'))
+
+    def test_rejects_non_ascii_ids_and_out_of_range_amounts(self):
+        now = timezone.now()
+        for record, error in [
+            ({'campaign_id': '\u00b2', 'amount': '10'}, 'campaign_id'),
+            ({'campaign_id': '\u0661', 'amount': '10'}, 'campaign_id'),
+            ({'campaign_id': '9' * 23, 'amount': '10'}, 'does not exist'),
+            ({'campaign_id': str(2 ** 63), 'amount': '10'}, 'does not exist'),
+            ({'campaign_id': str(self.a.pk), 'amount': '1e999999'}, 'Amount'),
+        ]:
+            with self.subTest(record=record), self.assertRaisesMessage(ingest.RowError, error):
+                ingest.parse_record(record, now)
+
+    def test_reimport_skips_stored_donations(self):
+        self.run_import()
+        summary = self.run_import()
+        self.assertEqual((summary['imported'], summary['duplicates']), (0, 4))
+        self.a.refresh_from_db()
+        self.assertEqual(self.a.total_birr, Money(15025, 'ETB'))
+
+    def test_reimport_without_transaction_ids_credits_once(self):
+        lines = [json.dumps({'campaign_id': self.a.pk, 'amount': '1.00'}) + '\n'] * 3
+        lines.append(json.dumps({'campaign_id': self.a.pk, 'amount': '1.00', 'received_at': '2026-03-01'}) + '\n')
+        self.assertEqual(ingest.import_donations(lines, 'ndjson')['imported'], 4)
+        summary = ingest.import_donations(lines + lines[:1], 'ndjson')
+        self.assertEqual((summary['imported'], summary['duplicates']), (1, 4))
+        self.a.refresh_from_db()
+        self.assertEqual(self.a.total_birr, Money(500, 'ETB'))
+
+    def test_dry_run_writes_nothing(self):
+        summary = self.run_import(dry_run=True)
+        self.assertEqual(summary['imported'], 3)
+        self.assertFalse(Transaction.objects.exists())
+
+    def test_chunk_writes_one_campaign_update(self):
+        lines = [json.dumps({'campaign_id': campaign.pk, 'amount': '1.00'}) + '\n' for campaign in (self.a, self.b) * 20]
+        # campaigns, existing ids, savepoint, bulk insert, balance update, rollup upsert (no donor emails),
+        # outbox insert, release
+        with self.assertNumQueries(8):
+            summary = ingest.import_donations(lines, 'ndjson')
+        self.assertEqual(summary['imported'], 40)
+        self.a.refresh_from_db()
+        self.assertEqual((self.a.total_birr, self.a.version), (Money(2000, 'ETB'), 1))
+
+
+class DonationImportViewTests(TestCase):
+    def setUp(self):
+        self.campaign = Campaign.objects.create(title='Well')
+        self.url = reverse('donation_import')
+
+    def test_staff_only(self):
+        User.objects.create_user('user', password='pw')
+        self.client.login(username='user', password='pw')
+        response = self.client.post(self.url, 'campaign_id,amount\n', content_type='text/csv')
+        self.assertEqual(response.status_code, 403)
+
+    def test_imports_ndjson_body(self):
+        User.objects.create_user('staff', password='pw', is_staff=True)
+        self.client.login(username='staff', password='pw')
+        body = '\n'.join([
+            json.dumps({'campaign_id': self.campaign.pk, 'amount': '12.50', 'transaction_id': 'R-1'}),
+            'not json',
+        ])
+        response = self.client.post(self.url, body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['imported'], 1)
+        self.assertEqual(response.json()['errors'], [{'line': 2, 'transaction_id': '', 'error': 'Line is not a JSON object.'}])
+        self.campaign.refresh_from_db()
+        self.assertEqual(self.campaign.total_birr, Money(1250, 'ETB'))
+        self.assertEqual(self.client.post(self.url, body, content_type='application/json').status_code, 415)
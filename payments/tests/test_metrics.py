@@ -0,0 +1,42 @@
+"""Per-process metrics: recording, fork handling and the /metrics export."""
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from payments import metrics
+from payments.utils import timing
+
+
+class ForkTests(SimpleTestCase):
+    def test_worker_forked_after_recording_starts_from_zero_and_keeps_span_histograms(self):
+        metrics.DB_QUERY_TIME.observe(0.001)
+        metrics.DONATIONS_COMPLETED.labels('chapa').inc()
+        # As in a worker forked from a process whose flusher already ran.
+        with mock.patch.dict(metrics._flusher, {'pid': -1}), mock.patch('payments.metrics.threading.Thread'):
+            with timing.track('db'):
+                pass
+            with timing.track('chapa'):
+                pass
+            db = metrics.DB_QUERY_TIME.snapshot()['']
+            gateway = metrics.GATEWAY_LATENCY.snapshot()['chapa']
+            donations = metrics.DONATIONS_COMPLETED.snapshot()['chapa']
+        self.assertEqual((sum(db['counts']), sum(gateway['counts']), donations), (1, 1, 0.0))
+
+
+class MetricsViewTests(TestCase):
+    @override_settings(METRICS_TOKEN='')
+    def test_staff_only_without_a_token(self):
+        url = reverse('metrics')
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.client.force_login(User.objects.create_user('staff', is_staff=True))
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'# TYPE payments_donations_completed_total counter', response.content)
+
+    @override_settings(METRICS_TOKEN='scrape-me')
+    def test_bearer_token(self):
+        url = reverse('metrics')
+        self.assertEqual(self.client.get(url, headers={'Authorization': 'Bearer wrong'}).status_code, 403)
+        self.assertEqual(self.client.get(url, headers={'Authorization': 'Bearer scrape-me'}).status_code, 200)
@@ -0,0 +1,73 @@
+"""Money, Rate and MoneyField: integer minor units that round like Decimal did."""
+import random
+from decimal import Decimal
+
+from django.test import SimpleTestCase, TestCase
+
+from payments.models import Campaign, Transaction
+from payments.money import Money, Rate, format_minor, round_div, to_minor
+from payments.views import validate_amount
+
+
+class MoneyTests(SimpleTestCase):
+    def test_parse_never_goes_through_float(self):
+        self.assertEqual(to_minor('0.29'), 29)
+        self.assertEqual(to_minor('12345678901234.56'), 1234567890123456)
+        self.assertEqual(to_minor(' 1.005 '), 100)  # half to even, like quantize
+        for bad in ('abc', 'nan', 'inf', '', None, '1e30'):
+            with self.assertRaises(ValueError):
+                to_minor(bad)
+
+    def test_huge_exponents_are_out_of_range(self):
+        for bad in ('1e999999', '-1e999999', '1e999998', Decimal('9e425000000')):
+            with self.assertRaisesMessage(ValueError, 'out of range'):
+                to_minor(bad)
+        self.assertEqual(to_minor('1e-999999'), 0)
+        self.assertEqual(to_minor('92233720368547758.07'), 2 ** 63 - 1)
+        self.assertEqual(validate_amount('1e999999'), (None, "Amount must be a positive number greater than 0."))
+
+    def test_format(self):
+        self.assertEqual([format_minor(m) for m in (0, 5, 1234, -1234, -5)], ['0.00', '0.05', '12.34', '-12.34', '-0.05'])
+        self.assertEqual(f"{Money(1234, 'USD')} / {Money(1234, 'USD'):.1f}", '12.34 / 12.3')
+
+    def test_currencies_do_not_mix(self):
+        self.assertEqual(sum([Money(1, 'ETB'), Money(2, 'ETB')]), Money(3, 'ETB'))
+        with self.assertRaises(ValueError):
+            Money(1, 'ETB') + Money(1, 'USD')
+
+    def test_conversions_match_decimal_quantize(self):
+        cent = Decimal('0.01')
+        rng = random.Random(38)
+        for value in (132.1, 57.8712, 0.3):
+            rate = Rate(value)
+            decimal_rate = Decimal(str(value))
+            for minor in [rng.randrange(10 ** 9) for _ in range(500)] + [5, 15, 25]:
+                amount = Decimal(minor) / 100
+                self.assertEqual(rate.to_quote_minor(minor), to_minor((amount * decimal_rate).quantize(cent)))
+                self.assertEqual(rate.to_base_minor(minor), to_minor((amount / decimal_rate).quantize(cent)))
+        self.assertEqual(round_div(-5, 2), -2)
+
+
+class MoneyFieldTests(TestCase):
+    def test_round_trip_and_raw_values(self):
+        campaign = Campaign.objects.create(title='Big', goal=Decimal('123456789012.34'), total_usd='0.29')
+        campaign.refresh_from_db()
+        self.assertEqual(campaign.goal, Money(12345678901234, 'ETB'))
+        self.assertEqual(campaign.total_usd, Money(29, 'USD'))
+        self.assertEqual(Campaign.objects.values_list('goal', flat=True).get(), 12345678901234)
+
+    def test_bare_ints_are_refused(self):
+        with self.assertRaisesMessage(ValueError, 'Cannot assign 100 to "Campaign.goal"'):
+            Campaign(title='Ambiguous', goal=100)
+        campaign = Campaign.objects.create(title='Explicit', goal='100', total_usd=Money(100, 'USD'))
+        with self.assertRaises(ValueError):
+            campaign.total_birr = 5
+        campaign.full_clean()
+        campaign = Campaign.objects.get()
+        self.assertEqual((campaign.goal, campaign.total_usd, campaign.total_birr), (Money(10000, 'ETB'), Money(100, 'USD'), Money(0, 'ETB')))
+
+    def test_currency_follows_another_field(self):
+        campaign = Campaign.objects.create(title='c')
+        chapa = Transaction.objects.create(campaign=campaign, amount='10', payment_method='chapa', transaction_id='C')
+        paypal = Transaction.objects.create(campaign=campaign, amount='10', payment_method='paypal', transaction_id='P')
+        self.assertEqual((chapa.amount.currency, paypal.amount.currency), ('ETB', 'USD'))
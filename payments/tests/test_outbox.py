@@ -0,0 +1,86 @@
+"""Outbox: events written with the change they describe, delivered in order per campaign."""
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.db import transaction as db_transaction
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from payments import outbox
+from payments.models import Campaign, OutboxEvent, Transaction, WithdrawalRequest
+from payments.money import Money
+from payments.services import approve_withdrawals, credit_transaction
+
+
+class OutboxTests(TestCase):
+    def setUp(self):
+        self.campaign = Campaign.objects.create(title='Well', total_usd=Money(10000, 'USD'))
+        self.delivered = []
+        self.failing = set()
+        outbox.register(outbox.DONATION_COMPLETED, self.handle)
+        self.addCleanup(outbox.unregister, outbox.DONATION_COMPLETED, self.handle)
+
+    def handle(self, event):
+        if event.payload['transaction_id'] in self.failing:
+            raise RuntimeError("receipt service down")
+        self.delivered.append(event.payload['transaction_id'])
+
+    def donate(self, tx_id, campaign=None):
+        transaction = Transaction.objects.create(
+            campaign=campaign or self.campaign, amount='5.00', payment_method='chapa', transaction_id=tx_id,
+        )
+        credit_transaction(transaction, transaction.amount)
+
+    def test_events_are_written_with_the_change(self):
+        self.donate('C1')
+        withdrawal = WithdrawalRequest.objects.create(
+            campaign=self.campaign, requested_amount=Decimal('10.00'), payment_method='paypal',
+            recipient_email='creator@example.com', convert_to='usd',
+        )
+        approve_withdrawals([withdrawal.pk], rate=130)
+        events = list(OutboxEvent.objects.order_by('pk').values_list('topic', 'payload'))
+        self.assertEqual(events[0][0], outbox.DONATION_COMPLETED)
+        self.assertEqual((events[0][1]['transaction_id'], events[0][1]['amount'], events[0][1]['currency']), ('C1', 500, 'ETB'))
+        self.assertEqual(events[1][0], outbox.WITHDRAWAL_APPROVED)
+        self.assertEqual((events[1][1]['withdrawal'], events[1][1]['amount']), (withdrawal.pk, 1000))
+
+    def test_rolled_back_change_leaves_no_event(self):
+        transaction = Transaction.objects.create(
+            campaign=self.campaign, amount='5.00', payment_method='chapa', transaction_id='C1',
+        )
+        with self.assertRaises(RuntimeError), db_transaction.atomic():
+            credit_transaction(transaction, transaction.amount)
+            raise RuntimeError
+        self.assertFalse(OutboxEvent.objects.exists())
+
+    def test_failed_event_holds_back_its_campaign_only(self):
+        other = Campaign.objects.create(title='School')
+        self.donate('A1')
+        self.donate('B1', other)
+        self.donate('A2')
+        self.failing.add('A1')
+        self.assertEqual(outbox.dispatch(), {'delivered': 1, 'retrying': 1, 'failed': 0})
+        self.assertEqual(self.delivered, ['B1'])
+        first = OutboxEvent.objects.get(payload__transaction_id='A1')
+        self.assertEqual((first.status, first.attempts), ('pending', 1))
+        self.assertIn('receipt service down', first.last_error)
+
+        self.failing.clear()
+        self.assertEqual(outbox.dispatch(), {'delivered': 0, 'retrying': 0, 'failed': 0})  # still backing off
+        later = timezone.now() + timedelta(minutes=1)
+        with mock.patch('payments.outbox.timezone.now', return_value=later):
+            self.assertEqual(outbox.dispatch()['delivered'], 2)
+        self.assertEqual(self.delivered, ['B1', 'A1', 'A2'])
+        self.assertFalse(OutboxEvent.objects.exclude(status='delivered').exists())
+
+    @override_settings(OUTBOX_MAX_ATTEMPTS=1)
+    def test_event_fails_after_max_attempts_and_can_be_requeued(self):
+        self.donate('A1')
+        self.donate('A2')
+        self.failing.add('A1')
+        self.assertEqual(outbox.dispatch(), {'delivered': 1, 'retrying': 0, 'failed': 1})
+        self.assertEqual(outbox.requeue(OutboxEvent.objects.all()), 1)
+        self.failing.clear()
+        outbox.dispatch()
+        self.assertEqual(self.delivered, ['A2', 'A1'])
@@ -0,0 +1,149 @@
+"""Payout batching: one call per batch, safe retries, duplicates treated as already submitted."""
+from unittest import mock
+
+import requests
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from payments import payouts
+from payments.models import Campaign, PayoutBatch, WithdrawalRequest
+from payments.money import Money
+
+
+class FakeResponse:
+    def __init__(self, status_code, data):
+        self.status_code = status_code
+        self._data = data
+        self.text = str(data)
+
+    def json(self):
+        return self._data
+
+
+class FakeSession:
+    """Answers requests from a queue of responses (or exceptions) and records them."""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = []
+
+    def request(self, method, url, **kwargs):
+        self.calls.append((method, url, kwargs))
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+@override_settings(
+    PAYOUT_BATCH_SIZE_PAYPAL=2, PAYOUT_BATCH_SIZE_CHAPA=2, CHAPA_PAYOUT_BANK_CODE='telebirr',
+    PAYPAL_API_BASE='https://paypal.test', CHAPA_API_BASE='https://chapa.test',
+)
+class PayoutTests(TestCase):
+    def setUp(self):
+        self.campaign = Campaign.objects.create(title='Well')
+        token = mock.patch('payments.payouts.get_paypal_access_token', return_value=('token', None))
+        token.start()
+        self.addCleanup(token.stop)
+
+    def queue(self, method, count=1):
+        currency = 'USD' if method == 'paypal' else 'ETB'
+        return [
+            WithdrawalRequest.objects.create(
+                campaign=self.campaign, requested_amount=Money(1000, 'ETB'), payment_method=method,
+                recipient_email='creator@example.com', recipient_phone='0911000000', status='approved',
+                payout_status='queued', payout_amount=Money(1000, currency), payout_currency=currency,
+            )
+            for _ in range(count)
+        ]
+
+    def session(self, *responses):
+        session = FakeSession(*responses)
+        patcher = mock.patch('payments.utils.http.get_session', return_value=session)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return session
+
+    def test_batches_group_by_provider_and_chunk(self):
+        withdrawals = self.queue('paypal', 3) + self.queue('chapa')
+        batches = payouts.create_batches()
+        self.assertEqual(sorted((b.provider, b.item_count) for b in batches), [('chapa', 1), ('paypal', 1), ('paypal', 2)])
+        references = set(WithdrawalRequest.objects.values_list('payout_reference', flat=True))
+        self.assertEqual(references, {f"wd-{w.pk}" for w in withdrawals})
+
+    def test_timeout_is_retried_with_the_same_idempotency_key(self):
+        self.queue('paypal', 2)
+        batch = payouts.create_batches()[0]
+        session = self.session(
+            requests.Timeout('read timed out'),
+            FakeResponse(201, {'batch_header': {'payout_batch_id': 'PB-1'}}),
+        )
+        self.assertFalse(payouts.submit_batch(batch))
+        batch.refresh_from_db()
+        self.assertEqual(batch.status, 'pending')
+        self.assertTrue(payouts.submit_batch(batch))
+        batch.refresh_from_db()
+        self.assertEqual((batch.status, batch.provider_batch_id), ('submitted', 'PB-1'))
+        keys = [call[2]['headers']['PayPal-Request-Id'] for call in session.calls]
+        self.assertEqual(keys, [f"payout-batch-{batch.pk}"] * 2)
+        self.assertEqual(session.calls[0][2]['json'], session.calls[1][2]['json'])
+
+    def test_duplicate_response_means_already_submitted(self):
+        withdrawal = self.queue('chapa')[0]
+        batch = payouts.create_batches()[0]
+        self.session(
+            FakeResponse(400, {'status': 'failed', 'message': 'Duplicate reference'}),
+            FakeResponse(200, {'status': 'success', 'data': {'reference': f"wd-{withdrawal.pk}", 'status': 'success'}}),
+        )
+        self.assertTrue(payouts.submit_batch(batch))
+        withdrawal.refresh_from_db()
+        self.assertEqual(withdrawal.payout_status, 'submitted')
+        self.assertTrue(payouts.poll_batch(PayoutBatch.objects.get(pk=batch.pk)))
+        withdrawal.refresh_from_db()
+        self.assertEqual(withdrawal.payout_status, 'paid')
+
+    def test_rejected_batch_fails_and_requeue_keeps_references(self):
+        withdrawal = self.queue('chapa')[0]
+        batch = payouts.create_batches()[0]
+        self.session(FakeResponse(400, {'status': 'failed', 'message': 'Invalid account number'}))
+        self.assertFalse(payouts.submit_batch(batch))
+        batch.refresh_from_db()
+        withdrawal.refresh_from_db()
+        self.assertEqual((batch.status, withdrawal.payout_status), ('failed', 'failed'))
+
+        self.assertEqual(payouts.requeue_failed(WithdrawalRequest.objects.all()), 1)
+        retry = payouts.create_batches()[0]
+        self.assertNotEqual(retry.pk, batch.pk)
+        withdrawal.refresh_from_db()
+        self.assertEqual((withdrawal.payout_batch_id, withdrawal.payout_reference), (retry.pk, f"wd-{withdrawal.pk}"))
+
+    def test_admin_requeue_warns_about_paypal(self):
+        withdrawals = self.queue('paypal') + self.queue('chapa')
+        WithdrawalRequest.objects.update(payout_status='failed')
+        self.client.force_login(User.objects.create_superuser('admin', password='pw'))
+        response = self.client.post(reverse('admin:payments_withdrawalrequest_changelist'), {
+            'action': 'requeue_payout', '_selected_action': [w.pk for w in withdrawals],
+        }, follow=True)
+        messages = [str(message) for message in response.context['messages']]
+        self.assertEqual(messages[0], "2 failed payout(s) queued again.")
+        self.assertIn("1 of them will be sent through PayPal again", messages[1])
+
+    def test_poll_updates_items_and_completes_batch(self):
+        paid, failed = self.queue('paypal', 2)
+        batch = payouts.create_batches()[0]
+        batch.status, batch.provider_batch_id = 'submitted', 'PB-1'
+        batch.save()
+        WithdrawalRequest.objects.update(payout_status='submitted')
+        self.session(FakeResponse(200, {
+            'batch_header': {'batch_status': 'SUCCESS'},
+            'items': [
+                {'payout_item': {'sender_item_id': f"wd-{paid.pk}"}, 'transaction_status': 'SUCCESS'},
+                {'payout_item': {'sender_item_id': f"wd-{failed.pk}"}, 'transaction_status': 'RETURNED',
+                 'errors': {'message': 'Receiver unregistered'}},
+            ],
+        }))
+        self.assertTrue(payouts.poll_batch(batch))
+        statuses = dict(WithdrawalRequest.objects.values_list('pk', 'payout_status'))
+        self.assertEqual(statuses, {paid.pk: 'paid', failed.pk: 'failed'})
+        self.assertEqual(PayoutBatch.objects.get(pk=batch.pk).status, 'completed')
@@ -0,0 +1,118 @@
+"""Microbenchmarks for the payments hot paths, checked against budgets.
+
+Budgets live in ``perf_budgets.json`` next to this file, in milliseconds
+for the operation named by each entry. Each benchmark takes the best of
+several runs. Budgets are wall-clock times from one machine, so a normal
+test run only reports a run over budget. With ``PERF_BUDGETS=1`` (on a
+quiet machine like the one the budgets were set on) it fails instead.
+Scale every budget for a slower machine with ``PERF_BUDGET_SCALE=2``, and
+set ``PERF_REPORT=1`` to print each measurement.
+
+    PERF_BUDGETS=1 PERF_REPORT=1 python manage.py test payments.tests.test_performance
+
+When a change makes a path faster, lower its budget in the same commit.
+"""
+import json
+import os
+import sys
+import time
+import timeit
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
+
+from django.test import TestCase, override_settings
+
+from payments.models import Campaign, Transaction, WithdrawalRequest
+from payments.money import Money
+from payments.serializers import CAMPAIGN_VALUES, CampaignSerializer, serialize_campaigns
+from payments.services import approve_withdrawals, credit_transaction
+from payments.views import validate_amount
+
+BUDGETS = json.loads(Path(__file__).with_name('perf_budgets.json').read_text())
+SCALE = float(os.environ.get('PERF_BUDGET_SCALE', '1'))
+ENFORCE = os.environ.get('PERF_BUDGETS') == '1'
+RATE = 132.1
+REPEAT = 5
+
+
+def make_campaigns(count):
+    return Campaign.objects.bulk_create([
+        Campaign(title=f'Campaign {i}', goal=Decimal('10000.00'), total_usd=Decimal('1000.00'), total_birr=Decimal('50000.00'))
+        for i in range(count)
+    ])
+
+
+@override_settings(EXCHANGE_RATE_API_KEY='')
+class PerformanceBudgetTests(TestCase):
+    def assertWithinBudget(self, name, seconds):
+        budget_ms = BUDGETS[name]['ms'] * SCALE
+        measured_ms = seconds * 1000
+        if os.environ.get('PERF_REPORT'):
+            print(f"{name}: {measured_ms:.4f} ms (budget {budget_ms:.4f} ms)")
+        if not ENFORCE:
+            if measured_ms > budget_ms:
+                print(f"{name} took {measured_ms:.4f} ms, over its {budget_ms:.4f} ms budget (not enforced)", file=sys.stderr)
+            return
+        self.assertLessEqual(
+            measured_ms, budget_ms,
+            f"{name} took {measured_ms:.4f} ms, over its {budget_ms:.4f} ms budget ({BUDGETS[name]['unit']})",
+        )
+
+    def best_of(self, func, number=1):
+        return min(timeit.repeat(func, repeat=REPEAT, number=number)) / number
+
+    def test_validate_amount(self):
+        self.assertWithinBudget('validate_amount', self.best_of(lambda: validate_amount('1234.56'), number=10000))
+
+    def test_campaign_serializer_1000(self):
+        make_campaigns(1000)
+        context = {'usd_to_etb_rate': RATE}
+        seconds = self.best_of(lambda: CampaignSerializer(Campaign.objects.all(), many=True, context=context).data)
+        self.assertWithinBudget('campaign_serializer_1000', seconds)
+
+    def test_serialize_campaigns_1000(self):
+        make_campaigns(1000)
+        seconds = self.best_of(lambda: serialize_campaigns(Campaign.objects.values(*CAMPAIGN_VALUES), RATE))
+        self.assertWithinBudget('serialize_campaigns_1000', seconds)
+
+    def test_get_percentage_funded(self):
+        campaign = make_campaigns(1)[0]
+        self.assertWithinBudget('get_percentage_funded', self.best_of(lambda: campaign.get_percentage_funded(RATE), number=10000))
+
+    def test_approve_withdrawals_200(self):
+        campaigns = make_campaigns(20)
+        runs = []
+        for _ in range(REPEAT):
+            withdrawals = WithdrawalRequest.objects.bulk_create([
+                WithdrawalRequest(
+                    campaign=campaigns[i % 20], requested_amount=Decimal('1.00'), payment_method='paypal',
+                    recipient_email='creator@example.com', convert_to='usd',
+                )
+                for i in range(200)
+            ])
+            ids = [w.pk for w in withdrawals]
+            start = time.perf_counter()
+            outcomes = approve_withdrawals(ids, rate=RATE)
+            runs.append(time.perf_counter() - start)
+            self.assertTrue(all(outcome['status'] == 'approved' for outcome in outcomes))
+        self.assertWithinBudget('approve_withdrawals_200', min(runs))
+
+    def test_credit_transaction(self):
+        campaign = make_campaigns(1)[0]
+        transactions = Transaction.objects.bulk_create([
+            Transaction(campaign=campaign, amount=Decimal('10.00'), payment_method='chapa', transaction_id=f'CHAPA-{i}')
+            for i in range(REPEAT * 100)
+        ])
+        for transaction in transactions:
+            transaction.campaign = campaign
+        runs = []
+        with mock.patch('payments.services.metrics'):
+            for start_index in range(0, len(transactions), 100):
+                start = time.perf_counter()
+                for transaction in transactions[start_index:start_index + 100]:
+                    credit_transaction(transaction, transaction.amount)
+                runs.append((time.perf_counter() - start) / 100)
+        campaign.refresh_from_db()
+        self.assertEqual(campaign.total_birr, Money(5000000 + 1000 * len(transactions), 'ETB'))
+        self.assertWithinBudget('credit_transaction', min(runs))
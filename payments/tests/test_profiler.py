@@ -0,0 +1,32 @@
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from payments.models import RequestProfile
+
+
+@override_settings(EXCHANGE_RATE_API_KEY='')
+class RequestProfilerTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user('staff', password='pw', is_staff=True)
+
+    def test_unflagged_and_non_staff_requests_are_not_profiled(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('campaign_list'))
+        self.assertNotIn('X-Profile-Id', response)
+        self.client.logout()
+        response = self.client.get(reverse('campaign_list'), {'profile': '1'}, HTTP_X_PROFILE='1')
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertFalse(RequestProfile.objects.exists())
+
+    def test_flagged_staff_request_is_profiled_and_downloadable(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('campaign_list'), HTTP_X_PROFILE='1')
+        profile = RequestProfile.objects.get(pk=response['X-Profile-Id'])
+        self.assertEqual(profile.path, reverse('campaign_list'))
+        self.assertEqual(profile.user, self.staff)
+
+        User.objects.filter(pk=self.staff.pk).update(is_superuser=True)
+        download = self.client.get(reverse('admin:payments_requestprofile_download', args=[profile.pk]))
+        self.assertEqual(download.status_code, 200)
+        self.assertEqual(download.content.decode(), profile.collapsed_stacks)
@@ -0,0 +1,84 @@
+"""Live progress stream: one publisher per process pushes versioned campaign snapshots."""
+import asyncio
+import gc
+import json
+
+from asgiref.sync import sync_to_async
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from payments import progress
+from payments.models import Campaign, Transaction
+from payments.money import Money
+from payments.services import credit_transaction
+
+
+def donate(campaign, tx_id):
+    transaction = Transaction.objects.create(campaign=campaign, amount='25.00', payment_method='chapa', transaction_id=tx_id)
+    credit_transaction(transaction, Money(2500, 'ETB'))
+
+
+async def next_event(stream):
+    while True:
+        chunk = (await asyncio.wait_for(anext(stream), 5)).decode()
+        if chunk.startswith('event: progress'):
+            return json.loads(chunk.split('data: ', 1)[1])
+
+
+@override_settings(EXCHANGE_RATE_API_KEY='', PROGRESS_POLL_INTERVAL=60)
+class ProgressStreamTests(TestCase):
+    def setUp(self):
+        self.campaign = Campaign.objects.create(title='Well', goal='1000')
+
+    async def test_stream_pushes_snapshot_then_updates(self):
+        response = await self.async_client.get(reverse('campaign_progress_stream'), {'campaigns': str(self.campaign.pk)})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        snapshot = await next_event(stream)
+        self.assertEqual((snapshot['id'], snapshot['version'], snapshot['total_birr']), (self.campaign.pk, 0, '0.00'))
+
+        await sync_to_async(donate)(self.campaign, 'CHAPA-1')
+        progress.notify()  # on_commit never fires inside TestCase
+        snapshot = await next_event(stream)
+        self.assertEqual((snapshot['version'], snapshot['total_birr'], snapshot['percentage_funded']), (1, '25.00', 2.5))
+
+        # Dropping the response (as the server does on disconnect) ends the subscription.
+        await stream.aclose()
+        del stream, response
+        gc.collect()
+        await asyncio.sleep(0.01)
+        self.assertEqual(progress.publisher._channels, {})
+
+    async def test_streams_on_different_loops_do_not_disturb_each_other(self):
+        first = progress.publisher.subscribe({self.campaign.pk})
+        # Another loop (as a second WSGI request would have) subscribing...
+        other = await asyncio.to_thread(asyncio.run, self._subscribe_and_leave())
+        self.assertEqual(other, {self.campaign.pk})
+        # ...leaves this loop's subscription in place and fed.
+        snapshots = await first.get(5)
+        self.assertEqual([snapshot['id'] for snapshot in snapshots], [self.campaign.pk])
+        progress.publisher.unsubscribe(first)
+        self.assertEqual(progress.publisher._channels, {})
+
+    async def _subscribe_and_leave(self):
+        subscription = progress.publisher.subscribe({self.campaign.pk})
+        progress.publisher.unsubscribe(subscription)
+        return subscription.campaign_ids
+
+    async def test_rejects_bad_ids(self):
+        url = reverse('campaign_progress_stream')
+        self.assertEqual((await self.async_client.get(url, {'campaigns': 'x'})).status_code, 400)
+        self.assertEqual((await self.async_client.get(url)).status_code, 400)
+        self.assertEqual((await self.async_client.get(url, {'campaigns': '999999'})).status_code, 404)
+
+    def test_refused_under_wsgi(self):
+        response = self.client.get(reverse('campaign_progress_stream'), {'campaigns': str(self.campaign.pk)})
+        self.assertEqual(response.status_code, 501)
+
+    def test_balance_changes_bump_version(self):
+        donate(self.campaign, 'CHAPA-2')
+        with self.captureOnCommitCallbacks() as callbacks:
+            donate(self.campaign, 'CHAPA-3')
+        self.assertEqual(callbacks, [progress.notify])
+        self.campaign.refresh_from_db()
+        self.assertEqual(self.campaign.version, 2)
@@ -0,0 +1,201 @@
+"""Query-count guards for the payments endpoints.
+
+Each test pins the number of queries an endpoint makes, and the list
+endpoints are checked at two sizes so per-row queries (N+1) fail the run.
+Gateway and exchange-rate calls are mocked; nothing leaves the process.
+"""
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core import signing
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from payments.models import Campaign, Transaction, WithdrawalRequest
+from payments.money import Money
+from payments.views import CHAPA_TX_COOKIE, CHAPA_TX_COOKIE_SALT, get_paypal_access_token
+
+RATE = 132.1
+
+
+def make_campaigns(count, **kwargs):
+    return Campaign.objects.bulk_create([
+        Campaign(
+            title=f'Campaign {i}',
+            goal=Decimal('10000.00'),
+            total_usd=kwargs.get('total_usd', Decimal('100.00')),
+            total_birr=kwargs.get('total_birr', Decimal('5000.00')),
+        )
+        for i in range(count)
+    ])
+
+
+class FakeResponse:
+    def __init__(self, status_code, data):
+        self.status_code = status_code
+        self._data = data
+        self.text = str(data)
+
+    def json(self):
+        return self._data
+
+
+@override_settings(EXCHANGE_RATE_API_KEY='')
+class QueryCountTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+
+
+class CampaignEndpointQueryTests(QueryCountTestCase):
+    def test_campaign_list_is_one_query_regardless_of_size(self):
+        make_campaigns(3)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(reverse('campaign_list')).status_code, 200)
+        make_campaigns(30)
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('campaign_list'))
+        self.assertEqual(len(response.json()), 33)
+
+    def test_campaign_detail_is_one_query(self):
+        campaign = make_campaigns(1)[0]
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('campaign_detail', args=[campaign.pk]))
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(TEST_PAGE_CAMPAIGNS_PER_PAGE=20)
+class TestPageQueryTests(QueryCountTestCase):
+    def test_campaign_table_is_paginated_and_cached_until_a_campaign_changes(self):
+        campaigns = make_campaigns(30)
+        url = reverse('test_page')
+        with mock.patch('payments.views.get_usd_to_etb_rate', return_value=RATE) as rate:
+            # count, page of versions, page of rows
+            with self.assertNumQueries(3):
+                response = self.client.get(url)
+            self.assertEqual(rate.call_count, 1)
+            self.assertContains(response, 'Campaign 19')
+            self.assertNotContains(response, 'Campaign 20<')
+            self.assertContains(response, '18210.00')  # 5000 ETB + 100 USD at 132.1
+            self.assertContains(response, 'Page 1 of 2')
+
+            with self.assertNumQueries(2):
+                self.assertContains(self.client.get(url), 'Campaign 19')
+
+            Campaign.objects.filter(pk=campaigns[0].pk).update(title='Renamed', version=1)
+            with self.assertNumQueries(3):
+                response = self.client.get(url)
+            self.assertContains(response, 'Renamed')
+
+            with self.assertNumQueries(3):
+                self.assertContains(self.client.get(url, {'page': 2}), 'Campaign 29')
+
+
+class CallbackQueryTests(QueryCountTestCase):
+    def setUp(self):
+        super().setUp()
+        self.campaign = make_campaigns(1, total_usd=Decimal('0.00'), total_birr=Decimal('0.00'))[0]
+
+    def verified(self, amount):
+        return mock.patch(
+            'payments.views.verify_chapa_payment',
+            return_value={'success': True, 'amount': Money.parse(amount, 'ETB'), 'message': 'Payment verified'},
+        )
+
+    def test_chapa_post_callback_credits_without_lazy_campaign_load(self):
+        Transaction.objects.create(campaign=self.campaign, amount=Decimal('50.00'), payment_method='chapa', transaction_id='CHAPA-1')
+        # transaction lookup, conditional completed UPDATE, balance UPDATE, rollup upsert,
+        # outbox insert (+ savepoint pair)
+        with self.verified('50.00'), self.assertNumQueries(7):
+            response = self.client.post(reverse('chapa_callback'), {'tx_ref': 'CHAPA-1'})
+        self.assertEqual(response.status_code, 302)
+        self.campaign.refresh_from_db()
+        self.assertEqual(self.campaign.total_birr, Money(5000, 'ETB'))
+
+    def test_chapa_get_callback_reads_signed_cookie(self):
+        Transaction.objects.create(campaign=self.campaign, amount=Decimal('50.00'), payment_method='chapa', transaction_id='CHAPA-2')
+        signer = signing.get_cookie_signer(salt=CHAPA_TX_COOKIE + CHAPA_TX_COOKIE_SALT)
+        self.client.cookies[CHAPA_TX_COOKIE] = signer.sign('CHAPA-2')
+        with self.verified('50.00'), self.assertNumQueries(7):
+            response = self.client.get(reverse('chapa_callback'))
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(Transaction.objects.get(transaction_id='CHAPA-2').completed)
+
+    def test_duplicate_chapa_callback_does_not_verify_again(self):
+        Transaction.objects.create(
+            campaign=self.campaign, amount=Decimal('50.00'), payment_method='chapa', transaction_id='CHAPA-3', completed=True
+        )
+        with self.verified('50.00') as verify, self.assertNumQueries(1):
+            self.client.post(reverse('chapa_callback'), {'tx_ref': 'CHAPA-3'})
+        verify.assert_not_called()
+
+    def test_paypal_get_callback(self):
+        Transaction.objects.create(campaign=self.campaign, amount=Decimal('10.00'), payment_method='paypal', transaction_id='ORDER-1')
+        responses = {
+            'get': FakeResponse(200, {'id': 'ORDER-1', 'status': 'APPROVED'}),
+            'post': FakeResponse(201, {'id': 'ORDER-1', 'status': 'COMPLETED'}),
+        }
+        session = mock.Mock(**{'get.return_value': responses['get'], 'post.return_value': responses['post']})
+        with mock.patch('payments.views.get_paypal_access_token', return_value=('token', None)), \
+                mock.patch('payments.utils.http.get_session', return_value=session), \
+                self.assertNumQueries(7):
+            response = self.client.get(reverse('paypal_callback'), {'token': 'ORDER-1'})
+        self.assertEqual(response.status_code, 302)
+        self.campaign.refresh_from_db()
+        self.assertEqual(self.campaign.total_usd, Money(1000, 'USD'))
+
+
+class WithdrawalQueryTests(QueryCountTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_superuser('staff', 'staff@example.com', 'pw')
+
+    def test_withdraw_request(self):
+        campaign = make_campaigns(1)[0]
+        self.client.force_login(self.user)
+        data = {
+            'campaign_id': campaign.pk, 'amount': '10', 'payment_method': 'paypal',
+            'recipient_email': 'creator@example.com', 'convert_to': 'usd',
+        }
+        # user, campaign, conditional reservation UPDATE, insert (+ savepoint pair)
+        with self.assertNumQueries(6):
+            response = self.client.post(reverse('withdraw'), data)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(WithdrawalRequest.objects.count(), 1)
+
+    def approve_action_queries(self, count):
+        campaigns = make_campaigns(max(1, count // 5))
+        withdrawals = WithdrawalRequest.objects.bulk_create([
+            WithdrawalRequest(
+                campaign=campaigns[i % len(campaigns)], requested_amount=Decimal('1.00'),
+                payment_method='paypal', recipient_email='creator@example.com', convert_to='usd',
+            )
+            for i in range(count)
+        ])
+        self.client.force_login(self.user)
+        self.client.get(reverse('admin:payments_withdrawalrequest_changelist'))  # warm per-process admin caches
+        data = {'action': 'approve_withdrawal', '_selected_action': [w.pk for w in withdrawals]}
+        with mock.patch('payments.services.get_usd_to_etb_rate', return_value=RATE), \
+                CaptureQueriesContext(connection) as context:
+            response = self.client.post(reverse('admin:payments_withdrawalrequest_changelist'), data)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(WithdrawalRequest.objects.filter(status='approved').count(), count)
+        return len(context.captured_queries)
+
+    def test_admin_approval_query_count_does_not_grow_with_batch(self):
+        small = self.approve_action_queries(5)
+        WithdrawalRequest.objects.all().delete()
+        large = self.approve_action_queries(50)
+        self.assertEqual(small, large)
+
+
+class PayPalTokenCacheTests(QueryCountTestCase):
+    def test_token_is_fetched_once_until_it_expires(self):
+        session = mock.Mock(**{'post.return_value': FakeResponse(200, {'access_token': 'abc', 'expires_in': 32400})})
+        with mock.patch('payments.utils.http.get_session', return_value=session):
+            self.assertEqual(get_paypal_access_token(), ('abc', None))
+            self.assertEqual(get_paypal_access_token(), ('abc', None))
+        self.assertEqual(session.post.call_count, 1)
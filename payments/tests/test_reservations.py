@@ -0,0 +1,79 @@
+"""Pending withdrawals reserve funds on the campaign; approval and rejection release them."""
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+
+from payments.models import Campaign, WithdrawalRequest
+from payments.money import Money
+from payments.services import approve_withdrawals, reject_withdrawals, reserve_withdrawal
+
+RATE = 100
+
+
+class ReservationTests(TestCase):
+    def setUp(self):
+        # 100 ETB + 1 USD = 200 ETB at the test rate
+        self.campaign = Campaign.objects.create(title='Well', total_birr=Money(10000, 'ETB'), total_usd=Money(100, 'USD'))
+
+    def reserve(self, amount, currency='ETB'):
+        return reserve_withdrawal(
+            self.campaign.pk, Money(amount, currency), RATE, payment_method='chapa', recipient_phone='0911000000',
+            convert_to='birr' if currency == 'ETB' else 'usd',
+        )
+
+    def test_pending_withdrawals_cannot_overcommit(self):
+        first = self.reserve(15000)
+        self.assertIsNotNone(first)
+        self.assertIsNone(self.reserve(6000))  # only 50 ETB left unreserved
+        second = self.reserve(50, 'USD')  # exactly the 50 ETB left
+        self.assertIsNotNone(second)
+        self.campaign.refresh_from_db()
+        self.assertEqual((self.campaign.reserved_birr, self.campaign.reserved_usd), (Money(15000, 'ETB'), Money(50, 'USD')))
+        self.assertEqual(self.campaign.get_available_in_birr(RATE), Money(0, 'ETB'))
+        self.assertEqual(WithdrawalRequest.objects.count(), 2)
+
+    def test_rejection_and_approval_release_the_reservation(self):
+        first = self.reserve(15000)
+        second = self.reserve(50, 'USD')
+        self.assertEqual(reject_withdrawals([second.pk]), (1, []))
+        self.campaign.refresh_from_db()
+        self.assertEqual(self.campaign.reserved_usd, Money(0, 'USD'))
+
+        approve_withdrawals([first.pk], rate=RATE)
+        self.campaign.refresh_from_db()
+        self.assertEqual(self.campaign.reserved_birr, Money(0, 'ETB'))
+        self.assertEqual(self.campaign.get_balance_in_birr(RATE), Money(5000, 'ETB'))
+        self.assertEqual(reject_withdrawals([first.pk]), (0, [(first.pk, 'approved')]))
+        self.campaign.refresh_from_db()
+        self.assertEqual(self.campaign.reserved_birr, Money(0, 'ETB'))
+
+    def test_withdraw_view_reports_the_unreserved_balance(self):
+        self.reserve(15000)
+        self.client.force_login(User.objects.create_user('creator', password='pw'))
+        data = {'campaign_id': self.campaign.pk, 'amount': '60', 'payment_method': 'chapa', 'recipient_phone': '0911000000'}
+        with mock.patch('payments.views.WithdrawView.get_exchange_rate', return_value=RATE):
+            response = self.client.post(reverse('withdraw'), data, follow=True)
+        self.assertContains(response, 'only 50.00 ETB available')
+        self.assertEqual(WithdrawalRequest.objects.count(), 1)
+
+    def test_deleting_pending_withdrawals_in_the_admin_releases_them(self):
+        first = self.reserve(5000)
+        second = self.reserve(20, 'USD')
+        third = self.reserve(1000)
+        approve_withdrawals([third.pk], rate=RATE)
+        self.client.force_login(User.objects.create_superuser('staff', password='pw'))
+        changelist = reverse('admin:payments_withdrawalrequest_changelist')
+        response = self.client.post(changelist, {
+            'action': 'delete_selected', '_selected_action': [second.pk, third.pk], 'post': 'yes',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.campaign.refresh_from_db()
+        self.assertEqual((self.campaign.reserved_birr, self.campaign.reserved_usd), (Money(5000, 'ETB'), Money(0, 'USD')))
+
+        response = self.client.post(reverse('admin:payments_withdrawalrequest_delete', args=[first.pk]), {'post': 'yes'})
+        self.assertEqual(response.status_code, 302)
+        self.campaign.refresh_from_db()
+        self.assertEqual(self.campaign.reserved_birr, Money(0, 'ETB'))
+        self.assertFalse(WithdrawalRequest.objects.exists())
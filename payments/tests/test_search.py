@@ -0,0 +1,55 @@
+"""Full-text search: the FTS5 index stays in sync with every write path."""
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from payments import search
+from payments.models import Campaign, Transaction
+from payments.money import Money
+
+
+class CampaignSearchTests(TestCase):
+    def titles(self, q):
+        return [row['title'] for row in self.client.get(reverse('campaign_search'), {'q': q}).json()]
+
+    def test_prefix_match_ranks_title_above_description(self):
+        Campaign.objects.create(title='School books', description='Books and water bottles')
+        Campaign.objects.create(title='Water project', description='Wells')
+        self.assertEqual(self.titles('wat'), ['Water project', 'School books'])
+        self.assertEqual(self.titles('wat wel'), ['Water project'])
+        self.assertEqual(self.titles('"*) OR ('), [])
+
+    def test_index_follows_updates_and_deletes(self):
+        campaign = Campaign.objects.create(title='Water project')
+        Campaign.objects.filter(pk=campaign.pk).update(title='Solar panels')
+        self.assertEqual(self.titles('water'), [])
+        self.assertEqual(self.titles('sol'), ['Solar panels'])
+        campaign.delete()
+        self.assertEqual(self.titles('sol'), [])
+
+
+class TransactionSearchTests(TestCase):
+    def setUp(self):
+        campaign = Campaign.objects.create(title='Library roof')
+        Transaction.objects.bulk_create([
+            Transaction(campaign=campaign, amount=Money(100, 'ETB'), payment_method='chapa', transaction_id=f'CHAPA-{i}-ab{i:02d}', donor_email=f'donor{i}@example.com')
+            for i in range(20)
+        ])
+
+    def test_exact_fragment_and_campaign_title(self):
+        transactions = Transaction.objects.all()
+        self.assertEqual(search.filter_transactions(transactions, 'donor7@example.com').count(), 1)
+        self.assertEqual(search.filter_transactions(transactions, 'CHAPA-1').count(), 11)
+        self.assertEqual(search.filter_transactions(transactions, 'libr donor1').count(), 11)
+        self.assertEqual(search.filter_transactions(transactions, 'nothing').count(), 0)
+
+    def test_admin_search_uses_the_index(self):
+        self.client.force_login(User.objects.create_superuser('staff', 'staff@example.com', 'pw'))
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('admin:payments_transaction_changelist'), {'q': 'donor1'})
+        self.assertEqual(response.status_code, 200)
+        sql = ' '.join(query['sql'] for query in context.captured_queries)
+        self.assertIn(search.TRANSACTION_FTS, sql)
+        self.assertNotIn('LIKE', sql)
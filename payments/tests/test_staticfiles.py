@@ -0,0 +1,71 @@
+"""Collected static files: hashed names, compressed variants, immutable caching."""
+import gzip
+import json
+import os
+import tempfile
+
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from payments.middleware import StaticFilesMiddleware
+from payments.staticfiles import accepted_encodings
+
+CSS = 'body { color: #1e293b; }\n' * 200
+
+
+class StaticFilesTests(SimpleTestCase):
+    def setUp(self):
+        source = tempfile.TemporaryDirectory()
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(source.cleanup)
+        self.addCleanup(root.cleanup)
+        os.makedirs(os.path.join(source.name, 'css'))
+        with open(os.path.join(source.name, 'css', 'app.css'), 'w') as f:
+            f.write(CSS)
+        with open(os.path.join(source.name, 'logo.png'), 'wb') as f:
+            f.write(b'\x89PNG' + bytes(range(256)))
+        settings = override_settings(
+            STATIC_ROOT=root.name, STATICFILES_DIRS=[source.name],
+            STATICFILES_FINDERS=['django.contrib.staticfiles.finders.FileSystemFinder'],
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        call_command('collectstatic', interactive=False, verbosity=0)
+        with open(os.path.join(root.name, 'staticfiles.json')) as f:
+            self.hashed = json.load(f)['paths']['css/app.css']
+        self.root = root.name
+        self.middleware = StaticFilesMiddleware(lambda request: HttpResponse('app', status=404))
+        self.factory = RequestFactory()
+
+    def get(self, name, **headers):
+        return self.middleware(self.factory.get('/static/' + name, headers=headers))
+
+    def test_collectstatic_writes_compressed_variants(self):
+        with gzip.open(os.path.join(self.root, self.hashed + '.gz'), 'rt') as f:
+            self.assertEqual(f.read(), CSS)
+        self.assertTrue(os.path.exists(os.path.join(self.root, 'css/app.css.gz')))
+        self.assertFalse(os.path.exists(os.path.join(self.root, 'logo.png.gz')))
+
+    def test_hashed_file_is_immutable_and_negotiated(self):
+        response = self.get(self.hashed, accept_encoding='gzip, deflate')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual((response['Content-Encoding'], response['Vary']), ('gzip', 'Accept-Encoding'))
+        self.assertEqual(response['Content-Type'], 'text/css; charset=utf-8')
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)).decode(), CSS)
+        self.assertEqual(int(response['Content-Length']), os.path.getsize(os.path.join(self.root, self.hashed + '.gz')))
+
+        plain = self.get(self.hashed, accept_encoding='gzip;q=0')
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        self.assertEqual(b''.join(plain.streaming_content).decode(), CSS)
+        self.assertNotEqual(plain['ETag'], response['ETag'])
+        self.assertEqual(self.get(self.hashed, if_none_match=plain['ETag']).status_code, 304)
+
+    def test_unhashed_and_unknown_names(self):
+        self.assertEqual(self.get('css/app.css')['Cache-Control'], 'public, max-age=60')
+        self.assertFalse(self.get('logo.png', accept_encoding='gzip').has_header('Content-Encoding'))
+        self.assertEqual(self.get('css/missing.css').content, b'app')
+        self.assertEqual(self.middleware(self.factory.post('/static/' + self.hashed)).status_code, 405)
+
+    def test_accepted_encodings(self):
+        self.assertEqual(accepted_encodings('br;q=1.0, gzip ;q=0.5, identity;q=0, x;q=bad'), {'br', 'gzip'})
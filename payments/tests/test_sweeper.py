@@ -0,0 +1,65 @@
+"""Transaction sweeper: batched expiry of abandoned checkouts and archival of old rows."""
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from payments import analytics, ingest, sweeper
+from payments.models import Campaign, DonationRollup, Transaction, TransactionArchive
+from payments.services import credit_transaction
+
+
+@override_settings(TRANSACTION_PENDING_TTL_HOURS=24, TRANSACTION_ARCHIVE_AFTER_DAYS=90)
+class SweeperTests(TestCase):
+    def setUp(self):
+        self.campaign = Campaign.objects.create(title='Well')
+        self.now = timezone.now()
+
+    def make(self, tx_id, age, completed=False):
+        return Transaction.objects.create(
+            campaign=self.campaign, amount='5.00', payment_method='chapa', transaction_id=tx_id,
+            completed=completed, created_at=self.now - age, completed_at=self.now - age if completed else None,
+        )
+
+    def test_expires_stale_pending_transactions_in_batches(self):
+        for i in range(5):
+            self.make(f'OLD-{i}', timedelta(hours=30))
+        self.make('FRESH', timedelta(hours=1))
+        self.make('DONE', timedelta(hours=30), completed=True)
+        with self.assertNumQueries(6):  # three batches of two: select + update each
+            self.assertEqual(sweeper.expire_pending(self.now, batch_size=2), 5)
+        self.assertEqual(
+            sorted(Transaction.objects.filter(expired_at__isnull=False).values_list('transaction_id', flat=True)),
+            [f'OLD-{i}' for i in range(5)],
+        )
+
+    def test_expired_checkout_is_still_credited(self):
+        transaction = self.make('LATE', timedelta(hours=30))
+        sweeper.expire_pending(self.now)
+        transaction.refresh_from_db()
+        self.assertTrue(credit_transaction(transaction, transaction.amount))
+        transaction.refresh_from_db()
+        self.assertIsNone(transaction.expired_at)
+
+    def test_archives_old_completed_and_expired_rows(self):
+        self.make('OLD-DONE', timedelta(days=100), completed=True)
+        self.make('RECENT-DONE', timedelta(days=10), completed=True)
+        abandoned = self.make('ABANDONED', timedelta(days=100))
+        Transaction.objects.filter(pk=abandoned.pk).update(expired_at=self.now - timedelta(days=95))
+        self.make('PENDING', timedelta(days=100))  # not expired yet: left for expire_pending
+        self.assertEqual(sweeper.archive_old(self.now, batch_size=1), 2)
+        self.assertEqual(
+            sorted(Transaction.objects.values_list('transaction_id', flat=True)), ['PENDING', 'RECENT-DONE'],
+        )
+        archived = TransactionArchive.objects.get(transaction_id='OLD-DONE')
+        self.assertEqual((archived.amount.minor, archived.currency, archived.completed), (500, 'ETB', True))
+
+        # Archived donations still count everywhere donations are looked up by id or summed.
+        self.assertEqual(analytics.rebuild(), (4, 0))
+        self.assertEqual(sum(DonationRollup.objects.filter(granularity='day').values_list('amount', flat=True)), 1000)
+        summary = ingest.import_donations(['campaign_id,amount,transaction_id\n', f'{self.campaign.pk},5,OLD-DONE\n'])
+        self.assertEqual(summary['duplicates'], 1)
+        response = self.client.get(reverse('transaction_status'), {'ids': 'OLD-DONE,ABANDONED'})
+        self.assertEqual([(row['transaction_id'], row['completed']) for row in response.json()['transactions']],
+                         [('OLD-DONE', True), ('ABANDONED', False)])
@@ -0,0 +1,67 @@
+"""Token-bucket rate limits (429) and gateway admission control (503)."""
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from payments import admission, throttling
+
+RATES = dict(settings.REST_FRAMEWORK, DEFAULT_THROTTLE_RATES={'donate_ip': '2/min'})
+DONATION = {'campaign_id': '', 'amount': '', 'payment_method': 'chapa'}  # rejected before any gateway call
+
+
+class TokenBucketTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        throttling.reset()
+
+    def test_bucket_bursts_then_refills(self):
+        bucket = [('test:ip:1', 2, 1.0)]
+        self.assertEqual(throttling.consume(bucket, now=100.0), 0)
+        self.assertEqual(throttling.consume(bucket, now=100.0), 0)
+        self.assertAlmostEqual(throttling.consume(bucket, now=100.25), 0.75)
+        throttling.reset()
+        self.assertEqual(throttling.consume(bucket, now=101.5), 0)
+
+    @override_settings(REST_FRAMEWORK=RATES)
+    def test_refused_client_gets_retry_after_without_database_work(self):
+        url = reverse('donate')
+        with self.assertNumQueries(0):
+            for _ in range(2):
+                self.assertEqual(self.client.post(url, DONATION).status_code, 302)
+        response = self.client.post(url, DONATION)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '30')
+        with mock.patch.object(throttling.cache, 'get_many') as get_many:
+            self.assertEqual(self.client.post(url, DONATION).status_code, 429)
+        get_many.assert_not_called()
+        # Another client still gets through; a forged X-Forwarded-For does not make one.
+        self.assertEqual(self.client.post(url, DONATION, HTTP_X_FORWARDED_FOR='10.0.0.3').status_code, 429)
+        self.assertEqual(self.client.post(url, DONATION, REMOTE_ADDR='10.0.0.2').status_code, 302)
+
+    @override_settings(REST_FRAMEWORK=dict(RATES, DEFAULT_THROTTLE_RATES={'donate_ip': '1/min', 'callback_ip': '1/min'}))
+    def test_provider_callbacks_are_not_limited_or_shed(self):
+        url = reverse('chapa_callback')
+        with admission.gateway_call(), override_settings(GATEWAY_MAX_INFLIGHT=1):
+            for _ in range(3):
+                self.assertEqual(self.client.post(url, {'tx_ref': 'nope'}).status_code, 404)
+
+
+@override_settings(GATEWAY_MAX_INFLIGHT=2, GATEWAY_LATENCY_TARGET_MS=1000, ADMISSION_RETRY_AFTER=7)
+class AdmissionTests(TestCase):
+    def test_sheds_when_gateway_calls_are_saturated(self):
+        with admission.gateway_call(), admission.gateway_call(), self.assertNumQueries(0):
+            response = self.client.post(reverse('donate'), {'campaign_id': '1', 'amount': '5', 'payment_method': 'chapa'})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '7')
+        self.assertEqual(admission.inflight(), 0)
+
+    def test_limit_shrinks_while_gateways_are_slow(self):
+        with mock.patch.object(admission, '_latency', 0.5):
+            self.assertEqual(admission.limit(), 2)
+        with mock.patch.object(admission, '_latency', 4.0):
+            self.assertEqual(admission.limit(), 1)
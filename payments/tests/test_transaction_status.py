@@ -0,0 +1,61 @@
+"""Bulk transaction status: one IN query, optional long-poll for pending ids."""
+import json
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from payments.models import Campaign, Transaction
+from payments.views import TRANSACTION_STATUS_MAX_IDS
+
+
+class TransactionStatusTests(TestCase):
+    def setUp(self):
+        campaign = Campaign.objects.create(title='Well')
+        Transaction.objects.bulk_create([
+            Transaction(campaign=campaign, amount='10.00', payment_method='chapa', transaction_id=f'CHAPA-{i}', completed=i % 2 == 0)
+            for i in range(50)
+        ])
+
+    def test_bulk_lookup_is_one_query_per_table(self):
+        ids = [f'CHAPA-{i}' for i in range(50)] + ['unknown']
+        # the hot table, then the archive for the id not found there
+        with self.assertNumQueries(2):
+            response = self.client.post(reverse('transaction_status'), json.dumps({'transaction_ids': ids}), content_type='application/json')
+        data = response.json()
+        self.assertEqual([row['transaction_id'] for row in data['transactions']], ids[:50])
+        self.assertEqual(data['transactions'][1], {
+            'transaction_id': 'CHAPA-1', 'campaign': Campaign.objects.get().pk, 'amount': '10.00',
+            'payment_method': 'chapa', 'completed': False, 'created_at': data['transactions'][1]['created_at'],
+            'expired_at': None,
+        })
+        self.assertEqual(data['missing'], ['unknown'])
+        self.assertEqual(self.client.get(reverse('transaction_status'), {'ids': 'CHAPA-0,CHAPA-3'}).json()['missing'], [])
+
+    def test_rejects_bad_requests(self):
+        url = reverse('transaction_status')
+        too_many = json.dumps({'transaction_ids': [str(i) for i in range(TRANSACTION_STATUS_MAX_IDS + 1)]})
+        self.assertEqual(self.client.post(url, too_many, content_type='application/json').status_code, 400)
+        self.assertEqual(self.client.post(url, '{"transaction_ids": "CHAPA-1"}', content_type='application/json').status_code, 400)
+        self.assertEqual(self.client.get(url, {'ids': 'CHAPA-1', 'wait': 'soon'}).status_code, 400)
+
+    def test_long_poll_rechecks_only_pending_ids_until_one_completes(self):
+        sleeps = []
+
+        async def complete_during_sleep(seconds):
+            sleeps.append(seconds)
+            if len(sleeps) == 2:
+                await Transaction.objects.filter(transaction_id='CHAPA-1').aupdate(completed=True)
+
+        with mock.patch('payments.views.asyncio.sleep', complete_during_sleep), \
+                CaptureQueriesContext(connection) as context:
+            response = async_to_sync(self.async_client.get)(reverse('transaction_status'), {'ids': 'CHAPA-1,CHAPA-2', 'wait': '10'})
+        self.assertEqual([row['completed'] for row in response.json()['transactions']], [True, True])
+        self.assertEqual(sleeps, [1, 1])
+        # first lookup, then one pending-only re-check per sleep (the update is the test's)
+        self.assertEqual(len(context.captured_queries), 4)
+        self.assertIn("'CHAPA-1'", context.captured_queries[-1]['sql'])
+        self.assertNotIn("'CHAPA-2'", context.captured_queries[-1]['sql'])
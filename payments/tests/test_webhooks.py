@@ -0,0 +1,76 @@
+"""Signed Chapa webhooks: verified locally, stored once, verify API only as a fallback."""
+import hashlib
+import hmac
+import json
+from unittest import mock
+
+import requests
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from payments.models import Campaign, Transaction, WebhookEvent
+from payments.money import Money
+
+SECRET = 'whsec-test'
+
+
+def signed_post(client, payload, secret=SECRET):
+    body = json.dumps(payload).encode()
+    signature = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    return client.post(reverse('chapa_callback'), body, content_type='application/json', HTTP_X_CHAPA_SIGNATURE=signature)
+
+
+@override_settings(CHAPA_WEBHOOK_SECRET=SECRET)
+class ChapaWebhookTests(TestCase):
+    def setUp(self):
+        self.campaign = Campaign.objects.create(title='Well')
+        Transaction.objects.create(campaign=self.campaign, amount='50.00', payment_method='chapa', transaction_id='CHAPA-1')
+        self.payload = {'event': 'charge.success', 'status': 'success', 'tx_ref': 'CHAPA-1', 'reference': 'APabc', 'amount': '50.00', 'currency': 'ETB'}
+
+    def balance(self):
+        self.campaign.refresh_from_db()
+        return self.campaign.total_birr
+
+    @mock.patch('payments.views.verify_chapa_payment')
+    def test_signed_success_credits_once_without_verify(self, verify):
+        response = signed_post(self.client, self.payload)
+        self.assertEqual(response.json()['outcome'], 'success')
+        self.assertEqual(signed_post(self.client, self.payload).json(), {'message': 'Event already processed'})
+        verify.assert_not_called()
+        self.assertEqual(self.balance(), Money(5000, 'ETB'))
+        self.assertEqual(WebhookEvent.objects.get().outcome, 'success')
+
+    @mock.patch('payments.views.verify_chapa_payment', return_value={'success': True, 'amount': Money(4000, 'ETB'), 'message': 'ok'})
+    def test_amount_mismatch_falls_back_to_verify(self, verify):
+        response = signed_post(self.client, dict(self.payload, amount='40.00'))
+        self.assertEqual(response.json()['outcome'], 'verified')
+        verify.assert_called_once_with('CHAPA-1')
+        self.assertEqual(self.balance(), Money(4000, 'ETB'))
+
+    def test_verify_error_leaves_event_for_the_retry(self):
+        verified = mock.Mock(**{'json.return_value': {'status': 'success', 'data': {'status': 'success', 'amount': '40.00'}}})
+        session = mock.Mock(**{'get.side_effect': [requests.ConnectionError('reset'), verified]})
+        payload = dict(self.payload, amount='40.00')
+        with mock.patch('payments.utils.http.get_session', return_value=session):
+            self.assertEqual(signed_post(self.client, payload).status_code, 503)
+            self.assertIsNone(WebhookEvent.objects.get().processed_at)
+            self.assertEqual(self.balance(), Money(0, 'ETB'))
+            self.assertEqual(signed_post(self.client, payload).json()['outcome'], 'verified')
+        self.assertEqual(self.balance(), Money(4000, 'ETB'))
+        self.assertEqual(WebhookEvent.objects.get().outcome, 'verified')
+
+    @mock.patch('payments.views.verify_chapa_payment')
+    def test_bad_signature_is_rejected_and_not_stored(self, verify):
+        response = signed_post(self.client, self.payload, secret='wrong')
+        self.assertEqual(response.status_code, 401)
+        verify.assert_not_called()
+        self.assertFalse(WebhookEvent.objects.exists())
+        self.assertEqual(self.balance(), Money(0, 'ETB'))
+
+    @mock.patch('payments.views.verify_chapa_payment', return_value={'success': True, 'amount': Money(5000, 'ETB'), 'message': 'ok'})
+    def test_unsigned_post_still_verifies(self, verify):
+        response = self.client.post(reverse('chapa_callback'), json.dumps(self.payload), content_type='application/json')
+        self.assertEqual(response.status_code, 302)
+        verify.assert_called_once_with('CHAPA-1')
+        self.assertFalse(WebhookEvent.objects.exists())
+        self.assertEqual(self.balance(), Money(5000, 'ETB'))
@@ -0,0 +1,155 @@
+"""Token-bucket rate limits for the donation and withdrawal endpoints.
+
+A rate such as ``'20/min'`` (DRF's syntax) is a bucket of 20 tokens that
+refills at 20 per minute, so a client may burst up to 20 requests and then
+sustain the rate. A view names its ``throttle_scope``; a request takes one
+token from each bucket configured for that scope in
+``REST_FRAMEWORK['DEFAULT_THROTTLE_RATES']``:
+
+* ``<scope>_ip``: per client IP (``NUM_PROXIES`` decides which
+  ``X-Forwarded-For`` entry is the client);
+* ``<scope>_user``: per signed-in user;
+* ``<scope>_campaign``: per ``campaign_id`` in the request body.
+
+An empty bucket refuses the request with 429 and a ``Retry-After`` of the
+time until it holds a token again. The provider callbacks are not
+limited: a refused confirmation may never be retried.
+
+The buckets live in the shared cache (see ``CACHES``), so every worker
+draws from the same ones and a request costs no database write. All the
+buckets of a request are read with one ``get_many`` and written back with
+one ``set_many``, expiring once they would be full again. The update is a
+read-modify-write, so requests racing on the same bucket can each take
+its last token; the limit is approximate by that much. A refused client
+is also remembered in the worker until its ``Retry-After`` passes, and its
+further requests are refused without touching the cache. That keeps
+abusive traffic cheap.
+"""
+import logging
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.throttling import BaseThrottle
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+KINDS = ('ip', 'user', 'campaign')
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+CACHE_PREFIX = 'throttle:'
+PRUNE_INTERVAL = 3600
+
+_blocked = {}  # bucket key -> time.monotonic() deadline
+_lock = threading.Lock()
+_last_prune = time.time()
+
+
+def parse_rate(rate):
+    """``'20/min'`` -> ``(capacity, tokens per second)``; None for an empty rate."""
+    if not rate:
+        return None
+    num, period = rate.split('/')
+    capacity = int(num)
+    return capacity, capacity / PERIODS[period[0]]
+
+
+def consume(buckets, now=None):
+    """Take one token from each of ``buckets`` (``(key, capacity, rate)`` tuples).
+
+    Returns 0 when every bucket had a token, otherwise the seconds until
+    the emptiest one refills to a token.
+    """
+    if not buckets:
+        return 0
+    deadline = 0.0
+    with _lock:
+        for key, _, _ in buckets:
+            deadline = max(deadline, _blocked.get(key, 0.0))
+    wait = deadline - time.monotonic()
+    if wait > 0:
+        return wait
+    now = time.time() if now is None else now
+    cache_keys = [CACHE_PREFIX + key for key, _, _ in buckets]
+    stored = cache.get_many(cache_keys)
+    updated = {}
+    refused = []
+    wait = 0
+    refill = 1
+    for cache_key, (key, capacity, rate) in zip(cache_keys, buckets):
+        tokens, updated_at = stored.get(cache_key, (capacity, now))
+        tokens = min(capacity, tokens + max(0.0, now - updated_at) * rate)
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = max(wait, (1 - tokens) / rate)
+            refused.append(key)
+        updated[cache_key] = (tokens, now)
+        refill = max(refill, (capacity - tokens) / rate)
+    # Kept until the slowest bucket is full again: a missing bucket is a full one.
+    cache.set_many(updated, math.ceil(refill) + 1)
+    if refused:
+        refused_until = time.monotonic() + wait
+        with _lock:
+            for key in refused:
+                _blocked[key] = refused_until
+    _maybe_prune(now)
+    return wait
+
+
+def _maybe_prune(now):
+    global _last_prune
+    if now - _last_prune < PRUNE_INTERVAL:
+        return
+    _last_prune = now
+    monotonic = time.monotonic()
+    with _lock:
+        for key in [key for key, deadline in _blocked.items() if deadline <= monotonic]:
+            del _blocked[key]
+
+
+def reset():
+    """Forget refusals remembered by this process (tests)."""
+    with _lock:
+        _blocked.clear()
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """Apply the view's ``throttle_scope`` buckets (per IP, user and campaign)."""
+
+    def allow_request(self, request, view):
+        self.wait_seconds = 0
+        scope = getattr(view, 'throttle_scope', None)
+        if not scope or not getattr(settings, 'THROTTLE_ENABLED', True):
+            return True
+        rates = getattr(settings, 'REST_FRAMEWORK', {}).get('DEFAULT_THROTTLE_RATES', {})
+        buckets = []
+        for kind in KINDS:
+            rate = parse_rate(rates.get(f'{scope}_{kind}'))
+            ident = rate and getattr(self, f'get_{kind}')(request)
+            if ident:
+                buckets.append((f'{scope}:{kind}:{ident}'[:200], *rate))
+        self.wait_seconds = consume(buckets)
+        if self.wait_seconds:
+            metrics.REQUESTS_SHED.labels(scope, 'rate_limited').inc()
+            logger.info("Rate limited %s request from %s", scope, self.get_ip(request))
+            return False
+        return True
+
+    def wait(self):
+        return math.ceil(self.wait_seconds)
+
+    def get_ip(self, request):
+        return self.get_ident(request)
+
+    def get_user(self, request):
+        # DRF authentication is off for these views; the session user is on the Django request.
+        user = getattr(request._request, 'user', None)
+        return user.pk if user is not None and user.is_authenticated else None
+
+    def get_campaign(self, request):
+        campaign_id = request.POST.get('campaign_id', '').strip()
+        return campaign_id if campaign_id.isdigit() else None
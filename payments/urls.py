@@ -5,9 +5,16 @@ urlpatterns = [
     path('test/', views.test_page, name='test_page'),
     path('api/create-campaign/', views.CreateCampaignView.as_view(), name='create_campaign'),
     path('api/campaigns/', views.CampaignListView.as_view(), name='campaign_list'),
+    path('api/campaigns/search/', views.CampaignSearchView.as_view(), name='campaign_search'),
+    path('api/campaigns/stream/', views.CampaignProgressStreamView.as_view(), name='campaign_progress_stream'),
     path('api/campaigns/<int:pk>/', views.CampaignDetailView.as_view(), name='campaign_detail'),
+    path('api/campaigns/<int:pk>/analytics/donations/', views.CampaignDonationSeriesView.as_view(), name='campaign_donation_series'),
+    path('api/campaigns/<int:pk>/analytics/donors/', views.CampaignTopDonorsView.as_view(), name='campaign_top_donors'),
+    path('api/donations/import/', views.DonationImportView.as_view(), name='donation_import'),
+    path('api/transactions/status/', views.TransactionStatusView.as_view(), name='transaction_status'),
     path('api/donate/', views.DonateView.as_view(), name='donate'),
     path('api/callback/chapa/', views.ChapaCallbackView.as_view(), name='chapa_callback'),
     path('api/callback/paypal/', views.PayPalCallbackView.as_view(), name='paypal_callback'),
     path('api/withdraw/', views.WithdrawView.as_view(), name='withdraw'),
+    path('metrics', views.metrics_view, name='metrics'),
 ]
\ No newline at end of file
@@ -0,0 +1,15 @@
+from datetime import datetime, time
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+
+def parse_when(value):
+    """Parse an ISO datetime or date query parameter; naive values are local time."""
+    when = parse_datetime(value)
+    if when is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f"Invalid date: {value}")
+        when = datetime.combine(day, time.min)
+    return timezone.make_aware(when) if timezone.is_naive(when) else when
@@ -1,36 +1,92 @@
-import requests
-from requests.adapters import HTTPAdapter
-from requests.packages.urllib3.util.retry import Retry
+import os
+from django.conf import settings
+from django.core.cache import cache
+from payments import metrics
+from payments.utils.timing import timed
 import logging
 
 logger = logging.getLogger(__name__)
 
-def get_exchange_rate(from_currency, to_currency, api_key=None):
-    """Fetch exchange rate with retries."""
-    session = requests.Session()
-    retry_strategy = Retry(
-        total=3,
-        backoff_factor=1,
-        status_forcelist=[500, 502, 503, 504]
-    )
-    adapter = HTTPAdapter(max_retries=retry_strategy)
-    session.mount("https://", adapter)
+_session = None
 
-    if not api_key:
-        logger.warning("No API key provided, using fallback rate")
-        return 132.1 if to_currency == 'ETB' else 0.007571
+def _get_session():
+    """Shared session so repeated lookups reuse the pooled HTTPS connection."""
+    global _session
+    if _session is None:
+        # Imported here so importing models/admin doesn't pay for requests.
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+        session = requests.Session()
+        retry_strategy = Retry(
+            total=3,
+            backoff_factor=1,
+            status_forcelist=[500, 502, 503, 504]
+        )
+        adapter = HTTPAdapter(max_retries=retry_strategy)
+        session.mount("https://", adapter)
+        _session = session
+    return _session
+
+def _reset_session():
+    global _session
+    _session = None
 
-    url = f"https://v6.exchangerate-api.com/v6/{api_key}/pair/{from_currency}/{to_currency}"
+os.register_at_fork(after_in_child=_reset_session)
+
+def _fallback_rate(to_currency):
+    return 132.1 if to_currency == 'ETB' else 0.007571
+
+@timed('fx')
+def _fetch_exchange_rate(from_currency, to_currency, api_key):
+    """Call exchangerate-api; returns None when the API fails."""
+    import requests
+    url = f"{settings.EXCHANGE_RATE_API_BASE}/v6/{api_key}/pair/{from_currency}/{to_currency}"
     try:
-        response = session.get(url, timeout=10)
+        response = _get_session().get(url, timeout=10)
         response.raise_for_status()
         data = response.json()
         if data.get('result') == 'success':
             rate = data.get('conversion_rate')
-            logger.debug(f"Exchange rate {from_currency} to {to_currency}: {rate}")
+            logger.debug("Exchange rate %s to %s: %s", from_currency, to_currency, rate)
             return rate
-        logger.error(f"Exchange rate API failed: {data.get('error-type')}")
-        return 132.1 if to_currency == 'ETB' else 0.007571
+        logger.error("Exchange rate API failed: %s", data.get('error-type'))
+        return None
     except requests.RequestException as e:
-        logger.error(f"Exchange rate API request failed: {str(e)}")
-        return 132.1 if to_currency == 'ETB' else 0.007571
\ No newline at end of file
+        logger.error("Exchange rate API request failed: %s", e)
+        return None
+
+def get_exchange_rate(from_currency, to_currency, api_key=None):
+    """Fetch exchange rate with retries.
+
+    Successful rates are cached for EXCHANGE_RATE_CACHE_SECONDS and fallbacks
+    after an API failure for EXCHANGE_RATE_ERROR_CACHE_SECONDS, so a slow or
+    failing upstream is not retried on every request.
+    """
+    if not api_key:
+        logger.warning("No API key provided, using fallback rate")
+        return _fallback_rate(to_currency)
+
+    cache_key = f"exchange_rate:{from_currency}:{to_currency}"
+    rate = cache.get(cache_key)
+    if rate is not None:
+        metrics.EXCHANGE_RATE_LOOKUPS.labels('hit').inc()
+        return rate
+    metrics.EXCHANGE_RATE_LOOKUPS.labels('miss').inc()
+
+    rate = _fetch_exchange_rate(from_currency, to_currency, api_key)
+    if rate is None:
+        rate = _fallback_rate(to_currency)
+        cache.set(cache_key, rate, getattr(settings, 'EXCHANGE_RATE_ERROR_CACHE_SECONDS', 60))
+    else:
+        cache.set(cache_key, rate, getattr(settings, 'EXCHANGE_RATE_CACHE_SECONDS', 600))
+    return rate
+
+def get_usd_to_etb_rate():
+    """Fetch the USD to ETB rate once, falling back to 132.1 when the API returns 0."""
+    api_key = getattr(settings, 'EXCHANGE_RATE_API_KEY', None)
+    rate = get_exchange_rate('USD', 'ETB', api_key=api_key)
+    if rate == 0:
+        logger.warning("Using fallback exchange rate USD to ETB: 132.1")
+        return 132.1
+    return rate
\ No newline at end of file
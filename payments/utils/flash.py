@@ -0,0 +1,26 @@
+from django.contrib import messages
+
+# Template variables rendered by payments/test.html, used as message tags.
+FLASH_KEYS = (
+    'campaign_message', 'campaign_error',
+    'chapa_message', 'chapa_error',
+    'paypal_message', 'paypal_error',
+    'withdrawal_message', 'withdrawal_error',
+)
+
+def flash(request, key, text):
+    """Queue a one-time message for test_page under one of FLASH_KEYS.
+
+    Messages go through the messages framework (cookie storage in settings),
+    so setting one never writes the session.
+    """
+    level = messages.ERROR if key.endswith('_error') else messages.SUCCESS
+    messages.add_message(request, level, text, extra_tags=key)
+
+def pop_flashes(request):
+    """Consume pending messages and return them keyed by FLASH_KEYS."""
+    context = dict.fromkeys(FLASH_KEYS)
+    for message in messages.get_messages(request):
+        if message.extra_tags in context:
+            context[message.extra_tags] = message.message
+    return context
@@ -0,0 +1,44 @@
+"""Process-wide HTTP session for payment gateway calls.
+
+Reusing one ``requests.Session`` keeps the TLS connections to Chapa and
+PayPal open between requests instead of handshaking on every call. The
+session is dropped in forked children so a worker never shares a socket
+with the process it was forked from. Every request sent through it counts
+as an in-flight gateway call for ``payments.admission``.
+"""
+import os
+
+_session = None
+
+
+def get_session():
+    global _session
+    if _session is None:
+        _session = _new_session()
+    return _session
+
+
+def _new_session():
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    from .. import admission
+
+    class GatewayAdapter(HTTPAdapter):
+        def send(self, request, **kwargs):
+            with admission.gateway_call():
+                return super().send(request, **kwargs)
+
+    session = requests.Session()
+    adapter = GatewayAdapter()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def reset():
+    global _session
+    _session = None
+
+
+os.register_at_fork(after_in_child=reset)
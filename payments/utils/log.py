@@ -0,0 +1,104 @@
+import atexit
+import copy
+import logging
+import os
+import queue
+import random
+from logging.handlers import QueueHandler, QueueListener
+
+
+class QueueListenerHandler(QueueHandler):
+    """Hand records to a background thread that owns the real handlers.
+
+    Request threads only merge the message and enqueue the record; the
+    listener thread does formatting and file/console I/O. When the queue is
+    full the record is dropped instead of blocking the request. Configure it
+    from ``settings.LOGGING`` with the target handlers as ``cfg://`` references::
+
+        'queue': {
+            '()': 'payments.utils.log.QueueListenerHandler',
+            'handlers': ['cfg://handlers.console', 'cfg://handlers.file'],
+        }
+    """
+
+    def __init__(self, handlers, maxsize=10000, respect_handler_level=True):
+        super().__init__(queue.Queue(maxsize))
+        # dictConfig only resolves cfg:// references on item access, not iteration.
+        handlers = [handlers[i] for i in range(len(handlers))]
+        self.dropped = 0
+        self.listener = QueueListener(self.queue, *handlers, respect_handler_level=respect_handler_level)
+        self.listener.start()
+        self._listening = True
+        atexit.register(self.close)
+        os.register_at_fork(after_in_child=self._restart_after_fork)
+
+    def _restart_after_fork(self):
+        # Threads don't survive fork (gunicorn --preload): give the child a
+        # fresh queue and its own listener thread.
+        if not self._listening:
+            return
+        self.queue = queue.Queue(self.queue.maxsize)
+        self.listener.queue = self.queue
+        self.listener._thread = None
+        self.listener.start()
+
+    def prepare(self, record):
+        # Merge args now so later mutation of the arguments can't change the
+        # message, but leave formatting and exc_info rendering to the listener.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        if self._listening:
+            self._listening = False
+            self.listener.stop()
+        super().close()
+
+
+class PayloadSampler(logging.Filter):
+    """Keep only a fraction of records logged with ``extra={'payload': True}``.
+
+    Gateway request/response dumps are flagged this way; all other records pass.
+    """
+
+    def __init__(self, rate=1.0):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if not getattr(record, 'payload', False) or self.rate >= 1:
+            return True
+        return random.random() < self.rate
+
+
+class Truncated:
+    """Render ``obj`` lazily for a log message, capped at ``limit`` characters.
+
+    Nothing is converted to a string unless the record is actually emitted::
+
+        logger.debug("Chapa API response: %s", Truncated(data))
+    """
+
+    __slots__ = ('obj', 'limit')
+
+    def __init__(self, obj, limit=None):
+        self.obj = obj
+        self.limit = limit
+
+    def __str__(self):
+        limit = self.limit
+        if limit is None:
+            from django.conf import settings
+            limit = getattr(settings, 'LOG_PAYLOAD_MAX_CHARS', 1000)
+        text = str(self.obj)
+        if len(text) <= limit:
+            return text
+        return f"{text[:limit]}... [{len(text) - limit} more chars]"
@@ -0,0 +1,50 @@
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Max
+from django.utils.functional import cached_property
+
+
+def estimate_row_count(model):
+    """Cheap row-count estimate for ``model``'s table, or None if unavailable.
+
+    PostgreSQL and MySQL keep planner statistics; on SQLite the largest primary
+    key is read from the index, which overestimates only by deleted rows.
+    """
+    connection = connections[model._default_manager.db]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE relname = %s", [table])
+        elif connection.vendor == 'mysql':
+            cursor.execute(
+                "SELECT table_rows FROM information_schema.tables "
+                "WHERE table_schema = DATABASE() AND table_name = %s",
+                [table],
+            )
+        else:
+            return model._default_manager.aggregate(n=Max('pk'))['n'] or 0
+        row = cursor.fetchone()
+    if row is None or row[0] is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator that skips the exact COUNT(*) on large unfiltered tables.
+
+    Filtered querysets (search, list filters) are still counted exactly.
+    Tables estimated below ``ADMIN_ESTIMATED_COUNT_THRESHOLD`` rows are
+    counted exactly too, so small tables show precise totals.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if getattr(queryset, 'query', None) is None or queryset.query.where:
+            return super().count
+        estimate = estimate_row_count(queryset.model)
+        threshold = getattr(settings, 'ADMIN_ESTIMATED_COUNT_THRESHOLD', 10000)
+        if estimate is None or estimate < threshold:
+            return super().count
+        return estimate
@@ -0,0 +1,52 @@
+import sys
+import threading
+from collections import Counter
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f"{frame.f_globals.get('__name__', '?')}.{getattr(code, 'co_qualname', code.co_name)}"
+
+
+class StackSampler:
+    """Sample one thread's Python stack every ``interval`` seconds.
+
+    A daemon thread reads the target thread's current frame from
+    ``sys._current_frames()`` and counts each distinct stack, so the sampled
+    code runs unmodified. ``collapsed()`` returns the counts in the collapsed
+    stack format read by flamegraph.pl and speedscope
+    (``outer;inner;leaf count`` per line).
+    """
+
+    def __init__(self, thread_id=None, interval=0.002):
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='payments-profiler', daemon=True)
+
+    def _run(self):
+        own_frames = sys._current_frames
+        while not self._stop.wait(self.interval):
+            frame = own_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_name(frame))
+                frame = frame.f_back
+            stack.reverse()
+            self.stacks[';'.join(stack)] += 1
+            self.samples += 1
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def collapsed(self):
+        return '\n'.join(f"{stack} {count}" for stack, count in sorted(self.stacks.items()))
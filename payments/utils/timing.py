@@ -0,0 +1,112 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+_current = ContextVar('payments_request_timings', default=None)
+_observers = []
+
+
+class RequestTimings:
+    """Per-request call counts and elapsed seconds, keyed by span name.
+
+    Span names used in this app: ``db``, ``chapa``, ``paypal``,
+    ``paypal_oauth`` and ``fx`` (exchange-rate lookups).
+    """
+
+    __slots__ = ('spans',)
+
+    def __init__(self):
+        self.spans = {}
+
+    def add(self, name, seconds):
+        span = self.spans.get(name)
+        if span is None:
+            self.spans[name] = [1, seconds]
+        else:
+            span[0] += 1
+            span[1] += seconds
+
+    def as_dict(self):
+        return {name: {'count': count, 'ms': round(seconds * 1000, 2)} for name, (count, seconds) in self.spans.items()}
+
+    def server_timing(self, total_seconds):
+        """Render the spans as a ``Server-Timing`` header value."""
+        parts = [
+            f'{name};dur={seconds * 1000:.2f};desc="{count}x"'
+            for name, (count, seconds) in self.spans.items()
+        ]
+        parts.append(f'total;dur={total_seconds * 1000:.2f}')
+        return ', '.join(parts)
+
+
+def db_wrapper(execute, sql, params, many, context):
+    """``connection.execute_wrapper`` hook timing the current request's queries as ``db``."""
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        seconds = time.perf_counter() - start
+        timings.add('db', seconds)
+        _notify('db', seconds)
+
+
+def time_queries(connection, **kwargs):
+    """Install ``db_wrapper`` on ``connection``; also a ``connection_created`` receiver."""
+    if db_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(db_wrapper)
+
+
+def add_observer(callback):
+    """Call ``callback(name, seconds)`` for every span, whether or not a request is being timed."""
+    _observers.append(callback)
+
+
+def _notify(name, seconds):
+    for observer in _observers:
+        observer(name, seconds)
+
+
+def activate(timings):
+    """Make ``timings`` the collector for the current request; returns a reset token."""
+    return _current.set(timings)
+
+
+def deactivate(token):
+    _current.reset(token)
+
+
+def current():
+    return _current.get()
+
+
+@contextmanager
+def track(name):
+    """Time the enclosed block under ``name``.
+
+    The span is added to the current request's timings, if any, and passed to
+    every registered observer.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        timings = _current.get()
+        if timings is not None:
+            timings.add(name, seconds)
+        _notify(name, seconds)
+
+
+def timed(name):
+    """Decorator form of :func:`track`."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with track(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,110 @@
+"""Prime a worker before it takes traffic.
+
+Without this, the first requests after a (re)start pay for importing the
+views and DRF, compiling templates, opening the database connection, the
+TLS handshakes to the gateways, the first exchange-rate fetch and the
+first PayPal token. ``run()`` does that work up front and logs how long
+each step took.
+
+Steps come in two kinds:
+
+* ``IMPORT_STEPS`` (``urls``, ``templates``) only import and compile. They
+  are safe in a gunicorn master before fork, where the work is shared
+  copy-on-write with every worker.
+* ``CONNECTION_STEPS`` (``db``, ``http``, ``fx``, ``paypal_token``) open
+  sockets or fill the per-process cache, so they must run in each worker.
+
+``gunicorn.conf.py`` runs the import steps in the master when
+``preload_app`` is on, and the rest in ``post_worker_init``. That hook
+runs in the worker after the app is loaded and before it accepts
+connections. ``WARMUP_STEPS`` chooses which steps run at all, and
+``manage.py warmup`` runs them once and prints the timings.
+"""
+import logging
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+IMPORT_STEPS = ('urls', 'templates')
+CONNECTION_STEPS = ('db', 'http', 'fx', 'paypal_token')
+WARMUP_TEMPLATES = ('payments/test.html', 'admin/change_list.html')
+
+
+def warm_urls():
+    # Importing the URLconf imports every view, DRF and the admin.
+    from django.urls import get_resolver
+    get_resolver().url_patterns
+    from . import views  # noqa: F401
+
+
+def warm_templates():
+    from django.template.loader import get_template
+    for name in WARMUP_TEMPLATES:
+        get_template(name)
+
+
+def warm_db():
+    from django.db import connections
+    for connection in connections.all():
+        connection.ensure_connection()
+
+
+def warm_http():
+    from .utils import http
+    session = http.get_session()
+    for base in (settings.CHAPA_API_BASE, settings.PAYPAL_API_BASE):
+        # Any response leaves a kept-alive TLS connection in the pool.
+        try:
+            session.head(base, timeout=getattr(settings, 'WARMUP_HTTP_TIMEOUT', 3))
+        except Exception as e:
+            logger.warning("Warm-up connection to %s failed: %s", base, e)
+
+
+def warm_fx():
+    from .utils.exchange_rate import get_usd_to_etb_rate
+    get_usd_to_etb_rate()
+
+
+def warm_paypal_token():
+    from .views import get_paypal_access_token
+    try:
+        token, error = get_paypal_access_token()
+    except Exception as e:
+        token, error = None, e
+    if not token:
+        logger.warning("Warm-up could not fetch a PayPal token: %s", error)
+
+
+STEPS = {
+    'urls': warm_urls,
+    'templates': warm_templates,
+    'db': warm_db,
+    'http': warm_http,
+    'fx': warm_fx,
+    'paypal_token': warm_paypal_token,
+}
+
+
+def run(steps=None):
+    """Run the enabled warm-up ``steps`` (default: all) and return ``{step: ms}``.
+
+    A failing step is logged and skipped; warm-up never stops a worker from
+    starting.
+    """
+    enabled = getattr(settings, 'WARMUP_STEPS', list(STEPS))
+    timings = {}
+    start = time.perf_counter()
+    for name in steps or list(STEPS):
+        if name not in enabled:
+            continue
+        step_start = time.perf_counter()
+        try:
+            STEPS[name]()
+        except Exception:
+            logger.exception("Warm-up step %s failed", name)
+        timings[name] = round((time.perf_counter() - step_start) * 1000, 1)
+    if timings:
+        logger.info("Warm-up finished in %.1f ms: %s", (time.perf_counter() - start) * 1000, timings)
+    return timings
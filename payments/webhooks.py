@@ -0,0 +1,116 @@
+"""Inbox for signed provider webhooks.
+
+Chapa signs every webhook it sends with the merchant's webhook secret
+(``CHAPA_WEBHOOK_SECRET``):
+
+* ``x-chapa-signature`` is the HMAC-SHA256 of the raw request body;
+* ``chapa-signature`` is the HMAC-SHA256 of the secret itself.
+
+Only the first one vouches for the body. When it checks out, the payload
+is trusted: the event is stored once as a ``WebhookEvent`` under its
+``event_key``, and a successful charge for the amount the transaction
+was created with is credited without calling Chapa back. Retried
+deliveries of an already processed event are acknowledged and ignored.
+
+Everything else falls back to ``/transaction/verify``. That covers a
+missing body signature (only ``chapa-signature``, or no secret configured),
+a payload that does not say plainly that the charge succeeded, and an
+amount or currency that does not match the transaction. Unsigned posts
+are never stored, so they cannot claim an event key ahead of the real
+delivery.
+
+If the verify call itself fails, the event is left unprocessed and the
+webhook answers 503, so Chapa's next delivery of it is handled again.
+"""
+import hashlib
+import hmac
+import logging
+
+from django.conf import settings
+from django.db import IntegrityError, transaction as db_transaction
+from django.utils import timezone
+
+from .models import WebhookEvent
+from .money import Money
+
+logger = logging.getLogger(__name__)
+
+# Values of ``chapa_signature_status``.
+SIGNED = 'signed'  # the body HMAC matches
+UNVERIFIABLE = 'unverifiable'  # no body HMAC to check
+INVALID = 'invalid'  # a signature was sent and does not match
+
+CHAPA_SUCCESS_STATUSES = ('success',)
+CHAPA_FAILED_STATUSES = ('failed', 'failed/cancelled', 'cancelled')
+
+
+def _hmac(secret, message):
+    return hmac.new(secret.encode(), message, hashlib.sha256).hexdigest()
+
+
+def chapa_signature_status(body, meta):
+    """Check the Chapa signature headers in ``meta`` (``request.META``) against ``body``."""
+    secret = getattr(settings, 'CHAPA_WEBHOOK_SECRET', '')
+    body_signature = meta.get('HTTP_X_CHAPA_SIGNATURE', '')
+    secret_signature = meta.get('HTTP_CHAPA_SIGNATURE', '')
+    if not secret:
+        return UNVERIFIABLE
+    if body_signature:
+        return SIGNED if hmac.compare_digest(body_signature, _hmac(secret, body)) else INVALID
+    if secret_signature and not hmac.compare_digest(secret_signature, _hmac(secret, secret.encode())):
+        return INVALID
+    return UNVERIFIABLE
+
+
+def chapa_event_key(payload, body):
+    """Key shared by every delivery of one Chapa event."""
+    reference = payload.get('reference') or payload.get('tx_ref')
+    if reference:
+        return f"{payload.get('event') or payload.get('status') or 'charge'}:{reference}"[:200]
+    return 'sha256:' + hashlib.sha256(body).hexdigest()
+
+
+def chapa_charge(payload, transaction):
+    """What a signed Chapa payload says about ``transaction``.
+
+    Returns ``('success', Money)`` for a successful charge of exactly the
+    transaction's amount in ETB, ``('failed', None)`` for a failed or
+    cancelled charge, and ``('unclear', None)`` for anything else.
+    """
+    status = str(payload.get('status', '')).lower()
+    if status in CHAPA_FAILED_STATUSES:
+        return 'failed', None
+    if status not in CHAPA_SUCCESS_STATUSES or payload.get('currency', 'ETB') != 'ETB':
+        return 'unclear', None
+    try:
+        amount = Money.parse(payload.get('amount'), 'ETB')
+    except ValueError:
+        return 'unclear', None
+    if amount != transaction.amount:
+        return 'unclear', None
+    return 'success', amount
+
+
+def record_event(provider, event_key, payload, event_type='', reference=''):
+    """Store an inbound event once.
+
+    Returns ``(event, is_new)``. ``is_new`` is False when an earlier
+    delivery of the same event was already processed; a delivery whose
+    processing never finished is handed out again.
+    """
+    try:
+        with db_transaction.atomic():
+            event = WebhookEvent.objects.create(
+                provider=provider, event_key=event_key, payload=payload,
+                event_type=event_type[:50], reference=reference[:100],
+            )
+        return event, True
+    except IntegrityError:
+        event = WebhookEvent.objects.get(provider=provider, event_key=event_key)
+        return event, event.processed_at is None
+
+
+def mark_processed(event, outcome):
+    event.processed_at = timezone.now()
+    event.outcome = outcome
+    WebhookEvent.objects.filter(pk=event.pk).update(processed_at=event.processed_at, outcome=outcome)